@@ -2,6 +2,7 @@ from os.path import abspath
 from typing import TYPE_CHECKING, Optional, Union, Dict, Any
 
 import attr
+import numpy as np
 from ruamel.yaml.comments import CommentedMap
 
 from corrscope.config import DumpableAttrs, Alias, CorrError
@@ -11,6 +12,7 @@ from corrscope.wave import Wave, Flatten
 
 if TYPE_CHECKING:
     from corrscope.corrscope import Config
+    from corrscope.wave_cache import WaveCache
 
 
 class ChannelConfig(DumpableAttrs):
@@ -49,14 +51,27 @@ class Channel:
     trigger_stride: int
     render_stride: int
 
-    def __init__(self, cfg: ChannelConfig, corr_cfg: "Config"):
+    def __init__(
+        self,
+        cfg: ChannelConfig,
+        corr_cfg: "Config",
+        wave_cache: "Optional[WaveCache]" = None,
+    ):
         self.cfg = cfg
 
         # Create a Wave object.
-        wave = Wave(
-            abspath(cfg.wav_path),
-            amplification=coalesce(cfg.amplification, corr_cfg.amplification),
-        )
+        amplification = coalesce(cfg.amplification, corr_cfg.amplification)
+        if wave_cache:
+            # Reuse a Wave (and envelope) preloaded by the GUI.
+            wave = wave_cache.get(
+                cfg.wav_path, amplification, calc_envelope=corr_cfg.skip_silence
+            )
+        else:
+            wave = Wave(abspath(cfg.wav_path), amplification=amplification)
+
+            # Find silent regions once, before copying the Wave.
+            if corr_cfg.skip_silence:
+                wave.calc_envelope()
 
         # Flatten wave stereo for trigger and render.
         tflat = coalesce(cfg.trigger_stereo, corr_cfg.trigger_stereo)
@@ -85,6 +100,13 @@ class Channel:
         self.trigger_stride = tsub * tw
         self.render_stride = rsub * rw
 
+        # Triggers (and post-triggers) read up to this far from `sample`,
+        # and rendering reads around the trigger.
+        self._silence_radius = (
+            trigger_samp * self.trigger_stride + self.render_samp * self.render_stride
+        )
+        self._flat_render_data: Optional[np.ndarray] = None
+
         # Create a Trigger object.
         if isinstance(cfg.trigger, ITriggerConfig):
             tcfg = cfg.trigger
@@ -106,3 +128,18 @@ class Channel:
             stride=self.trigger_stride,
             fps=corr_cfg.fps,
         )
+
+    def is_silent(self, sample: int) -> bool:
+        """ Returns whether triggering and rendering around `sample` would only
+        see silence. Requires Config.skip_silence. """
+        radius = self._silence_radius
+        return self.trigger_wave.is_silent(sample - radius, sample + radius)
+
+    def flat_render_data(self, sample: int) -> np.ndarray:
+        """ Returns a flat line, shaped like render data. Reused across frames. """
+        if self._flat_render_data is None:
+            data = self.render_wave.get_around(
+                sample, self.render_samp, self.render_stride
+            )
+            self._flat_render_data = np.zeros_like(data)
+        return self._flat_render_data
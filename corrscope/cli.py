@@ -1,6 +1,7 @@
 import datetime
 import sys
 from itertools import count
+from os.path import abspath
 from pathlib import Path
 from typing import Optional, List, Tuple, Union, Iterator, cast
 
@@ -10,8 +11,18 @@ import corrscope
 from corrscope.channel import ChannelConfig
 from corrscope.config import yaml
 from corrscope.settings.paths import MissingFFmpegError
-from corrscope.outputs import IOutputConfig, FFplayOutputConfig, FFmpegOutputConfig
+from corrscope.outputs import (
+    IOutputConfig,
+    FFplayOutputConfig,
+    FFmpegOutputConfig,
+    FFmpegTeeOutputConfig,
+    RawVideoOutputConfig,
+    PIXEL_FORMAT,
+    PIXEL_FORMATS,
+    encode_raw_video,
+)
 from corrscope.corrscope import default_config, CorrScope, Config, Arguments
+from corrscope.util import pushd
 
 
 Folder = click.Path(exists=True, file_okay=False)
@@ -39,6 +50,9 @@ YAML_NAME = YAML_EXTS[0]
 # Default output extension
 VIDEO_NAME = ".mp4"
 
+# Default extension of uncompressed frames (--raw), encoded later by --encode.
+RAW_VIDEO_NAME = ".rawvideo"
+
 
 DEFAULT_NAME = corrscope.app_name
 
@@ -79,6 +93,15 @@ CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
         "Preview (don't open GUI).")
 @click.option('--render', '-r', is_flag=True, help=
         "Render and encode MP4 video (don't open GUI).")
+@click.option('--raw', is_flag=True, help=
+        "Render uncompressed frames to a .rawvideo file, "
+        "to encode later using --encode (don't open GUI).")
+@click.option('--pixel-format', type=click.Choice(PIXEL_FORMATS),
+        default=PIXEL_FORMAT, show_default=True, help=
+        'Pixel format of --raw frames.')
+@click.option('--encode', type=File, help=
+        "Encode a --raw file to MP4 video with master audio, "
+        "without rendering again (don't open GUI).")
 # Debugging
 @click.option('--profile', is_flag=True, help=
         'Debug: Write CProfiler snapshot')
@@ -92,6 +115,9 @@ def main(
         write: bool,
         play: bool,
         render: bool,
+        raw: bool,
+        pixel_format: str,
+        encode: Optional[str],
         profile: bool,
 ):
     """Intelligent oscilloscope visualizer for .wav files.
@@ -109,11 +135,15 @@ def main(
     # corrscope wildcard/wav/folder ... --play
     # corrscope file.yaml --play
     # corrscope file.yaml --write-yaml
+    # corrscope file.yaml --raw; corrscope file.yaml --encode file.rawvideo
     #
     # - You can specify as many wildcards or wav files as you want.
     # - You can only supply one folder, with no files/wildcards.
 
-    show_gui = not any([write, play, render])
+    show_gui = not any([write, play, render, raw, encode])
+    if encode and any([play, render, raw]):
+        raise click.UsageError(
+            'Cannot combine --encode with --play, --render, or --raw')
 
     # Gather data for cfg: Config object.
     CfgOrPath = Union[Config, Path]
@@ -189,7 +219,7 @@ def main(
             command()
 
     else:
-        if not files:
+        if not files and not encode:
             raise click.UsageError('Must specify files or folders to play')
 
         if isinstance(cfg_or_path, Config):
@@ -214,6 +244,31 @@ def main(
             video_path = get_path(cfg_path or audio, VIDEO_NAME)
             outputs.append(FFmpegOutputConfig(video_path))
 
+        if play and render:
+            # Encode and preview using one FFmpeg process.
+            outputs = [FFmpegTeeOutputConfig(outputs)]
+
+        if raw:
+            raw_path = get_path(cfg_path or audio, RAW_VIDEO_NAME)
+            outputs.append(RawVideoOutputConfig(str(raw_path), pixel_format))
+
+        if encode:
+            # Like outputs, the video path is relative to cfg_dir.
+            raw_path = abspath(encode)
+            video_path = get_path(cfg_path or audio, VIDEO_NAME)
+            try:
+                with pushd(cfg_dir):
+                    exit_code = encode_raw_video(
+                        raw_path, FFmpegOutputConfig(video_path), cfg
+                    )
+            except MissingFFmpegError as e:
+                # Tell user how to install ffmpeg (__str__).
+                print(e, file=sys.stderr)
+            else:
+                if exit_code:
+                    raise click.ClickException(
+                        f'FFmpeg failed to encode {raw_path} (exit code {exit_code})')
+
         if outputs:
             arg = Arguments(cfg_dir=cfg_dir, outputs=outputs)
             command = lambda: CorrScope(cfg, arg).play()
@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack, contextmanager
 from enum import unique, Enum
 from fractions import Fraction
 from pathlib import Path
 from types import SimpleNamespace
 from typing import Iterator
-from typing import Optional, List, Union, Callable, cast
+from typing import Optional, List, Union, Callable, Dict, cast
 
 import attr
+import numpy as np
 
 from corrscope import outputs as outputs_
 from corrscope.channel import Channel, ChannelConfig
@@ -19,10 +22,16 @@ from corrscope.triggers import (
     ITriggerConfig,
     CorrelationTriggerConfig,
     PerFrameCache,
+    TriggerState,
     CorrelationTrigger,
+    SMOOTH_CANDIDATES,
+    smooth_triggers,
 )
+from corrscope.trigger_history import TriggerHistory
 from corrscope.util import pushd, coalesce
+from corrscope.utils.colorspace import IndexedFrame
 from corrscope.wave import Wave, Flatten
+from corrscope.wave_cache import WaveCache
 
 
 PRINT_TIMESTAMP = True
@@ -64,8 +73,23 @@ class Config(
     trigger_subsampling: int = 1
     render_subsampling: int = 1
 
+    # Skip triggering silent channels, and render them as flat lines.
+    skip_silence: bool = False
+
+    # Trigger channels in parallel threads. 1 = main thread, 0 = one per CPU core.
+    trigger_threads: int = 1
+
+    # If > 0, trigger the whole file before rendering, then pick between
+    # each frame's correlation peaks using future frames too.
+    # Penalty for moving the trigger by one period between frames.
+    trigger_smoothing: float = 0
+
     # Performance (skipped when recording to video)
     render_subfps: int = 1
+
+    # If preview falls behind real time, draw lines with fewer points,
+    # then render fewer frames (repeating the last).
+    adaptive_preview: bool = False
     render_fps = property(lambda self: Fraction(self.fps, self.render_subfps))
     # FFmpeg accepts FPS as a fraction. (decimals may work, but are inaccurate.)
 
@@ -94,6 +118,9 @@ class Config(
     render: RendererConfig
 
     show_internals: List[str] = attr.Factory(list)
+    # If set, writes the trigger window and buffer of each frame and channel
+    # to window.npy and buffer.npy in this folder. Faster than show_internals.
+    record_internals: Optional[str] = None
     benchmark_mode: BenchmarkMode = attr.ib(
         BenchmarkMode.NONE, converter=BenchmarkMode.by_name
     )
@@ -140,6 +167,196 @@ ProgressFunc = Callable[[int], None]
 IsAborted = Callable[[], bool]
 
 
+STAGES = ["trigger", "render", "output"]
+
+
+@attr.dataclass
+class ProgressEvent:
+    # Frames finished, out of nframes.
+    frame: int
+    nframes: int
+
+    # Position in the song.
+    time_seconds: float
+
+    # Smoothed rendering speed, and estimated seconds until finished.
+    fps: float
+    eta_seconds: float
+
+    # Milliseconds per frame spent in each of STAGES, since the previous event.
+    stage_ms: Dict[str, float]
+
+    # Throughput and time blocked writing, of each Output so far.
+    outputs: List[outputs_.OutputStats]
+
+    def __str__(self) -> str:
+        eta = int(round(self.eta_seconds))
+        stages = ", ".join(f"{name} {ms:.1f} ms" for name, ms in self.stage_ms.items())
+        text = (
+            f"Frame {self.frame}/{self.nframes}, {self.fps:.1f} FPS, "
+            f"ETA {eta // 60}:{eta % 60:02d}\n{stages}"
+        )
+        for i, stats in enumerate(self.outputs):
+            text += f"\nOutput {i + 1}: {stats}"
+        return text
+
+
+ProgressEventFunc = Callable[[ProgressEvent], None]
+
+
+class ProgressTracker:
+    """ Measures rendering speed, and sends ProgressEvent to a callback
+    at most once per `interval` seconds.
+
+    Uses time.monotonic(), which is cheap enough to check every frame. """
+
+    # Weight of the newest FPS measurement.
+    SMOOTHING = 0.3
+
+    def __init__(self, on_progress: ProgressEventFunc, interval: float, nframes: int):
+        self._on_progress = on_progress
+        self._interval = interval
+        self._nframes = nframes
+
+        self._stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self._prev_time = time.monotonic()
+        self._prev_frame = 0
+        self._fps = None  # type: Optional[float]
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self._stage_seconds[stage] += seconds
+
+    def update(
+        self,
+        frame: int,
+        time_seconds: float,
+        outputs: List[outputs_.Output],
+        force: bool = False,
+    ) -> None:
+        """ `frame` is the number of frames finished. """
+        now = time.monotonic()
+        if now - self._prev_time < self._interval and not force:
+            return
+
+        dframe = frame - self._prev_frame
+        dtime = now - self._prev_time
+        if dframe <= 0 or dtime <= 0:
+            return
+
+        fps = dframe / dtime
+        if self._fps is not None:
+            fps = self.SMOOTHING * fps + (1 - self.SMOOTHING) * self._fps
+        self._fps = fps
+
+        stage_ms = {
+            stage: seconds * 1000 / dframe
+            for stage, seconds in self._stage_seconds.items()
+        }
+        self._stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self._prev_time = now
+        self._prev_frame = frame
+
+        self._on_progress(
+            ProgressEvent(
+                frame=frame,
+                nframes=self._nframes,
+                time_seconds=time_seconds,
+                fps=fps,
+                eta_seconds=(self._nframes - frame) / fps,
+                stage_ms=stage_ms,
+                outputs=[output.stats for output in outputs],
+            )
+        )
+
+
+class PreviewController:
+    """ During preview, decides how much detail to render, and which output frames
+    to render, so rendering keeps up with real time. Skipped frames repeat the
+    previous frame, so outputs still receive frames at render_fps.
+
+    Draws lines with 2 points per `detail` pixel columns (see
+    Renderer.set_detail()), and renders 1 of every `skip` frames.
+    Compares the smoothed time spent triggering and rendering each output frame
+    against the frame budget (1 / render_fps), and only changes level
+    after holding it for HOLD_SECONDS. """
+
+    # (detail, skip) at each level, from slowest to fastest.
+    # Lowering detail is less noticeable than skipping frames, so do it first.
+    LEVELS = [(1, 1), (2, 1), (4, 1), (4, 2), (4, 3), (4, 4)]
+
+    # Skip more frames if over this fraction of the budget.
+    SLOWER = 0.9
+    # Skip fewer frames if that would be under this fraction of the budget.
+    FASTER = 0.6
+
+    # Weight of the newest measurement.
+    SMOOTHING = 0.1
+    HOLD_SECONDS = 0.5
+
+    def __init__(self, render_fps: float):
+        self.budget = 1 / render_fps
+        self.level = 0
+
+        self._hold_frames = max(round(render_fps * self.HOLD_SECONDS), 1)
+        self._held = 0
+        self._count = 0
+
+        # Seconds spent triggering per output frame, and rendering per rendered frame.
+        self._trigger_seconds = 0.0
+        self._pending_trigger = 0.0
+        self._render_seconds = 0.0
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        if stage == "trigger":
+            self._pending_trigger += seconds
+        elif stage == "render":
+            self._render_seconds = self._smooth(self._render_seconds, seconds)
+
+    def _smooth(self, prev: float, value: float) -> float:
+        return self.SMOOTHING * value + (1 - self.SMOOTHING) * prev
+
+    @property
+    def detail(self) -> int:
+        return self.LEVELS[self.level][0]
+
+    @property
+    def skip(self) -> int:
+        return self.LEVELS[self.level][1]
+
+    def cost(self, level: int) -> float:
+        """ Estimated seconds per output frame at LEVELS[level].
+        Assumes rendering time is proportional to the number of line points,
+        which overestimates the cost of adding detail. """
+        detail, skip = self.LEVELS[level]
+        render_seconds = self._render_seconds * self.detail / detail
+        return self._trigger_seconds + render_seconds / skip
+
+    def next_frame(self) -> bool:
+        """ Called once per output frame. Returns whether to render it. """
+        self._trigger_seconds = self._smooth(
+            self._trigger_seconds, self._pending_trigger
+        )
+        self._pending_trigger = 0.0
+
+        self._held += 1
+        if self._held >= self._hold_frames:
+            level = self.level
+            max_level = len(self.LEVELS) - 1
+            if level < max_level and self.cost(level) > self.budget * self.SLOWER:
+                level += 1
+            elif level > 0 and self.cost(level - 1) < self.budget * self.FASTER:
+                level -= 1
+
+            if level != self.level:
+                self.level = level
+                self._held = 0
+                self._count = 0
+
+        render = self._count % self.skip == 0
+        self._count += 1
+        return render
+
+
 @attr.dataclass
 class Arguments:
     cfg_dir: str
@@ -150,11 +367,50 @@ class Arguments:
     is_aborted: IsAborted = lambda: False
     on_end: Callable[[], None] = lambda: None
 
+    # Called with frame counts, FPS, ETA, time per stage, and the stats of each
+    # output, at most once per progress_interval seconds.
+    on_progress: ProgressEventFunc = lambda event: None
+    progress_interval: float = 0.25
+
+    # Polled before each frame. Returns a time to seek the preview to, or None.
+    get_seek: Optional[Callable[[], Optional[float]]] = None
+
+    # Waves preloaded by the GUI. Channels reuse them instead of reopening files.
+    wave_cache: Optional[WaveCache] = None
+
+    # Polled before each frame. Returns an edited Config whose appearance
+    # (RendererConfig and line colors) is applied without restarting, or None.
+    get_config: Optional[Callable[[], Optional[Config]]] = None
+
+
+# When seeking, triggers run (without rendering) for up to this long
+# before the seek target, to lock onto the waveform's period.
+SEEK_WARMUP_SECONDS = 2.0
+
+
+class _Frames:
+    """ Iterates over frame numbers. Seeking changes the next frame. """
+
+    def __init__(self, begin: int, end: int):
+        self.next = begin
+        self.end = end
+
+    def __iter__(self) -> "_Frames":
+        return self
+
+    def __next__(self) -> int:
+        if self.next >= self.end:
+            raise StopIteration
+        frame = self.next
+        self.next += 1
+        return frame
+
 
 class CorrScope:
     def __init__(self, cfg: Config, arg: Arguments):
         """ cfg is mutated!
-        Recording config is triggered if any FFmpegOutputConfig is found.
+        Recording config is triggered if any FFmpegOutputConfig is found
+        (including within FFmpegTeeOutputConfig).
         Preview mode is triggered if all outputs are FFplay or others.
         """
         self.cfg = cfg
@@ -177,13 +433,14 @@ class CorrScope:
         # Check for ffmpeg video recording, then mutate cfg.
         is_record = False
         for output in self.output_cfgs:
-            if isinstance(output, outputs_.FFmpegOutputConfig):
+            if outputs_.is_record_output(output):
                 is_record = True
                 break
         if is_record:
             self.cfg.before_record()
         else:
             self.cfg.before_preview()
+        self.is_preview = not is_record
 
     trigger_waves: List[Wave]
     render_waves: List[Wave]
@@ -200,7 +457,10 @@ class CorrScope:
                 raise CorrError(
                     f'File not found: master_audio="{self.cfg.master_audio}"'
                 )
-            self.channels = [Channel(ccfg, self.cfg) for ccfg in self.cfg.channels]
+            self.channels = [
+                Channel(ccfg, self.cfg, self.arg.wave_cache)
+                for ccfg in self.cfg.channels
+            ]
             self.trigger_waves = [channel.trigger_wave for channel in self.channels]
             self.render_waves = [channel.render_wave for channel in self.channels]
             self.triggers = [channel.trigger for channel in self.channels]
@@ -216,12 +476,102 @@ class CorrScope:
                 ]
                 yield
 
+    @contextmanager
+    def _load_trigger_pool(self) -> Iterator[Optional[ThreadPoolExecutor]]:
+        """ Yields a thread pool for triggering channels in parallel,
+        or None if triggering on the main thread. """
+        nthreads = self.cfg.trigger_threads or os.cpu_count() or 1
+        nthreads = min(nthreads, self.nchan)
+        if nthreads <= 1:
+            yield None
+            return
+
+        # Triggers spend most of their time in NumPy, which releases the GIL.
+        with ThreadPoolExecutor(nthreads, thread_name_prefix="trigger") as pool:
+            yield pool
+
+    def _smooth_triggers(
+        self, frames: range, history: Optional[TriggerHistory]
+    ) -> List[List[Optional[int]]]:
+        """ Triggers every frame before rendering, recording each frame's best
+        correlation peaks, then picks between them with smooth_triggers().
+
+        Returns each frame's trigger for each channel (None if silent). """
+        fps = self.cfg.fps
+        skip_silence = self.cfg.skip_silence
+        nframe = len(frames)
+
+        # The trigger is the best candidate. CorrelationTrigger post-triggers
+        # every candidate, so any path lands on post-triggered positions.
+        # Non-correlation triggers only produce one candidate.
+        positions = np.zeros((self.nchan, nframe, SMOOTH_CANDIDATES), dtype=np.int64)
+        offsets = np.zeros((self.nchan, nframe, SMOOTH_CANDIDATES))
+        scores = np.full((self.nchan, nframe, SMOOTH_CANDIDATES), -np.inf)
+        scores[:, :, 0] = 0
+        silent = np.zeros((self.nchan, nframe), dtype=bool)
+
+        for i, frame in enumerate(frames):
+            if self.arg.is_aborted():
+                break
+            time_seconds = frame / fps
+
+            for chan, channel in enumerate(self.channels):
+                sample = round(channel.render_wave.smp_s * time_seconds)
+                positions[chan, i] = sample
+                if skip_silence and channel.is_silent(sample):
+                    silent[chan, i] = True
+                    continue
+
+                cache = PerFrameCache(record_candidates=True)
+                positions[chan, i, 0] = channel.trigger.get_trigger(sample, cache)
+
+                if cache.candidates is not None:
+                    assert cache.candidate_scores is not None
+                    ncand = len(cache.candidates)
+                    period = max(coalesce(cache.period, 1), 1)
+
+                    positions[chan, i, 1:ncand] = cache.candidates[1:]
+                    offsets[chan, i, :ncand] = (
+                        positions[chan, i, :ncand] - sample
+                    ) / period
+                    best = max(abs(cache.candidate_scores[0]), 1e-12)
+                    scores[chan, i, :ncand] = cache.candidate_scores / best
+
+            if history:
+                history.record(i)
+
+        penalty = self.cfg.trigger_smoothing
+        triggers = np.empty((nframe, self.nchan), dtype=object)
+        for chan in range(self.nchan):
+            path = smooth_triggers(offsets[chan], scores[chan], penalty)
+            chosen = positions[chan, np.arange(nframe), path]
+            triggers[:, chan] = [
+                None if is_silent else int(trigger)
+                for trigger, is_silent in zip(chosen, silent[chan])
+            ]
+        return triggers.tolist()
+
     def _load_renderer(self) -> Renderer:
         renderer = MatplotlibRenderer(
             self.cfg.render, self.cfg.layout, self.nchan, self.cfg.channels
         )
         return renderer
 
+    def _reconfigure_renderer(self, renderer: Renderer, cfg: Config) -> None:
+        """ Applies the appearance of an edited `cfg` to `renderer`,
+        keeping triggers and waves. Changes to resolution (or channel count)
+        are ignored until the next play. """
+        render_cfg = attr.evolve(cfg.render)
+        if self.is_preview:
+            render_cfg.before_preview()
+        render_cfg.width = renderer.cfg.width
+        render_cfg.height = renderer.cfg.height
+
+        channel_cfgs = cfg.channels
+        if len(channel_cfgs) != self.nchan:
+            channel_cfgs = self.cfg.channels
+        renderer.reconfigure(render_cfg, channel_cfgs)
+
     def play(self) -> None:
         if self.has_played:
             raise ValueError("Cannot call CorrScope.play() more than once")
@@ -277,9 +627,50 @@ class CorrScope:
 
         benchmark_mode = self.cfg.benchmark_mode
         not_benchmarking = not benchmark_mode
+        triggering = not_benchmarking or benchmark_mode == BenchmarkMode.TRIGGER
+        rendering = not_benchmarking or benchmark_mode >= BenchmarkMode.RENDER
+        skip_silence = self.cfg.skip_silence
+
+        def trigger_channel(channel: Channel, sample: int) -> Optional[int]:
+            """ Returns the channel's trigger, or None if it is silent.
+            Each channel owns its trigger, so channels can run in parallel. """
+
+            # Hold the previous trigger, and draw a flat line.
+            if skip_silence and channel.is_silent(sample):
+                return None
+
+            if triggering:
+                cache = PerFrameCache()
+                return channel.trigger.get_trigger(sample, cache)
+            return sample
+
+        # Record trigger internals to memory-mapped files.
+        history: Optional[TriggerHistory] = None
+        if self.cfg.record_internals:
+            with pushd(self.arg.cfg_dir):
+                history = TriggerHistory(
+                    self.cfg.record_internals, end_frame - begin_frame, self.triggers
+                )
 
-        with self._load_outputs():
+        # Trigger every frame in advance, using future frames to smooth triggers.
+        smoothed: Optional[List[List[Optional[int]]]] = None
+        if triggering and self.cfg.trigger_smoothing > 0:
+            smoothed = self._smooth_triggers(range(begin_frame, end_frame), history)
+
+        with self._load_outputs(), self._load_trigger_pool() as trigger_pool:
             prev = -1
+            tracker = ProgressTracker(
+                self.arg.on_progress,
+                self.arg.progress_interval,
+                nframes=end_frame - begin_frame,
+            )
+            perf_counter = time.perf_counter
+
+            # Outputs requesting pal8 receive palette-indexed frames.
+            # Other outputs receive lossless rgb24 frames (and convert them).
+            indexed = [output.pixel_format == outputs_.PAL8 for output in self.outputs]
+            want_indexed = any(indexed)
+            want_rgb = not all(indexed) or not want_indexed
 
             # When subsampling FPS, render frames from the future to alleviate lag.
             # subfps=1, ahead=0.
@@ -287,8 +678,59 @@ class CorrScope:
             render_subfps = self.cfg.render_subfps
             ahead = render_subfps // 2
 
+            controller: Optional[PreviewController] = None
+            if self.is_preview and self.cfg.adaptive_preview:
+                controller = PreviewController(self.cfg.render_fps)
+            frame_data: Optional[outputs_.ByteBuffer] = None
+            indexed_data: Optional[IndexedFrame] = None
+            rendered = False
+
+            # region Seeking
+            # Trigger states before frames (every warm-up interval),
+            # so seeking backwards only re-triggers a few frames.
+            get_seek = self.arg.get_seek
+            get_config = self.arg.get_config
+            warmup_frames = max(round(fps * SEEK_WARMUP_SECONDS), 1)
+            snapshots: Dict[int, List[TriggerState]] = {}
+            if get_seek:
+                snapshots[begin_frame] = [
+                    trigger.get_state() for trigger in self.triggers
+                ]
+            frames = _Frames(begin_frame, end_frame)
+
+            def seek(seek_time: float) -> int:
+                """ Prepares triggers and outputs to play from `seek_time`.
+                Returns the frame to play next. """
+                target = round(seek_time * fps)
+                target = max(begin_frame, min(target, end_frame - 1))
+
+                # Smoothed triggers are already known for every frame.
+                if triggering and smoothed is None:
+                    nearest = max(f for f in snapshots if f <= target)
+                    if target - nearest <= warmup_frames:
+                        warmup_begin = nearest
+                    else:
+                        # We haven't played near `target` yet, so start from
+                        # a fresh trigger state shortly before `target`.
+                        nearest = begin_frame
+                        warmup_begin = target - warmup_frames
+
+                    for trigger, state in zip(self.triggers, snapshots[nearest]):
+                        trigger.set_state(state)
+                    for warmup_frame in range(warmup_begin, target):
+                        warmup_seconds = warmup_frame / fps
+                        for channel in self.channels:
+                            smp_s = channel.render_wave.smp_s
+                            trigger_channel(channel, round(smp_s * warmup_seconds))
+
+                for output in self.outputs:
+                    output.seek(target / fps)
+                return target
+
+            # endregion
+
             # For each frame, render each wave
-            for frame in range(begin_frame, end_frame):
+            for frame in frames:
                 if self.arg.is_aborted():
                     # Used for FPS calculation
                     end_frame = frame
@@ -297,37 +739,86 @@ class CorrScope:
                         output.terminate()
                     break
 
+                if get_seek:
+                    seek_time = get_seek()
+                    if seek_time is not None:
+                        frame = seek(seek_time)
+                        frames.next = frame + 1
+
+                    if (frame - begin_frame) % warmup_frames == 0:
+                        if frame not in snapshots:
+                            snapshots[frame] = [
+                                trigger.get_state() for trigger in self.triggers
+                            ]
+
+                if get_config:
+                    new_cfg = get_config()
+                    if new_cfg is not None:
+                        self._reconfigure_renderer(renderer, new_cfg)
+
                 time_seconds = frame / fps
                 should_render = (frame - begin_frame) % render_subfps == ahead
+                if should_render and self.outputs:
+                    # Real-time outputs skip frames when corrscope falls behind.
+                    wanted = [
+                        output.wants_frame(time_seconds) for output in self.outputs
+                    ]
+                    should_render = any(wanted)
 
                 rounded = int(time_seconds)
                 if PRINT_TIMESTAMP and rounded != prev:
                     self.arg.progress(rounded)
                     prev = rounded
 
-                render_datas = []
-                # Get render-data from each wave.
-                for render_wave, channel in zip(self.render_waves, self.channels):
-                    sample = round(render_wave.smp_s * time_seconds)
+                stage_begin = perf_counter()
+                samples = [
+                    round(render_wave.smp_s * time_seconds)
+                    for render_wave in self.render_waves
+                ]
 
-                    # Get trigger.
-                    if not_benchmarking or benchmark_mode == BenchmarkMode.TRIGGER:
-                        cache = PerFrameCache()
-                        trigger_sample = channel.trigger.get_trigger(sample, cache)
-                    else:
-                        trigger_sample = sample
-
-                    # Get render data.
-                    if should_render:
-                        render_datas.append(
-                            render_wave.get_around(
-                                trigger_sample,
-                                channel.render_samp,
-                                channel.render_stride,
+                # Get trigger from each wave.
+                if smoothed is not None:
+                    trigger_samples = smoothed[frame - begin_frame]
+                elif trigger_pool:
+                    trigger_samples = list(
+                        trigger_pool.map(trigger_channel, self.channels, samples)
+                    )
+                else:
+                    trigger_samples = list(map(trigger_channel, self.channels, samples))
+
+                if history and smoothed is None:
+                    history.record(frame - begin_frame)
+
+                # Render frame, unless preview is behind (then repeat the last).
+                # Repeated frames skip reading render-data.
+                repeat = False
+                if should_render and controller and rendering:
+                    repeat = not controller.next_frame() and rendered
+                    renderer.set_detail(controller.detail)
+
+                # Get render-data from each wave.
+                render_datas = []
+                if should_render and not repeat:
+                    for render_wave, channel, sample, trigger_sample in zip(
+                        self.render_waves, self.channels, samples, trigger_samples
+                    ):
+                        if trigger_sample is None:
+                            render_datas.append(channel.flat_render_data(sample))
+                        else:
+                            render_datas.append(
+                                render_wave.get_around(
+                                    trigger_sample,
+                                    channel.render_samp,
+                                    channel.render_stride,
+                                )
                             )
-                        )
 
+                elapsed = perf_counter() - stage_begin
+                tracker.add_time("trigger", elapsed)
+                if controller:
+                    controller.add_time("trigger", elapsed)
                 if not should_render:
+                    tracker.update(frame - begin_frame + 1, time_seconds, self.outputs)
                     continue
 
                 # region Display buffers, for debugging purposes.
@@ -344,23 +835,48 @@ class CorrScope:
                     )
                 # endregion
 
-                if not_benchmarking or benchmark_mode >= BenchmarkMode.RENDER:
-                    # Render frame
-                    renderer.render_frame(render_datas)
-                    frame_data = renderer.get_frame()
+                if rendering:
+                    if not repeat:
+                        stage_begin = perf_counter()
+                        renderer.render_frame(render_datas)
+                        if want_rgb:
+                            frame_data = renderer.get_frame()
+                        if want_indexed:
+                            indexed_data = renderer.get_frame_indexed()
+                        rendered = True
+                        elapsed = perf_counter() - stage_begin
+                        tracker.add_time("render", elapsed)
+                        if controller:
+                            controller.add_time("render", elapsed)
 
                     if not_benchmarking or benchmark_mode == BenchmarkMode.OUTPUT:
                         # Output frame
+                        stage_begin = perf_counter()
                         aborted = False
-                        for output in self.outputs:
-                            if output.write_frame(frame_data) is outputs_.Stop:
+                        for output, is_indexed in zip(self.outputs, indexed):
+                            data = indexed_data if is_indexed else frame_data
+                            if output.write_frame(data) is outputs_.Stop:
                                 aborted = True
                                 break
+                        tracker.add_time("output", perf_counter() - stage_begin)
                         if aborted:
                             # Outputting frame happens after most computation finished.
                             end_frame = frame + 1
                             break
 
+                tracker.update(frame - begin_frame + 1, time_seconds, self.outputs)
+            else:
+                # Report reaching the end.
+                tracker.update(
+                    end_frame - begin_frame,
+                    end_frame / fps,
+                    self.outputs,
+                    force=True,
+                )
+
+            if history:
+                history.close()
+
             if self.raise_on_teardown:
                 raise self.raise_on_teardown
 
@@ -370,4 +886,9 @@ class CorrScope:
             render_fps = (end_frame - begin_frame) / dtime
             print(f"{render_fps:.1f} FPS, {1000 / render_fps:.2f} ms")
 
+            # Tell whether corrscope or the encoder is the bottleneck.
+            for output in self.outputs:
+                if output.stats.nframes:
+                    print(f"{type(output).__name__}: {output.stats}")
+
     raise_on_teardown: Optional[Exception] = None
@@ -0,0 +1,124 @@
+"""
+Shared-memory frame transport between corrscope and FFmpeg.
+
+corrscope copies each frame into the next slot of a FrameRing
+(a memory-mapped file holding a ring of fixed-size frame slots),
+then sends the reader process the frame's length (8 bytes) through a pipe.
+
+The reader process (`python -m corrscope.frame_ring`) copies each frame
+from its slot to stdout (FFmpeg), then publishes the number of frames it has read
+in the ring's header, so corrscope knows which slots can be overwritten.
+Closing the reader's stdin ends the stream.
+"""
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+from typing import Union, IO
+
+# Header: number of frames read by the reader.
+HEADER = struct.Struct("<Q")
+
+# Message sent through the pipe for each frame: frame length.
+MESSAGE = struct.Struct("<Q")
+
+# Prefer a RAM-backed filesystem on Linux.
+SHM_DIR = "/dev/shm"
+
+
+class FrameRing:
+    def __init__(self, path: str, nslot: int, slot_nbytes: int):
+        self.path = path
+        self.nslot = nslot
+        self.slot_nbytes = slot_nbytes
+
+        nbytes = HEADER.size + nslot * slot_nbytes
+        with open(path, "r+b") as f:
+            self._mmap = mmap.mmap(f.fileno(), nbytes)
+        self._view = memoryview(self._mmap)
+
+    @classmethod
+    def create(cls, nslot: int, slot_nbytes: int) -> "FrameRing":
+        """ Creates a zero-filled ring in a temporary file. """
+        dir = SHM_DIR if os.path.isdir(SHM_DIR) else None
+        fd, path = tempfile.mkstemp(prefix="corrscope-", suffix=".ring", dir=dir)
+        try:
+            os.ftruncate(fd, HEADER.size + nslot * slot_nbytes)
+        finally:
+            os.close(fd)
+        return cls(path, nslot, slot_nbytes)
+
+    def slot(self, frame_idx: int) -> memoryview:
+        """ Returns the memory holding frame number `frame_idx`. """
+        begin = HEADER.size + (frame_idx % self.nslot) * self.slot_nbytes
+        return self._view[begin : begin + self.slot_nbytes]
+
+    @property
+    def nread(self) -> int:
+        return HEADER.unpack_from(self._mmap, 0)[0]
+
+    @nread.setter
+    def nread(self, value: int) -> None:
+        HEADER.pack_into(self._mmap, 0, value)
+
+    def close(self, unlink: bool = False) -> None:
+        self._view.release()
+        self._mmap.close()
+        if unlink:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def can_spawn_reader() -> bool:
+    """ Frozen (PyInstaller) builds cannot run `python -m`. """
+    return not getattr(sys, "frozen", False)
+
+
+def spawn_reader(ring: FrameRing, stdout: Union[int, IO]) -> subprocess.Popen:
+    args = [
+        sys.executable,
+        "-m",
+        __name__,
+        ring.path,
+        str(ring.nslot),
+        str(ring.slot_nbytes),
+    ]
+    # bufsize=0 sends each message immediately.
+    return subprocess.Popen(args, stdin=subprocess.PIPE, stdout=stdout, bufsize=0)
+
+
+def read_frames(ring: FrameRing, messages: IO[bytes], out: IO[bytes]) -> None:
+    """ Copies frames from `ring` to `out`, until `messages` is closed. """
+    nread = 0
+    while True:
+        message = messages.read(MESSAGE.size)
+        if len(message) < MESSAGE.size:
+            break
+        (frame_nbytes,) = MESSAGE.unpack(message)
+
+        out.write(ring.slot(nread)[:frame_nbytes])
+        out.flush()
+
+        # Only free the slot after FFmpeg has received it.
+        nread += 1
+        ring.nread = nread
+
+
+def main() -> None:
+    path, nslot, slot_nbytes = sys.argv[1:]
+    ring = FrameRing(path, int(nslot), int(slot_nbytes))
+    try:
+        read_frames(ring, sys.stdin.buffer, sys.stdout.buffer)
+    except BrokenPipeError:
+        # FFmpeg exited. corrscope finds out when writing to our stdin.
+        pass
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
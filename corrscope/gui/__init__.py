@@ -12,7 +12,7 @@ import attr
 from PyQt5 import uic
 from PyQt5.QtCore import QModelIndex, Qt
 from PyQt5.QtCore import QVariant
-from PyQt5.QtGui import QKeySequence, QFont, QCloseEvent
+from PyQt5.QtGui import QKeySequence, QFont, QCloseEvent, QPalette, QPixmap
 from PyQt5.QtWidgets import QShortcut
 
 import corrscope
@@ -34,15 +34,24 @@ from corrscope.gui.history_file_dlg import (
     get_open_file_list,
     get_save_file_path,
 )
-from corrscope.gui.util import color2hex, Locked, find_ranges, TracebackDialog
+from corrscope.gui.util import (
+    color2hex,
+    Locked,
+    find_ranges,
+    TracebackDialog,
+    overview_pixmap,
+)
 from corrscope.layout import Orientation, StereoOrientation
-from corrscope.outputs import IOutputConfig, FFplayOutputConfig, FFmpegOutputConfig
+from corrscope.gui.preview import PreviewWindow, QtPreviewOutputConfig
+from corrscope.outputs import IOutputConfig, FFmpegOutputConfig
 from corrscope.settings import paths
 from corrscope.triggers import CorrelationTriggerConfig, ITriggerConfig
 from corrscope.util import obj_name
 from corrscope.wave import Flatten
+from corrscope.wave_cache import WaveCache
 
 FILTER_WAV_FILES = ["WAV files (*.wav)"]
+THUMBNAIL_SIZE = qc.QSize(64, 20)
 
 APP_NAME = f"{corrscope.app_name} {corrscope.__version__}"
 APP_DIR = Path(__file__).parent
@@ -103,6 +112,9 @@ class MainWindow(qw.QMainWindow):
         self.channelAdd.clicked.connect(self.on_channel_add)
         self.channelDelete.clicked.connect(self.on_channel_delete)
 
+        # Show waveform thumbnails next to wav paths.
+        self.channel_view.setIconSize(THUMBNAIL_SIZE)
+
         # Bind actions.
         self.action_separate_render_dir.setChecked(self.pref.separate_render_dir)
         self.action_separate_render_dir.toggled.connect(
@@ -119,6 +131,10 @@ class MainWindow(qw.QMainWindow):
 
         # Initialize CorrScope-thread attribute.
         self.corr_thread: Optional[CorrThread] = None
+        self.preview_window: Optional[PreviewWindow] = None
+
+        # Channels' wav files are loaded in the background as they're added.
+        self.wave_cache = WaveCache()
 
         # Bind config to UI.
         if isinstance(cfg_or_path, Config):
@@ -184,6 +200,7 @@ class MainWindow(qw.QMainWindow):
         """Called on closing window."""
         if self.prompt_save():
             gp.dump_prefs(self.pref)
+            self.wave_cache.close()
             event.accept()
         else:
             event.ignore()
@@ -241,14 +258,81 @@ class MainWindow(qw.QMainWindow):
         self.channel_model = ChannelModel(cfg.channels)
         # Calling setModel again disconnects previous model.
         self.channel_view.setModel(self.channel_model)
-        self.channel_model.dataChanged.connect(self.on_model_edited)
+        self.channel_model.dataChanged.connect(self.on_channel_data_changed)
         self.channel_model.rowsInserted.connect(self.on_model_edited)
         self.channel_model.rowsMoved.connect(self.on_model_edited)
         self.channel_model.rowsRemoved.connect(self.on_model_edited)
 
+        self.channel_model.rowsInserted.connect(self.preload_waves)
+        self.channel_model.rowsRemoved.connect(self.preload_waves)
+        self.preload_waves()
+
     def on_model_edited(self):
         self.any_unsaved = True
 
+        # Restyle the running preview, without restarting it.
+        if self.preview_window and self.corr_thread:
+            self.corr_thread.new_cfg.set(copy_config(self.model.cfg))
+
+    def on_channel_data_changed(self, top_left, bottom_right, roles) -> None:
+        # Thumbnails are not part of the document.
+        if list(roles) == [Qt.DecorationRole]:
+            return
+        self.on_model_edited()
+        self.preload_waves()
+
+    def preload_waves(self) -> None:
+        """ Opens and validates each channel's wav file on a background thread,
+        so playback starts without stalling, and errors show up immediately.
+        Then shows each file's thumbnail.
+        Stops loading files no longer used by any channel.
+
+        Files which are already loaded or loading are left alone. """
+        cfg_dir = Path(self.cfg_dir)
+        wav_paths = {
+            channel.wav_path: str(cfg_dir / channel.wav_path)
+            for channel in self.cfg.channels
+            if channel.wav_path
+        }
+        self.wave_cache.cancel(keep=wav_paths.values())
+
+        show_error = run_on_ui_thread(self.on_wave_error, (str,))
+        show_thumbnail = run_on_ui_thread(self.on_wave_loaded, (str,))
+
+        # Preloading more files than the cache holds would evict each other.
+        for wav_path, path in list(wav_paths.items())[: self.wave_cache.maxsize]:
+            if self.wave_cache.peek(path) is not None:
+                continue
+
+            def on_loaded(future, wav_path=wav_path, path=path):
+                if future.cancelled():
+                    return
+                if future.exception():
+                    show_error(f'Error loading "{path}": {future.exception()}')
+                else:
+                    show_thumbnail(wav_path)
+
+            self.wave_cache.preload(path).add_done_callback(on_loaded)
+
+    @qc.pyqtSlot(str)
+    def on_wave_error(self, message: str) -> None:
+        self.statusBar().showMessage(message)
+
+    @qc.pyqtSlot(str)
+    def on_wave_loaded(self, wav_path: str) -> None:
+        # Don't call preload(), which would reload the file if it was evicted.
+        future = self.wave_cache.peek(str(Path(self.cfg_dir) / wav_path))
+        if future is None:
+            return
+        if not future.done() or future.cancelled() or future.exception():
+            return
+
+        overview = future.result().overview
+        if overview is not None:
+            color = self.channel_view.palette().color(QPalette.Text)
+            pixmap = overview_pixmap(overview, THUMBNAIL_SIZE, color)
+            self.channel_model.set_thumbnail(wav_path, pixmap)
+
     title_cache: str
 
     def load_title(self) -> None:
@@ -342,14 +426,17 @@ class MainWindow(qw.QMainWindow):
             return False
 
     def on_action_preview(self):
-        """ Launch CorrScope and ffplay. """
+        """ Launch CorrScope, and show frames in a preview window. """
         error_msg = "Cannot play, another play/render is active"
         if self.corr_thread is not None:
             qw.QMessageBox.critical(self, "Error", error_msg)
             return
 
-        outputs = [FFplayOutputConfig()]
-        self.play_thread(outputs, dlg=None)
+        window = self.preview_window = PreviewWindow(self, f"Preview - {self.title}")
+        window.show()
+
+        outputs = [QtPreviewOutputConfig(window)]
+        self.play_thread(outputs, dlg=None, preview=window)
 
     def on_action_render(self):
         """ Get file name. Then show a progress dialog while rendering to file. """
@@ -375,7 +462,10 @@ class MainWindow(qw.QMainWindow):
             self.play_thread(outputs, dlg)
 
     def play_thread(
-        self, outputs: List[IOutputConfig], dlg: Optional["CorrProgressDialog"]
+        self,
+        outputs: List[IOutputConfig],
+        dlg: Optional["CorrProgressDialog"],
+        preview: Optional[PreviewWindow] = None,
     ):
         assert self.model
 
@@ -385,25 +475,41 @@ class MainWindow(qw.QMainWindow):
 
         if dlg:
             dlg.canceled.connect(t.abort)
+            set_label = run_on_ui_thread(dlg.setLabelText, (str,))
             t.arg = attr.evolve(
                 arg,
                 on_begin=run_on_ui_thread(dlg.on_begin, (float, float)),
                 progress=run_on_ui_thread(dlg.setValue, (int,)),
+                on_progress=lambda event: set_label(str(event)),
+                progress_interval=0.5,
                 is_aborted=t.is_aborted.get,
                 on_end=run_on_ui_thread(dlg.reset, ()),  # TODO dlg.close
             )
 
+        if preview:
+            t.arg = attr.evolve(
+                t.arg,
+                on_begin=run_on_ui_thread(preview.set_range, (float, float)),
+                get_seek=preview.take_seek,
+                get_config=t.take_cfg,
+            )
+
         t.finished.connect(self.on_play_thread_finished)
         t.error.connect(self.on_play_thread_error)
         t.ffmpeg_missing.connect(self.on_play_thread_ffmpeg_missing)
         t.start()
 
     def _get_args(self, outputs: List[IOutputConfig]):
-        arg = Arguments(cfg_dir=self.cfg_dir, outputs=outputs)
+        arg = Arguments(
+            cfg_dir=self.cfg_dir, outputs=outputs, wave_cache=self.wave_cache
+        )
         return arg
 
     def on_play_thread_finished(self):
         self.corr_thread = None
+        if self.preview_window:
+            self.preview_window.close()
+            self.preview_window = None
 
     def on_play_thread_error(self, stack_trace: str):
         TracebackDialog(self).showMessage(stack_trace)
@@ -459,6 +565,15 @@ class CorrThread(qc.QThread):
         self.cfg = cfg
         self.arg = arg
         self.is_aborted = Locked(False)
+        self.new_cfg: Locked[Optional[Config]] = Locked(None)
+
+    def take_cfg(self) -> Optional[Config]:
+        """ Returns the latest config edited during preview (or None),
+        and clears it. Called by CorrScope before each frame. """
+        with self.new_cfg:
+            cfg = self.new_cfg.obj
+            self.new_cfg.obj = None
+        return cfg
 
     def run(self) -> None:
         cfg = self.cfg
@@ -775,6 +890,18 @@ class ChannelModel(qc.QAbstractTableModel):
 
             cfg.trigger = trigger_dict
 
+        # wav_path -> waveform thumbnail, drawn once the file is loaded.
+        self.thumbnails: Dict[str, QPixmap] = {}
+
+    def set_thumbnail(self, wav_path: str, pixmap: QPixmap) -> None:
+        self.thumbnails[wav_path] = pixmap
+
+        col = self.idx_of_key["wav_path"]
+        for row, channel in enumerate(self.channels):
+            if channel.wav_path == wav_path:
+                index = self.index(row, col)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
     def triggers(self, row: int) -> Dict[str, Any]:
         trigger = self.channels[row].trigger
         assert isinstance(trigger, dict)
@@ -846,6 +973,14 @@ class ChannelModel(qc.QAbstractTableModel):
                     return "..." + Path(value).name
             return str(value)
 
+        if (
+            role == Qt.DecorationRole
+            and index.isValid()
+            and row < self.rowCount()
+            and self.col_data[col].key == "wav_path"
+        ):
+            return self.thumbnails.get(self.channels[row].wav_path, nope)
+
         return nope
 
     def setData(self, index: QModelIndex, value: str, role=Qt.EditRole) -> bool:
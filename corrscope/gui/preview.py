@@ -0,0 +1,168 @@
+"""
+In-process preview. CorrScope (running on CorrThread) sends rendered frames
+to a PreviewWindow, timed by audio playback (see RealTimeOutput).
+Dragging the window's slider seeks CorrScope (see Arguments.get_seek),
+once the user releases the slider or pauses dragging.
+"""
+from typing import Optional
+
+import PyQt5.QtCore as qc
+import PyQt5.QtWidgets as qw
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter, QCloseEvent, QPaintEvent
+
+from corrscope.gui.util import Locked
+from corrscope.outputs import (
+    IOutputConfig,
+    RealTimeOutput,
+    register_output,
+    ByteBuffer,
+    Stop,
+    _Stop,
+    RGB_DEPTH,
+)
+
+
+class ImageView(qw.QWidget):
+    """ Displays an image, scaled to fit the widget. """
+
+    def __init__(self, parent: qw.QWidget):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setSizePolicy(qw.QSizePolicy.Expanding, qw.QSizePolicy.Expanding)
+        self.image: Optional[QImage] = None
+
+    def set_image(self, image: QImage) -> None:
+        self.image = image
+        self.update()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        if self.image is None:
+            painter.fillRect(self.rect(), Qt.black)
+        else:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(self.rect(), self.image)
+
+
+# Slider units per second.
+SLIDER_SCALE = 100
+
+# While dragging the slider, seek after it stops moving for this long.
+# (Each seek restarts audio playback.)
+SEEK_DELAY_MS = 200
+
+
+class PreviewWindow(qw.QWidget):
+    """ Displays frames sent from any thread, and a slider to seek playback. """
+
+    # Emitted from CorrThread, received on the UI thread.
+    image_ready = qc.pyqtSignal(QImage)
+    position_changed = qc.pyqtSignal(float)
+
+    closed: Locked[bool]
+
+    # Written by the UI thread, read by CorrThread.
+    _seek: Locked[Optional[float]]
+
+    def __init__(self, parent: Optional[qw.QWidget], title: str):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle(title)
+
+        self.closed = Locked(False)
+        self._seek = Locked(None)
+
+        self._view = ImageView(self)
+        self._slider = qw.QSlider(Qt.Horizontal, self)
+        self._slider.setEnabled(False)
+        self._slider.sliderMoved.connect(self.on_slider_moved)
+        self._slider.sliderReleased.connect(self.commit_seek)
+
+        self._seek_timer = qc.QTimer(self)
+        self._seek_timer.setSingleShot(True)
+        self._seek_timer.setInterval(SEEK_DELAY_MS)
+        self._seek_timer.timeout.connect(self.commit_seek)
+        self._seek_pending = False
+
+        layout = qw.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self._view)
+        layout.addWidget(self._slider)
+
+        self.image_ready.connect(self.show_image)
+        self.position_changed.connect(self.show_position)
+
+    @qc.pyqtSlot(QImage)
+    def show_image(self, image: QImage) -> None:
+        # Fit the window to the first frame.
+        if self._view.image is None:
+            slider_height = self._slider.sizeHint().height()
+            self.resize(image.width(), image.height() + slider_height)
+        self._view.set_image(image)
+
+    # Slider
+
+    @qc.pyqtSlot(float, float)
+    def set_range(self, begin_time: float, end_time: float) -> None:
+        """ Called when playback begins. """
+        self._slider.setRange(
+            round(begin_time * SLIDER_SCALE), round(end_time * SLIDER_SCALE)
+        )
+        self._slider.setEnabled(True)
+
+    @qc.pyqtSlot(float)
+    def show_position(self, time_seconds: float) -> None:
+        # Don't yank the slider away from the user.
+        if not self._slider.isSliderDown():
+            self._slider.setValue(round(time_seconds * SLIDER_SCALE))
+
+    @qc.pyqtSlot(int)
+    def on_slider_moved(self, value: int) -> None:
+        self._seek_pending = True
+        self._seek_timer.start()
+
+    @qc.pyqtSlot()
+    def commit_seek(self) -> None:
+        self._seek_timer.stop()
+        if self._seek_pending:
+            self._seek_pending = False
+            self._seek.set(self._slider.value() / SLIDER_SCALE)
+
+    def take_seek(self) -> Optional[float]:
+        """ Returns the latest time the user seeked to (or None),
+        and clears it. Called by CorrThread before each frame. """
+        with self._seek:
+            seek = self._seek.obj
+            self._seek.obj = None
+        return seek
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.closed.set(True)
+        super().closeEvent(event)
+
+
+class QtPreviewOutputConfig(IOutputConfig):
+    window: PreviewWindow
+
+
+@register_output(QtPreviewOutputConfig)
+class QtPreviewOutput(RealTimeOutput):
+    cfg: QtPreviewOutputConfig
+
+    def show_frame(self, rgb: ByteBuffer) -> Optional[_Stop]:
+        window = self.cfg.window
+        if window.closed.get():
+            return Stop
+
+        rcfg = self.corr_cfg.render
+        width = rcfg.width
+        data = memoryview(rgb).tobytes()  # type: ignore
+
+        # QImage does not own `data`, so copy it before `data` is freed.
+        image = QImage(
+            data, width, rcfg.height, width * RGB_DEPTH, QImage.Format_RGB888
+        ).copy()
+        window.image_ready.emit(image)
+        window.position_changed.emit(self._frame_time)
+        return None
@@ -3,10 +3,13 @@ from typing import TypeVar, Iterable, Generic, Tuple, Any, Optional
 
 import matplotlib.colors
 import more_itertools
-from PyQt5.QtCore import QMutex
+import numpy as np
+from PyQt5.QtCore import QMutex, QSize, Qt
+from PyQt5.QtGui import QPixmap, QPainter, QColor
 from PyQt5.QtWidgets import QErrorMessage, QWidget
 
 from corrscope.config import CorrError
+from corrscope.overview import Overview
 
 
 def color2hex(color: Any) -> str:
@@ -18,6 +21,24 @@ def color2hex(color: Any) -> str:
         raise CorrError(f"doubly invalid color {color}, raises {e} (report bug!)")
 
 
+def overview_pixmap(overview: Overview, size: QSize, color: QColor) -> QPixmap:
+    """ Draws a thumbnail of an entire file, one vertical line per column. """
+    width, height = size.width(), size.height()
+
+    # Map amplitude [-1, 1] to y-coordinate [height - 1, 0].
+    minmax = np.clip(overview.get(width), -1, 1)
+    ys = np.rint((1 - minmax) * ((height - 1) / 2)).astype(int)
+
+    pixmap = QPixmap(size)
+    pixmap.fill(Qt.transparent)
+    painter = QPainter(pixmap)
+    painter.setPen(color)
+    for x, (y_min, y_max) in enumerate(ys.tolist()):
+        painter.drawLine(x, y_max, x, y_min)
+    painter.end()
+    return pixmap
+
+
 T = TypeVar("T")
 
 
@@ -1,25 +1,71 @@
+import collections
 import errno
+import math
+import os
 import shlex
+import struct
 import subprocess
+import threading
+import time
+import warnings
+import zlib
 from abc import ABC, abstractmethod
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor, Future
 from os.path import abspath
-from typing import TYPE_CHECKING, Type, List, Union, Optional, ClassVar, Callable
-
+from typing import (
+    TYPE_CHECKING,
+    Type,
+    List,
+    Union,
+    Optional,
+    ClassVar,
+    Callable,
+    Deque,
+    Tuple,
+)
+
+import attr
 import numpy as np
 
-from corrscope.config import DumpableAttrs
+from corrscope import frame_ring
+from corrscope.config import DumpableAttrs, CorrError, CorrWarning
+from corrscope.frame_ring import FrameRing
 from corrscope.settings.paths import MissingFFmpegError
+from corrscope.util import coalesce
+from corrscope.utils.colorspace import (
+    IndexedFrame,
+    PALETTE_SIZE,
+    rgb_to_yuv420p,
+    yuv420p_nbytes,
+    indexed_to_rgb,
+    indexed_to_yuv420p,
+    pal8_palette,
+)
 
 if TYPE_CHECKING:
     from corrscope.corrscope import Config
 
 
 ByteBuffer = Union[bytes, np.ndarray]
+Frame = Union[ByteBuffer, IndexedFrame]
 RGB_DEPTH = 3
 PIXEL_FORMAT = "rgb24"
 
+# Converted by corrscope instead of FFmpeg. Only supports even width and height.
+YUV420P = "yuv420p"
+
+# Palette indices, followed by the palette. See IndexedFrame.
+PAL8 = "pal8"
+
+PIXEL_FORMATS = [PIXEL_FORMAT, YUV420P, PAL8]
+
 FRAMES_TO_BUFFER = 2
 
+# Frame slots in shared memory, when FFmpegOutputConfig.shared_memory is enabled.
+RING_SLOTS = 4
+RING_POLL_SECONDS = 0.001
+
 FFMPEG_QUIET = "-nostats -hide_banner -loglevel error".split()
 
 
@@ -37,21 +83,103 @@ class _Stop:
 Stop = _Stop()
 
 
+@attr.dataclass
+class OutputStats:
+    """ Measures whether an Output (or the encoder behind it) is a bottleneck. """
+
+    nframes: int = 0
+    nbytes: int = 0
+
+    # Seconds spent converting frames to the Output's pixel format.
+    encode_seconds: float = 0.0
+
+    # Seconds spent waiting for the encoder to accept frames.
+    write_seconds: float = 0.0
+
+    # CPU seconds used by this Output's processes (FFmpeg), or None if unknown.
+    process_cpu_seconds: Optional[float] = None
+
+    begin: float = attr.ib(factory=time.perf_counter)
+    end: Optional[float] = None
+
+    def add_frame(
+        self, buffers: List[ByteBuffer], encode_seconds: float, write_seconds: float
+    ) -> None:
+        self.nframes += 1
+        self.nbytes += sum(memoryview(buffer).nbytes for buffer in buffers)
+        self.encode_seconds += encode_seconds
+        self.write_seconds += write_seconds
+
+    @property
+    def elapsed(self) -> float:
+        return coalesce(self.end, time.perf_counter()) - self.begin
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.nbytes / max(self.elapsed, 1e-9)
+
+    def __str__(self) -> str:
+        text = (
+            f"{self.bytes_per_second / 1e6:.1f} MB/s, "
+            f"converting {self.encode_seconds:.2f} s, "
+            f"blocked {self.write_seconds:.2f} s"
+        )
+        if self.process_cpu_seconds is not None:
+            text += f", encoder CPU {self.process_cpu_seconds:.2f} s"
+        return text
+
+
+def _wait_cpu_seconds(popen: subprocess.Popen) -> Tuple[int, Optional[float]]:
+    """ Waits for `popen` to exit. Returns its exit code, and the CPU time it used
+    (or None if unknown, like on Windows).
+
+    Unlike RUSAGE_CHILDREN, excludes other child processes (like other Outputs). """
+    if popen.returncode is None and hasattr(os, "wait4"):
+        try:
+            _, status, usage = os.wait4(popen.pid, 0)
+        except ChildProcessError:
+            pass
+        else:
+            # Like os.waitstatus_to_exitcode() (Python 3.9).
+            if os.WIFSIGNALED(status):
+                popen.returncode = -os.WTERMSIG(status)
+            else:
+                popen.returncode = os.WEXITSTATUS(status)
+            return popen.returncode, usage.ru_utime + usage.ru_stime
+
+    return popen.wait(), None
+
+
 class Output(ABC):
+    # Pixel format this Output writes.
+    # If PAL8, the Output is passed IndexedFrame, otherwise rgb24 ByteBuffer.
+    pixel_format: str = PIXEL_FORMAT
+
     def __init__(self, corr_cfg: "Config", cfg: IOutputConfig):
         self.corr_cfg = corr_cfg
         self.cfg = cfg
+        self.stats = OutputStats()
 
         rcfg = corr_cfg.render
 
-        frame_bytes = rcfg.height * rcfg.width * RGB_DEPTH
+        frame_bytes = frame_nbytes(PIXEL_FORMAT, rcfg.width, rcfg.height)
         self.bufsize = frame_bytes * FRAMES_TO_BUFFER
 
     def __enter__(self):
         return self
 
+    def wants_frame(self, time_seconds: float) -> bool:
+        """ Called before rendering each frame. If no Output wants the frame,
+        it is not rendered or written. Real-time outputs skip late frames. """
+        return True
+
+    def seek(self, time_seconds: float) -> None:
+        """ Called when the user seeks the preview.
+        The next frame written is at `time_seconds`. """
+        pass
+
     @abstractmethod
-    def write_frame(self, frame: ByteBuffer) -> Optional[_Stop]:
+    def write_frame(self, frame: Frame) -> Optional[_Stop]:
         """ Output a Numpy ndarray. """
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -74,15 +202,73 @@ def register_output(
     return inner
 
 
+# Pixel formats
+
+
+def frame_nbytes(pixel_format: str, width: int, height: int) -> int:
+    if pixel_format == YUV420P:
+        return yuv420p_nbytes(width, height)
+    if pixel_format == PAL8:
+        return width * height + PALETTE_SIZE * 4
+    return width * height * RGB_DEPTH
+
+
+def encode_frame(
+    frame: Frame, pixel_format: str, corr_cfg: "Config"
+) -> List[ByteBuffer]:
+    """ Converts a frame from the renderer into `pixel_format`.
+    Returns a list of buffers to be written consecutively. """
+    if isinstance(frame, IndexedFrame):
+        if pixel_format == PAL8:
+            return [frame.indices, pal8_palette(frame.palette)]
+        if pixel_format == YUV420P:
+            return [indexed_to_yuv420p(frame.indices, frame.palette)]
+        return [indexed_to_rgb(frame.indices, frame.palette)]
+
+    if pixel_format == YUV420P:
+        rcfg = corr_cfg.render
+        rgb = np.frombuffer(frame, dtype=np.uint8)
+        return [rgb_to_yuv420p(rgb.reshape(rcfg.height, rcfg.width, RGB_DEPTH))]
+    if pixel_format == PAL8:
+        raise TypeError(f"cannot convert rgb24 frames to {PAL8}")
+    return [frame]
+
+
+def negotiate_pixel_format(pixel_format: str, corr_cfg: "Config") -> str:
+    """ Returns the pixel format to send FFmpeg,
+    falling back to rgb24 if `pixel_format` cannot represent the frame. """
+    if pixel_format == YUV420P:
+        width = corr_cfg.render.width
+        height = corr_cfg.render.height
+        if width % 2 or height % 2:
+            warnings.warn(
+                f"Cannot output {YUV420P} with odd resolution {width}x{height}, "
+                f"falling back to {PIXEL_FORMAT}",
+                CorrWarning,
+            )
+            return PIXEL_FORMAT
+    return pixel_format
+
+
 # FFmpeg command line generation
 
 
 class _FFmpegProcess:
-    def __init__(self, templates: List[str], corr_cfg: "Config"):
+    def __init__(
+        self,
+        templates: List[str],
+        corr_cfg: "Config",
+        pixel_format: str = PIXEL_FORMAT,
+        video_templates: Optional[List[str]] = None,
+    ):
+        """ By default, video is read from stdin.
+        `video_templates` overrides the video input. """
         self.templates = templates
         self.corr_cfg = corr_cfg
 
-        self.templates += ffmpeg_input_video(corr_cfg)  # video
+        if video_templates is None:
+            video_templates = ffmpeg_input_video(corr_cfg, pixel_format)
+        self.templates += video_templates  # video
         if corr_cfg.master_audio:
             # Load master audio and trim to timestamps.
 
@@ -91,11 +277,14 @@ class _FFmpegProcess:
             audio_path = shlex.quote(abspath(corr_cfg.master_audio))
             self.templates += ffmpeg_input_audio(audio_path)  # audio
 
-            if corr_cfg.end_time is not None:
-                dur = corr_cfg.end_time - corr_cfg.begin_time
-                self.templates.append(f"-to {dur}")
+        # Output options apply to one output, so are repeated by add_output().
+        self._trim_templates = []  # type: List[str]
+        if corr_cfg.master_audio and corr_cfg.end_time is not None:
+            dur = corr_cfg.end_time - corr_cfg.begin_time
+            self._trim_templates.append(f"-to {dur}")
 
     def add_output(self, cfg: "Union[FFmpegOutputConfig, FFplayOutputConfig]") -> None:
+        self.templates += self._trim_templates
         self.templates.append(cfg.video_template)  # video
         if self.corr_cfg.master_audio:
             self.templates.append(cfg.audio_template)  # audio
@@ -114,13 +303,13 @@ class _FFmpegProcess:
         return [arg for template in self.templates for arg in shlex.split(template)]
 
 
-def ffmpeg_input_video(cfg: "Config") -> List[str]:
+def ffmpeg_input_video(cfg: "Config", pixel_format: str = PIXEL_FORMAT) -> List[str]:
     fps = cfg.render_fps
     width = cfg.render.width
     height = cfg.render.height
 
     return [
-        f"-f rawvideo -pixel_format {PIXEL_FORMAT} -video_size {width}x{height}",
+        f"-f rawvideo -pixel_format {pixel_format} -video_size {width}x{height}",
         f"-framerate {fps}",
         *FFMPEG_QUIET,
         "-i -",
@@ -132,8 +321,15 @@ def ffmpeg_input_audio(audio_path: str) -> List[str]:
 
 
 class PipeOutput(Output):
-    def open(self, *pipeline: subprocess.Popen) -> None:
-        """ Called by __init__ with a Popen pipeline to ffmpeg/ffplay. """
+    _ring: Optional[FrameRing] = None
+
+    def open(
+        self, *pipeline: subprocess.Popen, ring: Optional[FrameRing] = None
+    ) -> None:
+        """ Called by __init__ with a Popen pipeline to ffmpeg/ffplay.
+
+        If `ring` is passed, pipeline[0] must be a frame_ring reader process.
+        Frames are copied into `ring`, and only their lengths are piped. """
         if len(pipeline) == 0:
             raise TypeError("must provide at least one Popen argument to popens")
 
@@ -142,12 +338,31 @@ class PipeOutput(Output):
         # Python documentation discourages accessing popen.stdin. It's wrong.
         # https://stackoverflow.com/a/9886747
 
+        self._ring = ring
+        self._nwritten = 0
+
     def __enter__(self) -> Output:
         return self
 
-    def write_frame(self, frame: ByteBuffer) -> Optional[_Stop]:
+    def write_frame(self, frame: Frame) -> Optional[_Stop]:
+        begin = time.perf_counter()
+        buffers = encode_frame(frame, self.pixel_format, self.corr_cfg)
+        encoded = time.perf_counter()
+
         try:
-            self._stream.write(frame)
+            return self._write_buffers(buffers)
+        finally:
+            self.stats.add_frame(
+                buffers, encoded - begin, time.perf_counter() - encoded
+            )
+
+    def _write_buffers(self, buffers: List[ByteBuffer]) -> Optional[_Stop]:
+        try:
+            if self._ring is not None:
+                return self._write_ring(buffers)
+
+            for buffer in buffers:
+                self._stream.write(buffer)
             return None
 
         # Exception handling taken from Popen._stdin_write().
@@ -163,6 +378,27 @@ class PipeOutput(Output):
             else:
                 raise
 
+    def _write_ring(self, buffers: List[ByteBuffer]) -> Optional[_Stop]:
+        ring = self._ring
+        reader = self._pipeline[0]
+
+        # Wait for the reader to free a slot.
+        while self._nwritten - ring.nread >= ring.nslot:
+            if reader.poll() is not None:
+                return Stop
+            time.sleep(RING_POLL_SECONDS)
+
+        slot = ring.slot(self._nwritten)
+        nbytes = 0
+        for buffer in buffers:
+            data = memoryview(buffer).cast("B")
+            slot[nbytes : nbytes + len(data)] = data
+            nbytes += len(data)
+
+        self._stream.write(frame_ring.MESSAGE.pack(nbytes))
+        self._nwritten += 1
+        return None
+
     def close(self, wait: bool = True) -> int:
         try:
             self._stream.close()
@@ -172,13 +408,29 @@ class PipeOutput(Output):
             pass
 
         if not wait:
+            self.stats.end = time.perf_counter()
             return 0
 
         retval = 0
+        cpu_seconds: Optional[float] = 0.0
         for popen in self._pipeline:
-            retval |= popen.wait()
+            exit_code, popen_seconds = _wait_cpu_seconds(popen)
+            retval |= exit_code
+            if cpu_seconds is not None and popen_seconds is not None:
+                cpu_seconds += popen_seconds
+            else:
+                cpu_seconds = None
+        self._close_ring()
+
+        self.stats.end = time.perf_counter()
+        self.stats.process_cpu_seconds = cpu_seconds
         return retval  # final value
 
+    def _close_ring(self) -> None:
+        if self._ring is not None:
+            self._ring.close(unlink=True)
+            self._ring = None
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is None:
             self.close()
@@ -202,6 +454,7 @@ class PipeOutput(Output):
                 exc = e
                 popen.kill()
 
+        self._close_ring()
         if exc:
             raise exc
 
@@ -217,6 +470,23 @@ class FFmpegOutputConfig(IOutputConfig):
     video_template: str = "-c:v libx264 -crf 18 -preset superfast -movflags faststart"
     audio_template: str = "-c:a aac -b:a 384k"
 
+    # rgb24 is converted by FFmpeg (libx264 picks yuv444p).
+    # yuv420p is converted by corrscope, which costs FFmpeg less CPU.
+    # pal8 sends 1/3 as much data as rgb24, but approximates antialiased colors.
+    pixel_format: str = PIXEL_FORMAT
+
+    # Pass frames to FFmpeg through shared memory and a reader process,
+    # so writing a frame does not wait for FFmpeg to read the pipe.
+    # Falls back to a pipe if the reader cannot be started.
+    shared_memory: bool = False
+
+    def __attrs_post_init__(self) -> None:
+        if self.pixel_format not in PIXEL_FORMATS:
+            raise CorrError(
+                f"Invalid pixel_format={self.pixel_format} "
+                f"(should be one of {PIXEL_FORMATS})"
+            )
+
 
 FFMPEG = "ffmpeg"
 
@@ -226,7 +496,12 @@ class FFmpegOutput(PipeOutput):
     def __init__(self, corr_cfg: "Config", cfg: FFmpegOutputConfig):
         super().__init__(corr_cfg, cfg)
 
-        ffmpeg = _FFmpegProcess([FFMPEG, "-y"], corr_cfg)
+        rcfg = corr_cfg.render
+        self.pixel_format = negotiate_pixel_format(cfg.pixel_format, corr_cfg)
+        frame_bytes = frame_nbytes(self.pixel_format, rcfg.width, rcfg.height)
+        self.bufsize = frame_bytes * FRAMES_TO_BUFFER
+
+        ffmpeg = _FFmpegProcess([FFMPEG, "-y"], corr_cfg, self.pixel_format)
         ffmpeg.add_output(cfg)
         ffmpeg.templates.append(cfg.args)
 
@@ -235,7 +510,23 @@ class FFmpegOutput(PipeOutput):
         else:
             video_path = abspath(cfg.path)
 
-        self.open(ffmpeg.popen([video_path], self.bufsize))
+        if cfg.shared_memory and frame_ring.can_spawn_reader():
+            self._open_ring(ffmpeg.popen([video_path], self.bufsize), frame_bytes)
+        else:
+            self.open(ffmpeg.popen([video_path], self.bufsize))
+
+    def _open_ring(self, ffmpeg_popen: subprocess.Popen, frame_bytes: int) -> None:
+        ring = FrameRing.create(RING_SLOTS, frame_bytes)
+        try:
+            reader = frame_ring.spawn_reader(ring, stdout=ffmpeg_popen.stdin)
+        except OSError:
+            ring.close(unlink=True)
+            self.open(ffmpeg_popen)
+            return
+
+        # Only the reader writes to FFmpeg.
+        ffmpeg_popen.stdin.close()
+        self.open(reader, ffmpeg_popen, ring=ring)
 
 
 # FFplayOutput
@@ -259,14 +550,566 @@ class FFplayOutput(PipeOutput):
         ffmpeg.templates.append("-f nut")
 
         p1 = ffmpeg.popen(["-"], self.bufsize, stdout=subprocess.PIPE)
+        p2 = _popen_ffplay(p1)
+        self.open(p1, p2)
+
+
+def _popen_ffplay(ffmpeg_popen: subprocess.Popen) -> subprocess.Popen:
+    """ Launches FFplay, reading NUT video from FFmpeg's stdout. """
+    ffplay = shlex.split("ffplay -autoexit -") + FFMPEG_QUIET
+    try:
+        popen = subprocess.Popen(ffplay, stdin=ffmpeg_popen.stdout)
+    except FileNotFoundError:
+        raise MissingFFmpegError()
+
+    ffmpeg_popen.stdout.close()
+    # assert popen.stdin is None   # True unless Popen is being mocked (test_output).
+    return popen
+
+
+# FFmpegTeeOutput
+
+
+class FFmpegTeeOutputConfig(IOutputConfig):
+    """ Encodes several outputs using one FFmpeg process,
+    so each frame is written, converted, and decoded once. """
+
+    # FFmpegOutputConfig, and at most one FFplayOutputConfig.
+    outputs: List[Union[FFmpegOutputConfig, FFplayOutputConfig]]
 
-        ffplay = shlex.split("ffplay -autoexit -") + FFMPEG_QUIET
+    def __attrs_post_init__(self) -> None:
+        nplay = 0
+        for cfg in self.outputs:
+            if isinstance(cfg, FFplayOutputConfig):
+                nplay += 1
+            elif not isinstance(cfg, FFmpegOutputConfig):
+                raise CorrError(
+                    f"FFmpegTeeOutputConfig cannot contain {type(cfg).__name__}"
+                )
+        if nplay > 1:
+            raise CorrError("FFmpegTeeOutputConfig can contain only one FFplay output")
+
+
+@register_output(FFmpegTeeOutputConfig)
+class FFmpegTeeOutput(PipeOutput):
+    def __init__(self, corr_cfg: "Config", cfg: FFmpegTeeOutputConfig):
+        super().__init__(corr_cfg, cfg)
+
+        ffmpeg_cfgs = [c for c in cfg.outputs if isinstance(c, FFmpegOutputConfig)]
+        ffplay_cfgs = [c for c in cfg.outputs if isinstance(c, FFplayOutputConfig)]
+
+        rcfg = corr_cfg.render
+        self.pixel_format = negotiate_pixel_format(
+            self._common_pixel_format(ffmpeg_cfgs, ffplay_cfgs), corr_cfg
+        )
+        frame_bytes = frame_nbytes(self.pixel_format, rcfg.width, rcfg.height)
+        self.bufsize = frame_bytes * FRAMES_TO_BUFFER
+
+        ffmpeg = _FFmpegProcess([FFMPEG, "-y"], corr_cfg, self.pixel_format)
+        for ffmpeg_cfg in ffmpeg_cfgs:
+            ffmpeg.add_output(ffmpeg_cfg)
+            ffmpeg.templates.append(ffmpeg_cfg.args)
+            if ffmpeg_cfg.path is None:
+                ffmpeg.templates.append("-")  # Write to stdout
+            else:
+                ffmpeg.templates.append(shlex.quote(abspath(ffmpeg_cfg.path)))
+
+        if ffplay_cfgs:
+            # FFplay reads from stdout, so FFmpeg outputs cannot.
+            if any(c.path is None for c in ffmpeg_cfgs):
+                raise CorrError(
+                    "FFmpegTeeOutputConfig cannot write FFmpeg and FFplay to stdout"
+                )
+            (ffplay_cfg,) = ffplay_cfgs
+            ffmpeg.add_output(ffplay_cfg)
+            ffmpeg.templates.append("-f nut")
+
+            p1 = ffmpeg.popen(["-"], self.bufsize, stdout=subprocess.PIPE)
+            self.open(p1, _popen_ffplay(p1))
+        else:
+            self.open(ffmpeg.popen([], self.bufsize))
+
+    @staticmethod
+    def _common_pixel_format(
+        ffmpeg_cfgs: List[FFmpegOutputConfig], ffplay_cfgs: List[FFplayOutputConfig]
+    ) -> str:
+        """ All outputs share one input, so they must agree on a pixel format.
+        FFplay only receives rgb24. """
+        pixel_formats = {c.pixel_format for c in ffmpeg_cfgs}
+        if ffplay_cfgs:
+            pixel_formats.add(PIXEL_FORMAT)
+
+        if len(pixel_formats) == 1:
+            return pixel_formats.pop()
+        if pixel_formats:
+            warnings.warn(
+                f"FFmpegTeeOutputConfig outputs request different pixel formats "
+                f"{sorted(pixel_formats)}, falling back to {PIXEL_FORMAT}",
+                CorrWarning,
+            )
+        return PIXEL_FORMAT
+
+
+def is_record_output(cfg: IOutputConfig) -> bool:
+    """ Returns whether `cfg` writes video to a file. """
+    if isinstance(cfg, FFmpegTeeOutputConfig):
+        return any(is_record_output(c) for c in cfg.outputs)
+    return isinstance(
+        cfg, (FFmpegOutputConfig, ImageSequenceOutputConfig, RawVideoOutputConfig)
+    )
+
+
+# RealTimeOutput
+
+
+def parse_ffplay_status(line: bytes) -> Optional[float]:
+    """ Returns the playback position (master clock) from an FFplay -stats line,
+    like b"   1.23 M-A:  0.000 fd=   0 aq=   12KB vq=    0KB sq=    0B",
+    or None if `line` isn't a status line or playback hasn't started. """
+    fields = line.split(None, 1)
+    if not fields:
+        return None
+    try:
+        position = float(fields[0])
+    except ValueError:
+        return None
+    if not math.isfinite(position):
+        return None
+    return position
+
+
+class AudioClock:
+    """ Plays `audio_path` from `begin_time` using FFplay (without video),
+    and tells how far playback has progressed.
+    If `audio_path` is empty, only keeps time.
+
+    FFplay -stats reports its audio clock (which excludes audio still buffered
+    for the sound device) several times a second. Until the first report,
+    playback has not started, so the clock holds at `begin_time`.
+    If FFplay doesn't report within STATUS_TIMEOUT, falls back to wall time. """
+
+    STATUS_TIMEOUT = 2.0
+
+    def __init__(self, audio_path: str, begin_time: float):
+        self._begin_time = begin_time
+        self._popen: Optional[subprocess.Popen] = None
+
+        # Playback position minus time.monotonic(), or None before FFplay reports.
+        self._offset: Optional[float] = None
+
+        if audio_path:
+            args = [FFPLAY, "-nodisp", "-autoexit", "-ss", str(begin_time)]
+            args += FFMPEG_QUIET + ["-stats", audio_path]
+            try:
+                self._popen = subprocess.Popen(
+                    args, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE
+                )
+            except FileNotFoundError:
+                raise MissingFFmpegError()
+
+            threading.Thread(
+                target=self._read_status,
+                args=(self._popen.stderr,),
+                name="ffplay_status",
+                daemon=True,
+            ).start()
+
+        self._start = time.monotonic()
+        if not audio_path:
+            self._offset = begin_time - self._start
+
+    def _read_status(self, stream) -> None:
+        """ Reads FFplay's status lines (ending in \r) until it exits. """
+        pending = b""
+        with stream:
+            for chunk in iter(lambda: stream.read1(4096), b""):
+                *lines, pending = (pending + chunk).replace(b"\n", b"\r").split(b"\r")
+                for line in lines:
+                    self.report(line)
+
+    def report(self, line: bytes) -> None:
+        """ Called with each line FFplay prints. """
+        position = parse_ffplay_status(line)
+        if position is not None:
+            self._offset = position - time.monotonic()
+
+    def now(self) -> float:
+        """ Returns the current playback position, in seconds. """
+        now = time.monotonic()
+        offset = self._offset
+        if offset is None:
+            if now - self._start < self.STATUS_TIMEOUT:
+                # Audio is not playing yet.
+                return self._begin_time
+            offset = self._offset = self._begin_time - self._start
+        return now + offset
+
+    def close(self) -> None:
+        if self._popen is not None:
+            self._popen.terminate()
+            self._popen.wait()
+            self._popen = None
+
+
+class RealTimeOutput(Output):
+    """ Shows frames in-process when audio playback reaches them, instead of
+    piping frames through FFmpeg into FFplay.
+
+    Instead of blocking when corrscope falls behind, skips frames which are
+    already late (before they are rendered). """
+
+    def __init__(self, corr_cfg: "Config", cfg: IOutputConfig):
+        super().__init__(corr_cfg, cfg)
+        self._frame_seconds = 1 / corr_cfg.render_fps
+        self._frame_time = corr_cfg.begin_time
+
+        # Seeking restarts playback, after leaving the config directory.
+        self._audio_path = ""
+        if corr_cfg.master_audio:
+            self._audio_path = abspath(corr_cfg.master_audio)
+        self._clock = AudioClock(self._audio_path, corr_cfg.begin_time)
+
+    def wants_frame(self, time_seconds: float) -> bool:
+        self._frame_time = time_seconds
+        return self._clock.now() < time_seconds + self._frame_seconds
+
+    def seek(self, time_seconds: float) -> None:
+        self._clock.close()
+        self._frame_time = time_seconds
+        self._clock = AudioClock(self._audio_path, time_seconds)
+
+    def write_frame(self, frame: Frame) -> Optional[_Stop]:
+        # Wait until audio reaches the frame.
+        delay = self._frame_time - self._clock.now()
+        if delay > 0:
+            time.sleep(delay)
+
+        begin = time.perf_counter()
+        (rgb,) = encode_frame(frame, PIXEL_FORMAT, self.corr_cfg)
+        ret = self.show_frame(rgb)
+        self.stats.add_frame([rgb], 0.0, time.perf_counter() - begin)
+        return ret
+
+    @abstractmethod
+    def show_frame(self, rgb: ByteBuffer) -> Optional[_Stop]:
+        """ Displays `rgb` (in rgb24 format).
+        Returns Stop if the user closed the display. """
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._clock.close()
+        self.stats.end = time.perf_counter()
+
+    def terminate(self):
+        self._clock.close()
+
+
+# ImageSequenceOutput
+
+PNG_EXT = ".png"
+RAW_EXT = ".rgb"
+
+
+class ImageSequenceOutputConfig(IOutputConfig):
+    # Path of each frame, containing a printf-style frame number (like FFmpeg).
+    # .png writes PNG images, .rgb writes raw rgb24 pixels.
+    path: str = "frames/%06d.png"
+
+    # 0 uses one thread per CPU.
+    nthreads: int = 0
+    png_compression: int = 3
+
+    def __attrs_post_init__(self) -> None:
         try:
-            p2 = subprocess.Popen(ffplay, stdin=p1.stdout)
-        except FileNotFoundError:
-            raise MissingFFmpegError()
+            self.path % 0
+        except TypeError:
+            raise CorrError(
+                f'Invalid path="{self.path}", must contain one frame number like %06d'
+            )
 
-        p1.stdout.close()
-        # assert p2.stdin is None   # True unless Popen is being mocked (test_output).
+        ext = os.path.splitext(self.path)[1].lower()
+        if ext not in [PNG_EXT, RAW_EXT]:
+            raise CorrError(
+                f'Invalid path="{self.path}", must end in {PNG_EXT} or {RAW_EXT}'
+            )
 
-        self.open(p1, p2)
+
+@register_output(ImageSequenceOutputConfig)
+class ImageSequenceOutput(Output):
+    """ Writes each frame to a separate file.
+    Frames are compressed and written by a thread pool
+    (zlib and file writes release the GIL). """
+
+    def __init__(self, corr_cfg: "Config", cfg: ImageSequenceOutputConfig):
+        super().__init__(corr_cfg, cfg)
+
+        self._path = abspath(cfg.path)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        self._is_png = self._path.lower().endswith(PNG_EXT)
+
+        nthreads = cfg.nthreads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(nthreads)
+        self._max_pending = nthreads * 2
+        self._pending = collections.deque()  # type: Deque[Future]
+        self._frame_idx = 0
+
+    def write_frame(self, frame: Frame) -> None:
+        # Block until a worker is free, so frames don't accumulate in memory.
+        # Also raises any exception from writing earlier frames.
+        begin = time.perf_counter()
+        while len(self._pending) >= self._max_pending:
+            self._pending.popleft().result()
+        waited = time.perf_counter()
+
+        # Frames are never modified after being passed to outputs,
+        # so workers can read them without copying.
+        (rgb,) = encode_frame(frame, PIXEL_FORMAT, self.corr_cfg)
+        path = self._path % self._frame_idx
+        self._frame_idx += 1
+
+        self._pending.append(self._pool.submit(self._write_image, path, rgb))
+        self.stats.add_frame([rgb], time.perf_counter() - waited, waited - begin)
+
+    def _write_image(self, path: str, rgb: ByteBuffer) -> None:
+        if self._is_png:
+            rcfg = self.corr_cfg.render
+            data = encode_png(
+                np.frombuffer(rgb, np.uint8).reshape(rcfg.height, rcfg.width, 3),
+                self.cfg.png_compression,
+            )
+        else:
+            data = rgb
+
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def close(self) -> None:
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pool.shutdown()
+            self.stats.end = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def terminate(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown()
+        self.stats.end = time.perf_counter()
+
+
+def encode_png(rgb: "np.ndarray[np.uint8]", compression: int) -> bytes:
+    """ Encodes (height, width, 3) uint8 pixels as an 8-bit RGB PNG. """
+    height, width, depth = rgb.shape
+    assert depth == 3, rgb.shape
+
+    # Each row begins with a filter type. Sub (1) stores the difference
+    # from the pixel to the left, which is 0 in flat areas and compresses well.
+    rows = rgb.reshape(height, width * depth)
+    filtered = np.empty((height, 1 + width * depth), dtype=np.uint8)
+    filtered[:, 0] = 1
+    filtered[:, 1 : 1 + depth] = rows[:, :depth]
+    np.subtract(rows[:, depth:], rows[:, :-depth], out=filtered[:, 1 + depth :])
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(data, zlib.crc32(kind))
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    # 8 bits per channel, color type 2 (RGB), default compression/filter/interlace.
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", header),
+            chunk(b"IDAT", zlib.compress(filtered.tobytes(), compression)),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+# RawVideoOutput
+
+RAW_VIDEO_MAGIC = b"CORRRAW1"
+
+# magic, width, height, fps numerator, fps denominator,
+# pixel format, bytes per frame, frame count.
+_RAW_VIDEO_HEADER = struct.Struct("<8sIIII16sQQ")
+
+# Frames begin on a page boundary, for memory-mapping.
+RAW_VIDEO_HEADER_SIZE = 4096
+
+# Frames are buffered into large sequential writes.
+RAW_VIDEO_BUFFER = 8 * 1024 * 1024
+
+
+@attr.dataclass
+class RawVideoHeader:
+    width: int
+    height: int
+    fps: Fraction
+    pixel_format: str
+    frame_nbytes: int
+    nframes: int = 0
+
+    def pack(self) -> bytes:
+        header = _RAW_VIDEO_HEADER.pack(
+            RAW_VIDEO_MAGIC,
+            self.width,
+            self.height,
+            self.fps.numerator,
+            self.fps.denominator,
+            self.pixel_format.encode("ascii"),
+            self.frame_nbytes,
+            self.nframes,
+        )
+        return header.ljust(RAW_VIDEO_HEADER_SIZE, b"\0")
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "RawVideoHeader":
+        if len(data) < _RAW_VIDEO_HEADER.size:
+            raise CorrError("Raw video file is truncated")
+        (
+            magic,
+            width,
+            height,
+            fps_num,
+            fps_den,
+            pixel_format,
+            frame_nbytes,
+            nframes,
+        ) = _RAW_VIDEO_HEADER.unpack_from(data)
+        if magic != RAW_VIDEO_MAGIC:
+            raise CorrError("Not a corrscope raw video file")
+        return cls(
+            width,
+            height,
+            Fraction(fps_num, fps_den),
+            pixel_format.rstrip(b"\0").decode("ascii"),
+            frame_nbytes,
+            nframes,
+        )
+
+
+class RawVideoOutputConfig(IOutputConfig):
+    """ Writes uncompressed frames to a file, to be encoded later
+    by encode_raw_video(). """
+
+    path: str
+    pixel_format: str = PIXEL_FORMAT
+
+    def __attrs_post_init__(self) -> None:
+        if self.pixel_format not in PIXEL_FORMATS:
+            raise CorrError(
+                f"Invalid pixel_format={self.pixel_format} "
+                f"(should be one of {PIXEL_FORMATS})"
+            )
+
+
+@register_output(RawVideoOutputConfig)
+class RawVideoOutput(Output):
+    def __init__(self, corr_cfg: "Config", cfg: RawVideoOutputConfig):
+        super().__init__(corr_cfg, cfg)
+
+        rcfg = corr_cfg.render
+        self.pixel_format = negotiate_pixel_format(cfg.pixel_format, corr_cfg)
+        self._header = RawVideoHeader(
+            rcfg.width,
+            rcfg.height,
+            Fraction(corr_cfg.render_fps),
+            self.pixel_format,
+            frame_nbytes(self.pixel_format, rcfg.width, rcfg.height),
+        )
+
+        self._file = open(abspath(cfg.path), "wb", buffering=RAW_VIDEO_BUFFER)
+        self._file.write(self._header.pack())
+
+    def write_frame(self, frame: Frame) -> None:
+        begin = time.perf_counter()
+        buffers = encode_frame(frame, self.pixel_format, self.corr_cfg)
+        encoded = time.perf_counter()
+
+        for buffer in buffers:
+            self._file.write(buffer)
+        self._header.nframes += 1
+        self.stats.add_frame(buffers, encoded - begin, time.perf_counter() - encoded)
+
+    def close(self) -> None:
+        """ Records the number of frames written. """
+        if self._file.closed:
+            return
+        try:
+            self._file.seek(0)
+            self._file.write(self._header.pack())
+        finally:
+            self._file.close()
+            self.stats.end = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Keep frames written before an exception.
+        self.close()
+
+    def terminate(self) -> None:
+        self.close()
+
+
+def read_raw_video(path: str) -> Tuple[RawVideoHeader, np.ndarray]:
+    """ Returns the header of a RawVideoOutput file,
+    and its frames memory-mapped as a (nframes, frame_nbytes) uint8 array. """
+    with open(path, "rb") as f:
+        header = RawVideoHeader.unpack(f.read(RAW_VIDEO_HEADER_SIZE))
+
+    if header.nframes == 0:
+        return header, np.empty((0, header.frame_nbytes), np.uint8)
+
+    frames = np.memmap(
+        path,
+        dtype=np.uint8,
+        mode="r",
+        offset=RAW_VIDEO_HEADER_SIZE,
+        shape=(header.nframes, header.frame_nbytes),
+    )
+    return header, frames
+
+
+def ffmpeg_input_raw_video(path: str, header: RawVideoHeader) -> List[str]:
+    return [
+        f"-f rawvideo -pixel_format {header.pixel_format} "
+        f"-video_size {header.width}x{header.height}",
+        f"-framerate {header.fps}",
+        f"-skip_initial_bytes {RAW_VIDEO_HEADER_SIZE}",
+        *FFMPEG_QUIET,
+        "-i",
+        shlex.quote(abspath(path)),
+    ]
+
+
+def encode_raw_video(raw_path: str, cfg: FFmpegOutputConfig, corr_cfg: "Config") -> int:
+    """ Encodes a RawVideoOutput file using FFmpeg, without rendering it again.
+    FFmpeg reads the file directly, and master audio is taken from `corr_cfg`.
+
+    Returns FFmpeg's exit code. """
+    with open(raw_path, "rb") as f:
+        header = RawVideoHeader.unpack(f.read(RAW_VIDEO_HEADER_SIZE))
+
+    ffmpeg = _FFmpegProcess(
+        [FFMPEG, "-y"],
+        corr_cfg,
+        video_templates=ffmpeg_input_raw_video(raw_path, header),
+    )
+    ffmpeg.add_output(cfg)
+    ffmpeg.templates.append(cfg.args)
+
+    if cfg.path is None:
+        video_path = "-"  # Write to stdout
+    else:
+        video_path = abspath(cfg.path)
+
+    popen = ffmpeg.popen([video_path], bufsize=-1)
+    popen.stdin.close()
+    return popen.wait()
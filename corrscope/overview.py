@@ -0,0 +1,128 @@
+"""
+Waveform overviews, for drawing thumbnails of entire files.
+
+An overview holds the minimum and maximum of each block of samples,
+at several zoom levels (a pyramid, each level FACTOR times coarser).
+Overviews are cached on disk, keyed by file path, size, and modification time,
+so large files are only read once.
+"""
+import hashlib
+import os
+from os.path import abspath
+from pathlib import Path
+from typing import List, Optional, Callable
+
+import numpy as np
+
+from corrscope.settings import paths
+from corrscope.wave import Wave, ENVELOPE_BLOCK, minmax_to_envelope
+
+# Each level's blocks are FACTOR times longer than the previous level's.
+FACTOR = 4
+
+# The coarsest level has at most this many blocks.
+MIN_BLOCKS = 256
+
+# Increment when the cache format changes.
+VERSION = 1
+
+
+class Overview:
+    """ levels[k] has shape (nblock, 2), holding the (min, max) of each block of
+    ENVELOPE_BLOCK * FACTOR**k samples, across all channels.
+    Values are normalized to [-1, 1] (ignoring amplification). """
+
+    def __init__(self, levels: List[np.ndarray]):
+        self.levels = levels
+
+    @staticmethod
+    def from_minmax(minmax: np.ndarray) -> "Overview":
+        """ Builds a pyramid from the output of Wave.calc_minmax(). """
+        levels = [minmax]
+        while len(levels[-1]) > MIN_BLOCKS:
+            prev = levels[-1]
+
+            # Pad the final partial block by repeating its last value.
+            pad = -len(prev) % FACTOR
+            if pad:
+                prev = np.pad(prev, ((0, pad), (0, 0)), mode="edge")
+
+            blocks = prev.reshape(-1, FACTOR, 2)
+            mins = blocks[:, :, 0].min(axis=1)
+            maxs = blocks[:, :, 1].max(axis=1)
+            levels.append(np.stack([mins, maxs], axis=1))
+        return Overview(levels)
+
+    def envelope(self) -> np.ndarray:
+        """ Returns the peak amplitude of each block, like Wave.calc_envelope(). """
+        return minmax_to_envelope(self.levels[0])
+
+    def get(self, nbin: int) -> np.ndarray:
+        """ Splits the file into `nbin` equal regions,
+        and returns the (min, max) of each region, with shape (nbin, 2).
+
+        Reads the coarsest level with at least `nbin` blocks. """
+        level = self.levels[0]
+        for coarse in reversed(self.levels):
+            if len(coarse) >= nbin:
+                level = coarse
+                break
+
+        if not len(level):
+            return np.zeros((nbin, 2), dtype=level.dtype)
+
+        # If level has fewer than nbin blocks, regions repeat blocks.
+        bounds = np.arange(nbin) * len(level) // nbin
+        return np.stack(
+            [
+                np.minimum.reduceat(level[:, 0], bounds),
+                np.maximum.reduceat(level[:, 1], bounds),
+            ],
+            axis=1,
+        )
+
+
+def _cache_path(wave_path: str, cache_dir: str) -> Path:
+    stat = os.stat(wave_path)
+    key = f"{VERSION} {ENVELOPE_BLOCK} {abspath(wave_path)} "
+    key += f"{stat.st_size} {stat.st_mtime_ns}"
+    return Path(cache_dir) / (hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+
+def load_overview(
+    wave: Wave,
+    cache_dir: Optional[str] = None,
+    is_aborted: Callable[[], bool] = lambda: False,
+) -> Optional[Overview]:
+    """ Loads the overview of `wave` from `cache_dir` (default paths.cache_dir),
+    or computes and caches it.
+
+    Returns None if is_aborted() returns True while computing. """
+    if cache_dir is None:
+        cache_dir = str(paths.cache_dir / "overview")
+    path = _cache_path(wave.wave_path, cache_dir)
+
+    try:
+        with np.load(str(path)) as npz:
+            return Overview([npz[f"level{i}"] for i in range(len(npz.files))])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    minmax = wave.calc_minmax(is_aborted)
+    if minmax is None:
+        return None
+    overview = Overview.from_minmax(minmax)
+
+    # Caching is optional, so ignore write errors.
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file, so readers never see a partial file.
+        temp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        levels = {f"level{i}": level for i, level in enumerate(overview.levels)}
+        np.savez(str(temp), **levels)
+        os.replace(str(temp), str(path))
+    except OSError:
+        pass
+
+    return overview
@@ -1,6 +1,8 @@
+import collections
 import os
 from abc import ABC, abstractmethod
-from typing import Optional, List, TYPE_CHECKING, Any
+from typing import Optional, List, TYPE_CHECKING, Any, Dict, Set, Tuple, Iterable
+from typing import Hashable
 
 import attr
 import matplotlib
@@ -17,6 +19,12 @@ from corrscope.layout import (
 )
 from corrscope.outputs import RGB_DEPTH, ByteBuffer
 from corrscope.util import coalesce
+from corrscope.utils.colorspace import (
+    IndexedFrame,
+    palette_ramps,
+    palette_lut,
+    rgba_to_indexed,
+)
 
 """
 On first import, matplotlib.font_manager spends nearly 10 seconds
@@ -41,6 +49,8 @@ if mpl_config_dir in os.environ:
 matplotlib.use("agg")
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
+from matplotlib.path import Path
+from matplotlib.transforms import Bbox
 
 if TYPE_CHECKING:
     from matplotlib.axes import Axes
@@ -78,6 +88,11 @@ class RendererConfig(DumpableAttrs, always_dump="*"):
     # Performance (skipped when recording to video)
     res_divisor: float = 1.0
 
+    # Performance. Plots whose lines move by no more than this (in data units,
+    # where each plot spans [-1, 1]) are not redrawn, and keep their pixels from
+    # the previous frame. The default 0 only skips plots which are unchanged.
+    dirty_threshold: float = 0.0
+
     def __attrs_post_init__(self) -> None:
         # round(np.int32 / float) == np.float32, but we want int.
         assert isinstance(self.width, (int, float))
@@ -111,8 +126,12 @@ class Renderer(ABC):
         self.cfg = cfg
         self.lcfg = lcfg
         self.nplots = nplots
+        self._line_params = self._calc_line_params(channel_cfgs)
 
-        # Load line colors.
+    def _calc_line_params(
+        self, channel_cfgs: Optional[List["ChannelConfig"]]
+    ) -> List[LineParam]:
+        """ Load line colors. """
         if channel_cfgs is not None:
             if len(channel_cfgs) != self.nplots:
                 raise ValueError(
@@ -122,19 +141,75 @@ class Renderer(ABC):
         else:
             line_colors = [None] * self.nplots
 
-        self._line_params = [
-            LineParam(color=coalesce(color, cfg.init_line_color))
+        return [
+            LineParam(color=coalesce(color, self.cfg.init_line_color))
             for color in line_colors
         ]
 
+    def reconfigure(
+        self, cfg: RendererConfig, channel_cfgs: Optional[List["ChannelConfig"]]
+    ) -> None:
+        """ Changes colors, line widths, etc. while rendering,
+        without creating a new Renderer. Takes effect on the next frame.
+
+        The resolution cannot change, since outputs expect a fixed frame size. """
+        if (cfg.width, cfg.height) != (self.cfg.width, self.cfg.height):
+            raise ValueError(
+                f"cannot change resolution from {self.cfg.width}x{self.cfg.height} "
+                f"to {cfg.width}x{cfg.height} while rendering"
+            )
+        self.cfg = cfg
+        self._line_params = self._calc_line_params(channel_cfgs)
+
+    def _calc_palette(self) -> np.ndarray:
+        """ Returns a palette holding every color the renderer draws,
+        including antialiased blends between lines and the background. """
+        cfg = self.cfg
+
+        underlays = [cfg.bg_color]
+        if cfg.grid_color:
+            underlays.append(cfg.grid_color)
+        if cfg.midline_color and (cfg.v_midline or cfg.h_midline):
+            underlays.append(cfg.midline_color)
+
+        line_colors = [param.color for param in self._line_params]
+
+        # The background comes first.
+        underlays = unique(to_rgb24(color) for color in underlays)
+        colors = unique(underlays + [to_rgb24(color) for color in line_colors])
+        return palette_ramps(colors, underlays)
+
     @abstractmethod
     def render_frame(self, datas: List[np.ndarray]) -> None:
         ...
 
+    @abstractmethod
+    def set_detail(self, divisor: int) -> None:
+        """ Draws lines with at most 2 points per `divisor` pixel columns
+        (decimating long waves), trading detail for speed while previewing.
+        Takes effect on the next frame. """
+        ...
+
     @abstractmethod
     def get_frame(self) -> ByteBuffer:
         ...
 
+    @abstractmethod
+    def get_frame_indexed(self) -> IndexedFrame:
+        """ Returns the frame as palette indices, which are 1/3 the size of
+        get_frame(). Colors not in the palette are replaced with the nearest entry.
+        """
+        ...
+
+
+def to_rgb24(color: str) -> Tuple[int, int, int]:
+    r, g, b = (round(c * 255) for c in matplotlib.colors.to_rgb(color))
+    return r, g, b
+
+
+def unique(items: Iterable[Hashable]) -> list:
+    return list(collections.OrderedDict.fromkeys(items))
+
 
 Point = float
 px_inch = 96
@@ -147,14 +222,98 @@ def pixels(px: float) -> Point:
     return px / px_inch * pt_inch
 
 
+# Render-side decimation
+
+
+def minmax_bounds(nsamp: int, ncol: int) -> Optional[np.ndarray]:
+    """ Returns the first sample index of each pixel column,
+    or None if `nsamp` samples can be drawn without decimation. """
+    ncol = int(ncol)
+    if ncol <= 0 or nsamp <= 2 * ncol:
+        return None
+    return np.linspace(0, nsamp, ncol, endpoint=False).astype(np.intp)
+
+
+def minmax_xdata(nsamp: int, bounds: np.ndarray) -> np.ndarray:
+    """ Returns the x-coordinate of each point produced by minmax_decimate().
+    Both points of a pixel column are centered within the column. """
+    ends = np.append(bounds[1:], nsamp)
+    centers = (bounds + ends - 1) / 2
+    return np.repeat(centers, 2)
+
+
+def minmax_decimate(
+    data: np.ndarray, bounds: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """ Peak-preserving decimation of `data` (along axis 0).
+
+    Returns the min and max of each pixel column (interleaved),
+    so high-frequency content is drawn as a filled envelope instead of aliasing.
+    If `out` is supplied, writes into it instead of allocating.
+    """
+    if out is None:
+        out = np.empty((2 * len(bounds), *data.shape[1:]), dtype=data.dtype)
+    np.minimum.reduceat(data, bounds, axis=0, out=out[0::2])
+    np.maximum.reduceat(data, bounds, axis=0, out=out[1::2])
+    return out
+
+
+def line_vertices(line: "Line2D") -> Optional[np.ndarray]:
+    """ Returns a persistent (npoint, 2) vertex array owned by `line`,
+    or None if this matplotlib version's Line2D internals are unsupported.
+
+    Line2D.set_ydata() makes Line2D.recache() allocate new vertex arrays and a new
+    Path on every draw. Instead, writing y-values into the returned array in-place
+    updates the line without reconstructing anything.
+
+    Assumes `line` is drawn with an affine transform (linear axes),
+    so the cached TransformedPath refers to the vertices directly.
+    """
+    # Run recache() once.
+    path = line.get_path()
+
+    # This relies on private attributes (tested against matplotlib 3.0-3.7).
+    # If they change, fall back to set_ydata() rather than drawing stale lines.
+    xy = getattr(line, "_xy", None)
+    steps = getattr(path, "_interpolation_steps", None)
+    if (
+        not isinstance(xy, np.ndarray)
+        or xy.shape != path.vertices.shape
+        or steps is None
+        or not hasattr(line, "_transformed_path")
+    ):
+        return None
+
+    # Line2D keeps its data (used when subslicing long lines) and its Path in
+    # separate arrays. Rebuild the Path around the data array, so both share memory.
+    line._path = Path(xy, _interpolation_steps=steps)
+    line._transformed_path = None
+    if line.get_path().vertices is not xy:
+        return None
+    return xy
+
+
+def pixel_bbox(bbox: Bbox, height: float) -> Bbox:
+    """ Rounds `bbox` to the pixels Agg clips artists to (see set_clipbox() in
+    _backend_agg.h), so adjacent Axes' regions never overlap. """
+    (x0, y0), (x1, y1) = bbox.get_points()
+    snap = lambda x: np.floor(x + 0.5)
+
+    # Agg rounds rows, which are measured downwards from the top of the image.
+    snap_y = lambda y: height - snap(height - y)
+    return Bbox([[snap(x0), snap_y(y0)], [snap(x1), snap_y(y1)]])
+
+
 class MatplotlibRenderer(Renderer):
     """
     Renderer backend which takes data and produces images.
     Does not touch Wave or Channel.
 
-    If __init__ reads cfg, cfg cannot be hotswapped.
+    reconfigure() hotswaps colors, line widths, gridlines, and midlines,
+    by restyling existing Axes and lines and redrawing the background.
 
-    Reasons to hotswap cfg: RendererCfg:
+    Reasons to hotswap cfg, which reconfigure() does not support
+    (since they change the Figure or Axes):
     - GUI preview size
     - Changing layout
     - Changing #smp drawn (samples_visible)
@@ -184,6 +343,34 @@ class MatplotlibRenderer(Renderer):
         self._lines2d: List[List[Line2D]] = []
         self._lines_flat: List["Line2D"] = []
 
+        # _ydata2d[wave][chan] = y-values of Line2D vertices, written in-place.
+        # If not _in_place, a copy which must be passed to Line2D.set_ydata().
+        self._ydata2d: List[List[np.ndarray]] = []
+        self._in_place = True
+
+        # _scratch2d[wave][chan] = (new y-values, difference from drawn y-values)
+        self._scratch2d: List[List[np.ndarray]] = []
+
+        # _ax_lines[ax] = Line2D drawn in Axes (excluding background midlines)
+        self._ax_lines: Dict["Axes", List["Line2D"]] = {}
+
+        # _ax_regions[ax] = position of Axes in layout, used to style gridlines.
+        self._ax_regions: Dict["Axes", RegionSpec] = {}
+
+        # Background midlines, removed and redrawn by reconfigure().
+        self._midlines: List["Line2D"] = []
+
+        # _wave_bounds[wave] = first sample of each pixel column, or None.
+        # If a wave has more samples than its plot has pixels,
+        # it is drawn as min/max envelopes (see minmax_decimate()).
+        self._wave_bounds: List[Optional[np.ndarray]] = []
+        self._wave_nsamp: List[int] = []
+
+        # Columns are `_detail` pixels wide. See set_detail().
+        self._detail = 1
+        # If True, the next frame redraws every line.
+        self._redraw_all = False
+
     transparent = "#00000000"
 
     layout: RendererLayout
@@ -205,7 +392,6 @@ class MatplotlibRenderer(Renderer):
             raise Exception("I don't currently expect to call _set_layout() twice")
             # plt.close(self.fig)
 
-        grid_color = self.cfg.grid_color
         self._fig = Figure()
         FigureCanvasAgg(self._fig)
 
@@ -221,57 +407,8 @@ class MatplotlibRenderer(Renderer):
 
             # Disabling xticks/yticks is unnecessary, since we hide Axises.
             ax = self._fig.add_axes([left, bottom, width, height], xticks=[], yticks=[])
-
-            if grid_color:
-                # Initialize borders
-                # Hide Axises
-                # (drawing them is very slow, and we disable ticks+labels anyway)
-                ax.get_xaxis().set_visible(False)
-                ax.get_yaxis().set_visible(False)
-
-                # Background color
-                # ax.patch.set_fill(False) sets _fill=False,
-                # then calls _set_facecolor(...) "alpha = self._alpha if self._fill else 0".
-                # It is no faster than below.
-                ax.set_facecolor(self.transparent)
-
-                # Set border colors
-                for spine in ax.spines.values():
-                    spine.set_color(grid_color)
-
-                def hide(key: str):
-                    ax.spines[key].set_visible(False)
-
-                # Hide all axes except bottom-right.
-                hide("top")
-                hide("left")
-
-                # If bottom of screen, hide bottom. If right of screen, hide right.
-                if r.screen_edges & Edges.Bottom:
-                    hide("bottom")
-                if r.screen_edges & Edges.Right:
-                    hide("right")
-
-                # Dim stereo gridlines
-                if self.cfg.stereo_grid_opacity > 0:
-                    dim_color = matplotlib.colors.to_rgba_array(grid_color)[0]
-                    dim_color[-1] = self.cfg.stereo_grid_opacity
-
-                    def dim(key: str):
-                        ax.spines[key].set_color(dim_color)
-
-                else:
-                    dim = hide
-
-                # If not bottom of wave, dim bottom. If not right of wave, dim right.
-                if not r.wave_edges & Edges.Bottom:
-                    dim("bottom")
-                if not r.wave_edges & Edges.Right:
-                    dim("right")
-
-            else:
-                ax.set_axis_off()
-
+            self._ax_regions[ax] = r
+            self._style_axes(ax, r)
             return ax
 
         # Generate arrangement (using self.lcfg, wave_nchans)
@@ -282,6 +419,81 @@ class MatplotlibRenderer(Renderer):
         self._fig.set_dpi(DPI)
         self._fig.set_size_inches(self.cfg.width / DPI, self.cfg.height / DPI)
 
+    def _style_axes(self, ax: "Axes", r: RegionSpec) -> None:
+        """ Draws gridlines (or hides Axes borders), according to self.cfg. """
+        grid_color = self.cfg.grid_color
+
+        if grid_color:
+            # Initialize borders
+            # Undo set_axis_off() from previous reconfigure().
+            ax.set_axis_on()
+
+            # Hide Axises
+            # (drawing them is very slow, and we disable ticks+labels anyway)
+            ax.get_xaxis().set_visible(False)
+            ax.get_yaxis().set_visible(False)
+
+            # Background color
+            # ax.patch.set_fill(False) sets _fill=False,
+            # then calls _set_facecolor(...) "alpha = self._alpha if self._fill else 0".
+            # It is no faster than below.
+            ax.set_facecolor(self.transparent)
+
+            # Set border colors
+            for spine in ax.spines.values():
+                spine.set_visible(True)
+                spine.set_color(grid_color)
+
+            def hide(key: str):
+                ax.spines[key].set_visible(False)
+
+            # Hide all axes except bottom-right.
+            hide("top")
+            hide("left")
+
+            # If bottom of screen, hide bottom. If right of screen, hide right.
+            if r.screen_edges & Edges.Bottom:
+                hide("bottom")
+            if r.screen_edges & Edges.Right:
+                hide("right")
+
+            # Dim stereo gridlines
+            if self.cfg.stereo_grid_opacity > 0:
+                dim_color = matplotlib.colors.to_rgba_array(grid_color)[0]
+                dim_color[-1] = self.cfg.stereo_grid_opacity
+
+                def dim(key: str):
+                    ax.spines[key].set_color(dim_color)
+
+            else:
+                dim = hide
+
+            # If not bottom of wave, dim bottom. If not right of wave, dim right.
+            if not r.wave_edges & Edges.Bottom:
+                dim("bottom")
+            if not r.wave_edges & Edges.Right:
+                dim("right")
+
+        else:
+            ax.set_axis_off()
+
+    def _draw_midlines(self) -> None:
+        """ Draws background midlines in each Axes (after setting xlim). """
+        cfg = self.cfg
+        midline_color = cfg.midline_color
+        midline_width = pixels(1)
+
+        for wave_axes in self._axes2d:
+            for ax in unique_by_id(wave_axes):
+                max_x = ax.get_xlim()[1]
+
+                # zorder=-100 still draws on top of gridlines :(
+                kw = dict(color=midline_color, linewidth=midline_width)
+                if cfg.v_midline:
+                    self._midlines.append(ax.axvline(x=max_x / 2, **kw))
+                if cfg.h_midline:
+                    self._midlines.append(ax.axhline(y=0, **kw))
+
     def render_frame(self, datas: List[np.ndarray]) -> None:
         ndata = len(datas)
         if self.nplots != ndata:
@@ -307,16 +519,8 @@ class MatplotlibRenderer(Renderer):
                     ax.set_xlim(0, max_x)
                     ax.set_ylim(-1, 1)
 
-                    # Setup midlines (depends on max_x and wave_data)
-                    midline_color = cfg.midline_color
-                    midline_width = pixels(1)
-
-                    # zorder=-100 still draws on top of gridlines :(
-                    kw = dict(color=midline_color, linewidth=midline_width)
-                    if cfg.v_midline:
-                        ax.axvline(x=max_x / 2, **kw)
-                    if cfg.h_midline:
-                        ax.axhline(y=0, **kw)
+            # Setup midlines (depends on max_x and wave_data)
+            self._draw_midlines()
 
             self._save_background()
 
@@ -327,34 +531,152 @@ class MatplotlibRenderer(Renderer):
             for wave_idx, wave_data in enumerate(datas):
                 wave_axes = self._axes2d[wave_idx]
                 wave_lines = []
+                wave_ydata = []
+                wave_scratch = []
+
+                # Decimate if the plot is narrower than wave_data.
+                self._wave_nsamp.append(len(wave_data))
+                bounds, xdata = self._wave_points(wave_idx)
+                self._wave_bounds.append(bounds)
+                if bounds is not None:
+                    wave_data = minmax_decimate(wave_data, bounds)
 
                 # Foreach chan
                 for chan_idx, chan_data in enumerate(wave_data.T):
                     ax = wave_axes[chan_idx]
                     line_color = self._line_params[wave_idx].color
                     chan_line: Line2D = ax.plot(
-                        chan_data, color=line_color, linewidth=line_width
+                        xdata, chan_data, color=line_color, linewidth=line_width
                     )[0]
                     wave_lines.append(chan_line)
+                    wave_ydata.append(self._line_ydata(chan_line))
+                    wave_scratch.append(np.empty((2, len(chan_data))))
+                    self._ax_lines.setdefault(ax, []).append(chan_line)
 
                 self._lines2d.append(wave_lines)
                 self._lines_flat.extend(wave_lines)
+                self._ydata2d.append(wave_ydata)
+                self._scratch2d.append(wave_scratch)
+
+            self._redraw_over_background()
 
         # Draw waveform data
         else:
+            dirty_axes: Set["Axes"] = set()
+            redraw_all = self._redraw_all
+            self._redraw_all = False
+
             # Foreach wave
             for wave_idx, wave_data in enumerate(datas):
                 wave_lines = self._lines2d[wave_idx]
+                wave_ydata = self._ydata2d[wave_idx]
+                wave_scratch = self._scratch2d[wave_idx]
+                bounds = self._wave_bounds[wave_idx]
 
                 # Foreach chan
                 for chan_idx, chan_data in enumerate(wave_data.T):
-                    chan_line = wave_lines[chan_idx]
-                    chan_line.set_ydata(chan_data)
-
+                    new, diff = wave_scratch[chan_idx]
+                    if bounds is not None:
+                        minmax_decimate(chan_data, bounds, out=new)
+                    else:
+                        new[:] = chan_data
+
+                    # Compare against the last *drawn* data, so slow drifts
+                    # eventually exceed cfg.dirty_threshold.
+                    ydata = wave_ydata[chan_idx]
+                    np.subtract(new, ydata, out=diff)
+                    np.abs(diff, out=diff)
+                    if redraw_all or diff.max() > self.cfg.dirty_threshold:
+                        # Write into the line's vertices, without allocating.
+                        ydata[:] = new
+                        if not self._in_place:
+                            wave_lines[chan_idx].set_ydata(ydata)
+                        dirty_axes.add(wave_lines[chan_idx].axes)
+
+            self._redraw_over_background(None if redraw_all else dirty_axes)
+
+    def _line_ydata(self, line: "Line2D") -> np.ndarray:
+        """ Returns a persistent array of `line`'s y-values,
+        which render_frame() updates each frame. """
+        vertices = line_vertices(line)
+        if vertices is None:
+            self._in_place = False
+            return np.array(line.get_ydata(), dtype=float)
+        return vertices[:, 1]
+
+    def _wave_points(self, wave_idx: int) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """ Returns the decimation bounds (or None) and x-coordinates
+        of a wave's line points. """
+        nsamp = self._wave_nsamp[wave_idx]
+
+        # All channels of a wave have the same plot width.
+        ncol = self._axes2d[wave_idx][0].bbox.width / self._detail
+        bounds = minmax_bounds(nsamp, ncol)
+        if bounds is None:
+            return None, np.arange(nsamp)
+        return bounds, minmax_xdata(nsamp, bounds)
+
+    def set_detail(self, divisor: int) -> None:
+        if divisor == self._detail:
+            return
+        self._detail = divisor
+
+        # If no frames were rendered, render_frame() reads the new detail.
+        if not self._lines2d:
+            return
+
+        # Replace each line's points (and their persistent buffers).
+        for wave_idx, wave_lines in enumerate(self._lines2d):
+            bounds, xdata = self._wave_points(wave_idx)
+            self._wave_bounds[wave_idx] = bounds
+            for chan_idx, line in enumerate(wave_lines):
+                line.set_data(xdata, np.zeros(len(xdata)))
+                self._ydata2d[wave_idx][chan_idx] = self._line_ydata(line)
+                self._scratch2d[wave_idx][chan_idx] = np.empty((2, len(xdata)))
+        self._redraw_all = True
+
+    def reconfigure(
+        self, cfg: RendererConfig, channel_cfgs: Optional[List["ChannelConfig"]]
+    ) -> None:
+        Renderer.reconfigure(self, cfg, channel_cfgs)
+        self._palette = None
+
+        dict.__setitem__(matplotlib.rcParams, "lines.antialiased", cfg.antialiasing)
+
+        # If no frames were rendered, render_frame() reads the new cfg.
+        if not self._lines2d:
+            return
+
+        self._fig.set_facecolor(cfg.bg_color)
+        for ax, region in self._ax_regions.items():
+            self._style_axes(ax, region)
+
+        for line in self._midlines:
+            line.remove()
+        self._midlines = []
+        self._draw_midlines()
+
+        line_width = pixels(cfg.line_width)
+        for wave_idx, wave_lines in enumerate(self._lines2d):
+            line_color = self._line_params[wave_idx].color
+            for line in wave_lines:
+                line.set_color(line_color)
+                line.set_linewidth(line_width)
+                line.set_antialiased(cfg.antialiasing)
+
+        # Save the background without lines, then draw the lines over it.
+        for line in self._lines_flat:
+            line.set_visible(False)
+        self._save_background()
+        for line in self._lines_flat:
+            line.set_visible(True)
         self._redraw_over_background()
 
     bg_cache: Any  # "matplotlib.backends._backend_agg.BufferRegion"
 
+    # _ax_bg_cache[ax] = bg_cache, cropped to the pixels Axes can draw to.
+    _ax_bg_cache: Dict["Axes", Any]
+
     def _save_background(self) -> None:
         """ Draw static background. """
         # https://stackoverflow.com/a/8956211
@@ -364,10 +686,29 @@ class MatplotlibRenderer(Renderer):
         fig.canvas.draw()
         self.bg_cache = fig.canvas.copy_from_bbox(fig.bbox)
 
-    def _redraw_over_background(self) -> None:
-        """ Redraw animated elements of the image. """
+        height = fig.bbox.height
+        self._ax_bg_cache = {
+            ax: fig.canvas.copy_from_bbox(pixel_bbox(ax.bbox, height))
+            for wave_axes in self._axes2d
+            for ax in unique_by_id(wave_axes)
+        }
+
+    def _redraw_over_background(self, dirty_axes: Optional[Set["Axes"]] = None) -> None:
+        """ Redraw animated elements of the image.
+
+        If dirty_axes is passed, only redraws those Axes.
+        All other Axes are left unchanged from the previous frame. """
 
         canvas: FigureCanvasAgg = self._fig.canvas
+
+        if dirty_axes is not None:
+            for ax in dirty_axes:
+                canvas.restore_region(self._ax_bg_cache[ax])
+                for line in self._ax_lines[ax]:
+                    ax.draw_artist(line)
+                canvas.blit(ax.bbox)
+            return
+
         canvas.restore_region(self.bg_cache)
 
         for line in self._lines_flat:
@@ -400,3 +741,20 @@ class MatplotlibRenderer(Renderer):
         assert len(buffer_rgb) == w * h * RGB_DEPTH
 
         return buffer_rgb
+
+    _palette: Optional[np.ndarray] = None
+    _palette_lut: np.ndarray
+
+    def get_frame_indexed(self) -> IndexedFrame:
+        canvas = self._fig.canvas
+
+        if self._palette is None:
+            self._palette = self._calc_palette()
+            self._palette_lut = palette_lut(self._palette)
+
+        # Read RGBA pixels in-place (tostring_rgb() copies).
+        rgba = np.asarray(canvas.buffer_rgba())
+        assert rgba.shape == (self.cfg.height, self.cfg.width, 4)
+
+        indices = rgba_to_indexed(rgba, self._palette_lut)
+        return IndexedFrame(indices, self._palette)
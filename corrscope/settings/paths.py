@@ -4,13 +4,19 @@ import sys
 from typing import MutableMapping, List
 from pathlib import Path
 
-from appdirs import user_data_dir
+from appdirs import user_data_dir, user_cache_dir
 
 import corrscope
 from corrscope.config import CorrError
 
 
-__all__ = ["appdata_dir", "PATH_dir", "get_ffmpeg_url", "MissingFFmpegError"]
+__all__ = [
+    "appdata_dir",
+    "cache_dir",
+    "PATH_dir",
+    "get_ffmpeg_url",
+    "MissingFFmpegError",
+]
 
 
 def prepend(dic: MutableMapping[str, str], _key: List[str], prefix: str) -> None:
@@ -22,6 +28,9 @@ def prepend(dic: MutableMapping[str, str], _key: List[str], prefix: str) -> None
 appdata_dir = Path(user_data_dir(corrscope.app_name, appauthor=False, roaming=True))
 appdata_dir.mkdir(parents=True, exist_ok=True)
 
+# Files which can be recomputed, like waveform overviews. Created when needed.
+cache_dir = Path(user_cache_dir(corrscope.app_name, appauthor=False))
+
 # Add app-specific ffmpeg path.
 _path_dir = appdata_dir / "path"
 _path_dir.mkdir(exist_ok=True)
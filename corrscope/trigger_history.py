@@ -0,0 +1,73 @@
+"""
+Records CorrelationTrigger internals (window and buffer) of every frame,
+into memory-mapped .npy files which can be browsed or rendered after rendering.
+
+Unlike Config.show_internals, recording does not render or encode extra video.
+"""
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+
+from corrscope.triggers import Trigger, CorrelationTrigger
+from corrscope.wave import FLOAT
+
+# File name (without .npy) -> CorrelationTrigger attribute.
+FIELDS = {"window": "_prev_window", "buffer": "_buffer"}
+
+
+class TriggerHistory:
+    """ Each file holds an array of shape (nframe, nchan, N),
+    where N is the longest buffer of any channel.
+    Shorter buffers are centered and zero-padded.
+    Channels without a CorrelationTrigger are left as zeros. """
+
+    def __init__(self, dir: str, nframe: int, triggers: List[Trigger]):
+        self.dir = Path(dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self._triggers = [
+            trigger if isinstance(trigger, CorrelationTrigger) else None
+            for trigger in triggers
+        ]
+        nsamp = max(
+            [trigger._buffer_nsamp for trigger in self._triggers if trigger] or [1]
+        )
+
+        # open_memmap() creates a sparse file, so unwritten frames cost nothing.
+        self.arrays = {
+            name: np.lib.format.open_memmap(
+                str(self.dir / f"{name}.npy"),
+                mode="w+",
+                dtype=FLOAT,
+                shape=(nframe, len(triggers), nsamp),
+            )
+            for name in FIELDS
+        }
+
+    def record(self, frame_idx: int) -> None:
+        """ Copies every channel's current trigger state to frame `frame_idx`. """
+        for name, attr_name in FIELDS.items():
+            out = self.arrays[name][frame_idx]
+            for chan, trigger in enumerate(self._triggers):
+                if trigger is None:
+                    continue
+                data = getattr(trigger, attr_name)
+                if data is None:
+                    continue
+
+                begin = (out.shape[-1] - len(data)) // 2
+                out[chan, begin : begin + len(data)] = data
+
+    def close(self) -> None:
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = {}
+
+
+def load_trigger_history(dir: str) -> Dict[str, np.ndarray]:
+    """ Opens recorded files read-only, without loading them into memory. """
+    return {
+        name: np.load(str(Path(dir) / f"{name}.npy"), mmap_mode="r")
+        for name in FIELDS
+    }
@@ -1,14 +1,31 @@
 import warnings
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Type, Tuple, Optional, ClassVar, Callable, Union
+from typing import (
+    TYPE_CHECKING,
+    Type,
+    Tuple,
+    Optional,
+    ClassVar,
+    Callable,
+    Union,
+    Dict,
+    Set,
+    Any,
+)
 
 import attr
 import numpy as np
 
 import corrscope.utils.scipy.signal as signal
 import corrscope.utils.scipy.windows as windows
-from corrscope.config import KeywordAttrs, CorrError, Alias, CorrWarning
-from corrscope.util import find, obj_name
+from corrscope.config import (
+    KeywordAttrs,
+    CorrError,
+    Alias,
+    CorrWarning,
+    DumpEnumAsStr,
+)
+from corrscope.util import obj_name
 from corrscope.utils.windows import midpad, leftpad
 from corrscope.wave import FLOAT
 
@@ -46,6 +63,9 @@ class Trigger(ABC):
     POST_PROCESSING_NSAMP = 256
     post: Optional["Trigger"]
 
+    # Attributes which change from frame to frame. Saved by get_state().
+    _STATE: ClassVar[Tuple[str, ...]] = ()
+
     def __init__(
         self, wave: "Wave", cfg: ITriggerConfig, tsamp: int, stride: int, fps: float
     ):
@@ -84,6 +104,32 @@ class Trigger(ABC):
         """
         ...
 
+    def get_state(self) -> "TriggerState":
+        """ Copies the state of this trigger (and post trigger), for seeking. """
+        return TriggerState(
+            {name: _copy_state(getattr(self, name)) for name in self._STATE},
+            self.post.get_state() if self.post else None,
+        )
+
+    def set_state(self, state: "TriggerState") -> None:
+        """ Restores a state returned by get_state(). `state` can be reused. """
+        for name, value in state.attrs.items():
+            setattr(self, name, _copy_state(value))
+        if self.post and state.post:
+            self.post.set_state(state.post)
+
+
+@attr.dataclass
+class TriggerState:
+    attrs: Dict[str, Any]
+    post: Optional["TriggerState"]
+
+
+def _copy_state(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
 
 @attr.dataclass
 class PerFrameCache:
@@ -101,10 +147,26 @@ class PerFrameCache:
     period: Optional[int] = None
     mean: Optional[float] = None
 
+    # If record_candidates, CorrelationTrigger stores the sample indices
+    # of its best correlation peaks (best first, before post-triggering)
+    # and their correlations. Used by smooth_triggers().
+    record_candidates: bool = False
+    candidates: Optional[np.ndarray] = None
+    candidate_scores: Optional[np.ndarray] = None
+
 
 # CorrelationTrigger
 
 
+class PitchEstimator(str, DumpEnumAsStr):
+    # Autocorrelate the entire window every frame.
+    autocorrelation = "autocorrelation"
+
+    # Search lags near the previous period, using YIN's difference function.
+    # Falls back to autocorrelation when the pitch jumps.
+    yin = "yin"
+
+
 class CorrelationTriggerConfig(ITriggerConfig):
     # get_trigger
     edge_strength: float
@@ -113,6 +175,13 @@ class CorrelationTriggerConfig(ITriggerConfig):
     trigger_falloff: Tuple[float, float] = (4.0, 1.0)
     recalc_semitones: float = 1.0
     lag_prevention: float = 0.25
+    pitch_estimator: PitchEstimator = attr.ib(
+        default="autocorrelation", converter=PitchEstimator
+    )
+
+    # If > 1, find an approximate offset by correlating data and buffer
+    # decimated by this factor, then refine it at full resolution.
+    coarse_decimation: int = 1
 
     # _update_buffer
     responsiveness: float
@@ -129,6 +198,7 @@ class CorrelationTriggerConfig(ITriggerConfig):
         self._validate_param("responsiveness", 0, 1)
         # TODO trigger_falloff >= 0
         self._validate_param("buffer_falloff", 0, np.inf)
+        self._validate_param("coarse_decimation", 1, np.inf)
 
         if self.use_edge_trigger:
             if self.post:
@@ -151,6 +221,13 @@ class CorrelationTriggerConfig(ITriggerConfig):
 @register_trigger(CorrelationTriggerConfig)
 class CorrelationTrigger(Trigger):
     cfg: CorrelationTriggerConfig
+    _STATE = (
+        "_buffer",
+        "_prev_buffer",
+        "_prev_period",
+        "_prev_window",
+        "_tracked_period",
+    )
 
     def __init__(self, *args, **kwargs):
         """
@@ -177,10 +254,27 @@ class CorrelationTrigger(Trigger):
         self._windowed_step = self._calc_step()
         assert self._windowed_step.dtype == FLOAT
 
+        # (mutable) _windowed_step + _buffer, correlated with the next frame.
+        # Updated in-place by _update_buffer(), to avoid allocating arrays.
+        self._prev_buffer = self._windowed_step.copy()
+
+        # (scratch) Overwritten every frame, to avoid allocating arrays.
+        # Gaussian window applied to new data in _update_buffer().
+        self._buffer_window = np.empty(self._buffer_nsamp, dtype=FLOAT)
+
+        # (const) Squared distance of each sample from the center.
+        # Used to compute windows.gaussian() without allocating.
+        center = np.arange(self._buffer_nsamp, dtype=FLOAT)
+        center -= (self._buffer_nsamp - 1.0) / 2.0
+        self._center_dist2 = center * center
+
         # Will be overwritten on the first frame.
         self._prev_period: Optional[int] = None
         self._prev_window: Optional[np.ndarray] = None
 
+        # Period of the previous frame, used by PitchEstimator.yin.
+        self._tracked_period: Optional[int] = None
+
     def _calc_data_taper(self) -> np.ndarray:
         """ Input data window. Zeroes out all data older than 1 frame old.
         See https://github.com/jimbo1qaz/corrscope/wiki/Correlation-Trigger
@@ -250,7 +344,7 @@ class CorrelationTrigger(Trigger):
         data -= cache.mean
 
         # Window data
-        period = get_period(data)
+        period = self._get_period(data)
         cache.period = period * stride
 
         if self._is_window_invalid(period):
@@ -265,8 +359,8 @@ class CorrelationTrigger(Trigger):
 
         data *= window
 
-        # prev_buffer
-        prev_buffer = self._windowed_step + self._buffer
+        # prev_buffer (updated by the previous frame's _update_buffer())
+        prev_buffer = self._prev_buffer
 
         # Calculate correlation
         """
@@ -281,34 +375,67 @@ class CorrelationTrigger(Trigger):
         - correlate(prev_buffer, data)
         - trigger = offset - peak_offset
         """
-        corr = signal.correlate(data, prev_buffer)  # returns double, not single/FLOAT
-        assert len(corr) == 2 * N - 1
-
         # Find optimal offset (within trigger_diameter, default=±N/4)
-        mid = N - 1
         radius = round(N * self.cfg.trigger_diameter / 2)
-
-        left = mid - radius
-        right = mid + radius + 1
-
-        corr = corr[left:right]
-        mid = mid - left
-
-        # argmax(corr) == mid + peak_offset == (data >> peak_offset)
-        # peak_offset == argmax(corr) - mid
-        peak_offset = np.argmax(corr) - mid  # type: int
+        decimation = self.cfg.coarse_decimation
+        coarse = decimation > 1 and N // decimation >= 2
+        if cache.record_candidates:
+            if coarse:
+                offsets, scores = coarse_peaks(
+                    data,
+                    prev_buffer,
+                    radius,
+                    decimation,
+                    max(COARSE_CANDIDATES, SMOOTH_CANDIDATES),
+                )
+                # Only find_peak_coarse()'s peaks compete for the trigger,
+                # so smoothing doesn't change the causal trigger.
+                best = int(np.argmax(scores[:COARSE_CANDIDATES]))
+            else:
+                corr = correlate_radius(data, prev_buffer, radius)
+                peaks = top_peaks(corr, SMOOTH_CANDIDATES)
+                offsets, scores = peaks - radius, corr[peaks]
+                best = 0
+            offsets, scores = rank_candidates(offsets, scores, best, SMOOTH_CANDIDATES)
+            peak_offset = int(offsets[0])
+            cache.candidates = index + stride * offsets
+            cache.candidate_scores = scores
+        elif coarse:
+            peak_offset = find_peak_coarse(data, prev_buffer, radius, decimation)
+        else:
+            peak_offset = find_peak(data, prev_buffer, radius)
         trigger = index + (stride * peak_offset)
 
         # Apply post trigger (before updating correlation buffer)
         if self.post:
             trigger = self.post.get_trigger(trigger, cache)
 
+            # Smoothing may pick any candidate, so post-trigger them all.
+            if cache.candidates is not None:
+                cache.candidates[0] = trigger
+                cache.candidates[1:] = self.post.get_triggers(
+                    cache.candidates[1:], cache
+                )
+
         # Update correlation buffer (distinct from visible area)
         aligned = self._wave.get_around(trigger, self._buffer_nsamp, stride)
         self._update_buffer(aligned, cache)
 
         return trigger
 
+    def _get_period(self, data: np.ndarray) -> int:
+        period = None
+        if (
+            self.cfg.pitch_estimator == PitchEstimator.yin
+            and self._tracked_period is not None
+        ):
+            period = track_period(data, self._tracked_period)
+
+        if period is None:
+            period = get_period(data)
+        self._tracked_period = period
+        return period
+
     def _is_window_invalid(self, period: int) -> bool:
         """ Returns True if pitch has changed more than `recalc_semitones`. """
 
@@ -328,8 +455,8 @@ class CorrelationTrigger(Trigger):
 
     def _update_buffer(self, data: np.ndarray, cache: PerFrameCache) -> None:
         """
-        Update self._buffer by adding `data` and a step function.
-        Data is reshaped to taper away from the center.
+        Update self._buffer by adding `data`, and self._prev_buffer by adding
+        a step function. Data is reshaped to taper away from the center.
 
         :param data: Wave data. WILL BE MODIFIED.
         """
@@ -348,17 +475,155 @@ class CorrelationTrigger(Trigger):
         # New waveform
         data -= cache.mean
         normalize_buffer(data)
-        window = windows.gaussian(N, std=(cache.period / self._stride) * buffer_falloff)
-        data *= window
+        std = (cache.period / self._stride) * buffer_falloff
+        data *= self._calc_buffer_window(std)
 
         # Old buffer
-        normalize_buffer(self._buffer)
-        self._buffer = lerp(self._buffer, data, responsiveness)
+        # In-place equivalent of self._buffer = lerp(self._buffer, data, responsiveness)
+        buffer = self._buffer
+        normalize_buffer(buffer)
+        buffer *= 1 - responsiveness
+        data *= responsiveness
+        buffer += data
+
+        np.add(self._windowed_step, buffer, out=self._prev_buffer)
+
+    def _calc_buffer_window(self, std: float) -> np.ndarray:
+        """ Returns windows.gaussian(N, std) in a reused array. """
+        window = self._buffer_window
+        np.divide(self._center_dist2, -2 * std * std, out=window)
+        np.exp(window, out=window)
+        return window
 
 
 # get_trigger()
 
 
+def find_peak(data: np.ndarray, buffer: np.ndarray, radius: int) -> int:
+    """ Returns the offset within ±radius where `data` best matches `buffer`.
+    (data >> offset) == buffer. """
+    corr = correlate_radius(data, buffer, radius)
+
+    # argmax(corr) == radius + peak_offset == (data >> peak_offset)
+    # peak_offset == argmax(corr) - radius
+    peak_offset = np.argmax(corr) - radius  # type: int
+    return int(peak_offset)
+
+
+def correlate_radius(data: np.ndarray, buffer: np.ndarray, radius: int) -> np.ndarray:
+    """ Returns the correlation of `data` and `buffer` at offsets [-radius, radius]. """
+    N = len(data)
+    corr = signal.correlate(data, buffer)  # returns double, not single/FLOAT
+    assert len(corr) == 2 * N - 1
+
+    mid = N - 1
+    left = mid - radius
+    right = mid + radius + 1
+    return corr[left:right]
+
+
+# Number of peaks in the decimated correlation, to refine at full resolution.
+# Periodic waves have many similar peaks, which decimation may reorder.
+COARSE_CANDIDATES = 3
+
+
+def find_peak_coarse(
+    data: np.ndarray, buffer: np.ndarray, radius: int, decimation: int
+) -> int:
+    """ Equivalent to find_peak(), but correlates `data` and `buffer`
+    averaged over blocks of `decimation` samples, then searches
+    ±decimation samples around the best peaks at full resolution.
+
+    Costs O(N/decimation * log) + O(N * decimation), rather than O(N log N). """
+    offsets, scores = coarse_peaks(data, buffer, radius, decimation, COARSE_CANDIDATES)
+    # On ties, the earlier coarse peak wins.
+    return int(offsets[np.argmax(scores)])
+
+
+def coarse_peaks(
+    data: np.ndarray, buffer: np.ndarray, radius: int, decimation: int, n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Refines the `n` best peaks of the decimated correlation (see
+    find_peak_coarse()), and returns their offsets and correlations,
+    in order of coarse correlation. Peaks which cannot be refined
+    within ±radius have correlation -inf. """
+    N = len(data)
+    nblock = N // decimation
+
+    def decimate(x: np.ndarray) -> np.ndarray:
+        return x[: nblock * decimation].reshape(nblock, decimation).mean(axis=1)
+
+    coarse_radius = min(-(-radius // decimation), nblock - 1)  # ceil
+    coarse = correlate_radius(decimate(data), decimate(buffer), coarse_radius)
+
+    peaks = top_peaks(coarse, n)
+    offsets = np.zeros(len(peaks), dtype=np.int64)
+    scores = np.full(len(peaks), -np.inf)
+    for i, peak in enumerate(peaks):
+        # Refine within ±decimation samples, without leaving ±radius.
+        center = (int(peak) - coarse_radius) * decimation
+        begin = max(center - decimation, -radius)
+        end = min(center + decimation, radius)
+        if begin > end:
+            continue
+
+        corr = correlate_lags(data, buffer, begin, end)
+        idx = int(np.argmax(corr))
+        offsets[i] = begin + idx
+        scores[i] = corr[idx]
+
+    return offsets, scores
+
+
+def rank_candidates(
+    offsets: np.ndarray, scores: np.ndarray, best: int, n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns up to `n` distinct offsets and their correlations,
+    starting with offsets[best], then the rest in order of correlation.
+    Drops offsets with correlation -inf, except `best`. """
+    ranked = np.argsort(-scores, kind="stable")
+    order = [best] + [int(i) for i in ranked if i != best]
+
+    seen: Set[int] = set()
+    keep = []
+    for i in order:
+        offset = int(offsets[i])
+        if offset in seen or (i != best and scores[i] == -np.inf):
+            continue
+        seen.add(offset)
+        keep.append(i)
+        if len(keep) == n:
+            break
+    return offsets[keep], scores[keep]
+
+
+def top_peaks(corr: np.ndarray, n: int) -> np.ndarray:
+    """ Returns the indices of the `n` highest local maxima of `corr`,
+    highest first. The first is argmax(corr). """
+    is_peak = np.ones(len(corr), dtype=bool)
+    is_peak[1:] &= corr[1:] >= corr[:-1]
+    is_peak[:-1] &= corr[:-1] >= corr[1:]
+    peaks = np.flatnonzero(is_peak)
+    return peaks[np.argsort(-corr[peaks], kind="stable")[:n]]
+
+
+def correlate_lags(
+    data: np.ndarray, buffer: np.ndarray, begin: int, end: int
+) -> np.ndarray:
+    """ Returns sum(data[i + lag] * buffer[i]) for each lag in [begin, end].
+    Matches find_peak()'s correlation at those offsets.
+    Computed directly in O(N * (end - begin)), which is faster than FFT
+    for a few lags. """
+    N = len(data)
+    pad = max(-begin, end, 0)
+
+    padded = np.zeros(N + 2 * pad, dtype=np.result_type(data, buffer))
+    padded[pad : pad + N] = data
+
+    # padded[pad + lag] == data[lag]
+    return np.correlate(padded[pad + begin : pad + end + N], buffer, "valid")
+
+
 def calc_step(nsamp: int, peak: float, stdev: float) -> np.ndarray:
     """ Step function used for approximate edge triggering.
     TODO deduplicate CorrelationTrigger._calc_step() """
@@ -392,6 +657,69 @@ def get_period(data: np.ndarray) -> int:
     return int(peakX)
 
 
+# Lags within this many semitones of the previous period are searched.
+TRACK_SEMITONES = 2.0
+
+# Normalized difference (0 = identical, 1 = uncorrelated) accepted as a period.
+TRACK_THRESHOLD = 0.3
+
+# Normalized difference at half the period, accepted as an octave jump.
+TRACK_OCTAVE_THRESHOLD = 0.1
+
+
+def track_period(data: np.ndarray, prev_period: int) -> Optional[int]:
+    """
+    Estimates the period of a signal, searching near `prev_period`.
+    Costs O(len(data) * search radius), instead of a full autocorrelation.
+
+    Minimizes YIN's difference function d(lag) = sum((data[i] - data[i+lag])**2)
+    over a fixed-length region, normalized by the energy of both regions.
+
+    Returns None if the period lies outside the search range,
+    or the signal is not periodic, so the caller can fall back to get_period().
+    """
+    N = len(data)
+    ratio = 2 ** (TRACK_SEMITONES / 12)
+    lo = max(int(prev_period / ratio), 1)
+    hi = min(int(np.ceil(prev_period * ratio)), N // 2)
+    if lo >= hi:
+        return None
+
+    # Compare data[:width] with data[lag : lag+width].
+    width = N - hi
+    data = np.ascontiguousarray(data)
+    lagged = np.lib.stride_tricks.as_strided(
+        data[lo:],
+        shape=(hi - lo + 1, width),
+        strides=(data.strides[0], data.strides[0]),
+        writeable=False,
+    )
+    head = data[:width]
+
+    # energy[i] = sum(data[:i] ** 2)
+    energy = np.empty(N + 1)
+    energy[0] = 0
+    np.cumsum(data * data, out=energy[1:])
+
+    lags = np.arange(lo, hi + 1)
+    total = energy[width] + (energy[lags + width] - energy[lags])
+    diff = (total - 2 * (lagged @ head)) / np.maximum(total, 1e-12)
+    best = int(np.argmin(diff))
+
+    # If the minimum lies on the edge of the search range, the pitch has moved.
+    if best in (0, len(lags) - 1) or diff[best] > TRACK_THRESHOLD:
+        return None
+    period = lo + best
+
+    # A signal periodic in T is also periodic in 2T, so check for octave jumps.
+    half = period // 2
+    half_total = energy[width] + (energy[half + width] - energy[half])
+    half_cross = np.dot(head, data[half : half + width])
+    if half_total - 2 * half_cross < TRACK_OCTAVE_THRESHOLD * half_total:
+        return None
+    return period
+
+
 def cosine_flat(n: int, diameter: int, falloff: int) -> np.ndarray:
     cosine = windows.hann(falloff * 2)
     # assert cosine.dtype == FLOAT
@@ -413,7 +741,8 @@ def normalize_buffer(data: np.ndarray) -> None:
     """
     Rescales `data` in-place.
     """
-    peak = np.amax(abs(data))
+    # Equivalent to np.amax(abs(data)), without allocating.
+    peak = max(np.amax(data), -np.amin(data))
     data /= max(peak, MIN_AMPLITUDE)
 
 
@@ -443,6 +772,14 @@ class PostTrigger(Trigger, ABC):
                 f"({obj_name(self.post)})"
             )
 
+    def get_triggers(
+        self, indices: "np.ndarray[int]", cache: "PerFrameCache"
+    ) -> "np.ndarray[int]":
+        """ Calls get_trigger() on each of `indices`. """
+        return np.array(
+            [self.get_trigger(int(index), cache) for index in indices], dtype=np.int64
+        )
+
 
 # Local edge-finding trigger
 
@@ -541,43 +878,89 @@ class ZeroCrossingTrigger(PostTrigger):
     def get_trigger(self, index: int, cache: "PerFrameCache") -> int:
         # 'cache' is unused.
         tsamp = self._tsamp
+        nsamp = self._wave.nsamp
 
-        if not 0 <= index < self._wave.nsamp:
+        if not 0 <= index < nsamp:
             return index
 
-        if self._wave[index] < 0:
-            direction = 1
-            test = lambda a: a >= 0
-
-        elif self._wave[index] > 0:
-            direction = -1
-            test = lambda a: a <= 0
+        # Read samples on both sides of `index` at once.
+        begin = max(index - tsamp + 1, 0)
+        end = min(index + tsamp, nsamp)
+        data = self._wave[begin:end]
+        center = index - begin
+
+        value = data[center]
+        if value < 0:
+            # Scan right for the first sample >= 0.
+            hits = data[center:] >= 0
+            delta = int(hits.argmax())
+            if not hits[delta]:  # No zero-intercepts
+                return index
+
+            # `value <= 0` produces poor results on on sine waves, since it
+            # erroneously increments the exact idx of the zero-crossing sample.
+            #
+            # `value < 0` produces poor results on impulse24000, since idx = 23999
+            # which doesn't match CorrelationTrigger. (scans left looking for a
+            # zero-crossing)
+            #
+            # CorrelationTrigger tries to maximize @trigger - @(trigger-1). I think
+            # always incrementing zeros (impulse24000 = 24000) is acceptable.
+            #
+            # - To be consistent, we should increment zeros whenever we *start* there.
+            return index + delta + int(data[center + delta] <= 0)
+
+        elif value > 0:
+            # Scan left for the first sample <= 0.
+            hits = data[center::-1] <= 0
+            delta = int(hits.argmax())
+            if not hits[delta]:  # No zero-intercepts
+                return index
+            return index - delta + 1
 
         else:  # self._wave[sample] == 0
             return index + 1
 
-        data = self._wave[index : index + (direction * tsamp) : direction]
-        intercepts = find(data, test)
-        try:
-            (delta,), value = next(intercepts)
-            return index + (delta * direction) + int(value <= 0)
+    def get_triggers(
+        self, indices: "np.ndarray[int]", cache: "Optional[PerFrameCache]" = None
+    ) -> "np.ndarray[int]":
+        """ Equivalent to calling get_trigger() on each of `indices`,
+        but reads and scans every window in one batch. """
+        # 'cache' is unused.
+        tsamp = self._tsamp
+        nsamp = self._wave.nsamp
 
-        except StopIteration:  # No zero-intercepts
-            return index
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.arange(len(indices))
+        offsets = np.arange(tsamp)
 
-        # noinspection PyUnreachableCode
-        """
-        `value <= 0` produces poor results on on sine waves, since it erroneously
-        increments the exact idx of the zero-crossing sample.
+        def read(positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            """ Returns samples at `positions`, and which positions are in range. """
+            valid = (0 <= positions) & (positions < nsamp)
+            flat = np.clip(positions, 0, nsamp - 1).reshape(-1)
+            data = self._wave[flat].reshape(positions.shape)
+            return data, valid
 
-        `value < 0` produces poor results on impulse24000, since idx = 23999 which
-        doesn't match CorrelationTrigger. (scans left looking for a zero-crossing)
+        # Row i holds samples starting at indices[i], moving right or left.
+        right, right_valid = read(indices[:, np.newaxis] + offsets)
+        left, left_valid = read(indices[:, np.newaxis] - offsets)
 
-        CorrelationTrigger tries to maximize @trigger - @(trigger-1). I think always
-        incrementing zeros (impulse24000 = 24000) is acceptable.
+        right_hits = (right >= 0) & right_valid
+        right_delta = right_hits.argmax(axis=1)
+        left_hits = (left <= 0) & left_valid
+        left_delta = left_hits.argmax(axis=1)
 
-        - To be consistent, we should increment zeros whenever we *start* there.
-        """
+        value = right[:, 0]
+        in_range = right_valid[:, 0]
+        rising = in_range & (value < 0) & right_hits[rows, right_delta]
+        falling = in_range & (value > 0) & left_hits[rows, left_delta]
+        zero = in_range & (value == 0)
+
+        out = indices.copy()
+        out[rising] += right_delta[rising] + (right[rows, right_delta] <= 0)[rising]
+        out[falling] += 1 - left_delta[falling]
+        out[zero] += 1
+        return out
 
 
 # NullTrigger
@@ -591,3 +974,56 @@ class NullTriggerConfig(ITriggerConfig):
 class NullTrigger(Trigger):
     def get_trigger(self, index: int, cache: "PerFrameCache") -> int:
         return index
+
+
+# Offline smoothing
+
+# Number of correlation peaks per frame, which smooth_triggers() chooses between.
+SMOOTH_CANDIDATES = 4
+
+
+def smooth_triggers(
+    offsets: np.ndarray, scores: np.ndarray, penalty: float
+) -> np.ndarray:
+    """
+    Picks one candidate trigger per frame, using past *and future* frames.
+
+    :param offsets: (nframe, ncandidate) Each candidate's distance from the frame's
+        sample index, in periods.
+    :param scores: (nframe, ncandidate) Each candidate's correlation,
+        where the frame's best candidate is 1. -inf marks missing candidates.
+    :param penalty: Cost of moving the trigger by one period between frames,
+        relative to correlation.
+    :return: (nframe,) Index of the chosen candidate in each frame.
+
+    Minimizes sum(-score) + penalty * sum(|offset - previous offset|)
+    using the Viterbi algorithm, in O(nframe * ncandidate**2) time.
+    """
+    nframe, ncandidate = offsets.shape
+    if nframe == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    # jumps[frame, j, i] = cost of moving from candidate i (in frame - 1) to j.
+    jumps = np.zeros((nframe, ncandidate, ncandidate))
+    np.subtract(offsets[1:, :, None], offsets[:-1, None, :], out=jumps[1:])
+    np.abs(jumps, out=jumps)
+    jumps *= penalty
+    jumps -= scores[:, :, None]
+
+    # best_prev[frame, j] = which candidate in the previous frame leads to j.
+    best_prev = np.zeros((nframe, ncandidate), dtype=np.intp)
+    cost = -scores[0]
+    columns = np.arange(ncandidate)
+
+    for frame in range(1, nframe):
+        total = jumps[frame] + cost
+        prev = total.argmin(axis=1)
+        best_prev[frame] = prev
+        cost = total[columns, prev]
+
+    # Backtrack from the cheapest final candidate.
+    path = np.empty(nframe, dtype=np.intp)
+    path[-1] = np.argmin(cost)
+    for frame in range(nframe - 1, 0, -1):
+        path[frame - 1] = best_prev[frame, path[frame]]
+    return path
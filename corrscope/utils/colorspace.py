@@ -0,0 +1,224 @@
+import collections
+from typing import Sequence, Tuple
+
+import attr
+import numpy as np
+
+# BT.601 limited-range coefficients, in 8-bit fixed point.
+# These match FFmpeg's default RGB-to-YUV conversion.
+# (Y, U, V) = (coefs @ (R, G, B) + offset) >> 8
+Y_COEFS = (66, 129, 25)
+U_COEFS = (-38, -74, 112)
+V_COEFS = (112, -94, -18)
+
+Y_OFFSET = 128 + (16 << 8)
+UV_OFFSET = 128 + (128 << 8)
+
+
+def _weigh(rgb: np.ndarray, coefs, offset: int) -> np.ndarray:
+    """ Computes (coefs @ rgb + offset) >> 8, where `rgb` holds uint16 planes.
+
+    Uses uint16 modular arithmetic, which is faster than int32.
+    Negative coefficients wrap around, but the final sum is always in [0, 65536).
+    """
+    r, g, b = rgb
+    cr, cg, cb = (np.uint16(c % (1 << 16)) for c in coefs)
+
+    acc = r * cr
+    acc += g * cg
+    acc += b * cb
+    acc += np.uint16(offset)
+    acc >>= 8
+    return acc
+
+
+def yuv420p_nbytes(width: int, height: int) -> int:
+    return width * height * 3 // 2
+
+
+def rgb_to_yuv420p(frame: "np.ndarray[np.uint8]") -> np.ndarray:
+    """ Converts an rgb24 frame of shape (height, width, 3) to planar yuv420p.
+    Chroma is computed from the average color of each 2x2 block.
+
+    :return: 1D uint8 array holding the Y, U, and V planes, in that order.
+    """
+    height, width, depth = frame.shape
+    assert depth == 3, frame.shape
+    if width % 2 or height % 2:
+        raise ValueError(f"yuv420p requires even dimensions, not {width}x{height}")
+
+    out = np.empty(yuv420p_nbytes(width, height), dtype=np.uint8)
+    nluma = width * height
+    nchroma = nluma // 4
+
+    y = out[:nluma].reshape(height, width)
+    u = out[nluma : nluma + nchroma].reshape(height // 2, width // 2)
+    v = out[nluma + nchroma :].reshape(height // 2, width // 2)
+
+    # Planar (3, height, width) arithmetic is faster than interleaved pixels.
+    rgb = frame.transpose(2, 0, 1).astype(np.uint16, order="C")
+    y[:] = _weigh(rgb, Y_COEFS, Y_OFFSET)
+
+    # Average each 2x2 block (rounding to nearest).
+    # Adding strided slices is much faster than ndarray.sum(axis=...).
+    rgb = rgb[:, 0::2] + rgb[:, 1::2]
+    rgb = rgb[:, :, 0::2] + rgb[:, :, 1::2]
+    rgb += 2
+    rgb >>= 2
+
+    u[:] = _weigh(rgb, U_COEFS, UV_OFFSET)
+    v[:] = _weigh(rgb, V_COEFS, UV_OFFSET)
+    return out
+
+
+# Palette-indexed frames
+
+PALETTE_SIZE = 256
+MAX_RAMP_LEVELS = 32
+
+# Frames are quantized to this many bits per channel before palette lookup.
+LUT_BITS = 5
+
+
+@attr.dataclass
+class IndexedFrame:
+    """ A frame stored as one uint8 palette index per pixel. """
+
+    # (height, width) uint8
+    indices: np.ndarray
+
+    # (n <= 256, 3) uint8 RGB
+    palette: np.ndarray
+
+
+Color = Tuple[int, int, int]
+
+
+def palette_ramps(colors: Sequence[Color], underlays: Sequence[Color]) -> np.ndarray:
+    """ Returns a palette holding `colors`, and blends between them at evenly spaced
+    opacities (to represent antialiased edges and dimmed gridlines).
+
+    Only colors in `underlays` (drawn beneath others, like the background)
+    are blended with other colors.
+
+    The palette begins with `colors` (in order), followed by the blended colors.
+    """
+    ramps = collections.OrderedDict()
+    for under in underlays:
+        for over in colors:
+            if under != over and (over, under) not in ramps:
+                ramps[under, over] = None
+
+    # Reserve space for the original colors.
+    nlevel = (PALETTE_SIZE - len(colors)) // max(len(ramps), 1) + 1
+    nlevel = min(MAX_RAMP_LEVELS, nlevel)
+    alphas = np.arange(1, nlevel) / nlevel
+
+    blends = [np.array(colors, dtype=float).reshape(-1, 3)]
+    for under, over in ramps:
+        under, over = np.array(under, dtype=float), np.array(over, dtype=float)
+        blends.append(under + np.outer(alphas, over - under))
+
+    palette = np.around(np.concatenate(blends)).astype(np.uint8)
+    assert len(palette) <= PALETTE_SIZE, len(palette)
+    return palette
+
+
+def _lut_keys(rgba: np.ndarray) -> np.ndarray:
+    """ Returns a LUT index for each pixel of (..., 4) uint8 `rgba`.
+
+    Reading each pixel as a uint32 is faster than splitting channels.
+    """
+    pixels = rgba.view("<u4")[..., 0]  # 0xAABBGGRR
+    shift = 8 - LUT_BITS
+    mask = (1 << LUT_BITS) - 1
+
+    r = (pixels >> shift) & mask
+    g = (pixels >> (8 + shift)) & mask
+    b = (pixels >> (16 + shift)) & mask
+    return (r << 2 * LUT_BITS) | (g << LUT_BITS) | b
+
+
+def _to_rgba(rgb: np.ndarray) -> np.ndarray:
+    rgba = np.zeros((*rgb.shape[:-1], 4), dtype=np.uint8)
+    rgba[..., :3] = rgb
+    return rgba
+
+
+def palette_lut(palette: np.ndarray) -> np.ndarray:
+    """ Returns a table mapping quantized RGB colors (see _lut_keys())
+    to the index of the nearest palette entry.
+
+    Colors present in `palette` are always mapped to themselves.
+    """
+    nstep = 1 << LUT_BITS
+    step = 256 // nstep
+
+    # Center of each quantized cell, in (3, nstep**3) planes.
+    levels = np.arange(nstep) * step + step // 2
+    cells = np.stack(np.meshgrid(levels, levels, levels, indexing="ij")).reshape(3, -1)
+
+    best_dist = np.full(cells.shape[1], np.iinfo(np.int32).max)
+    lut = np.zeros(cells.shape[1], dtype=np.uint8)
+    for idx, color in enumerate(palette.astype(np.int32)):
+        dist = np.sum((cells - color.reshape(3, 1)) ** 2, axis=0)
+        closer = dist < best_dist
+        best_dist[closer] = dist[closer]
+        lut[closer] = idx
+
+    # Map exact palette entries to themselves.
+    # If multiple entries are quantized to the same key, the earliest entry wins.
+    keys = _lut_keys(_to_rgba(palette))
+    for idx in reversed(range(len(palette))):
+        lut[keys[idx]] = idx
+    return lut
+
+
+def rgba_to_indexed(rgba: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """ Converts (height, width, 4) uint8 RGBA pixels to palette indices,
+    using a table from palette_lut(). """
+    return lut.take(_lut_keys(rgba))
+
+
+def indexed_to_rgb(indices: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """ Expands palette indices to (height, width, 3) rgb24 pixels. """
+    return palette.take(indices, axis=0)
+
+
+def indexed_to_yuv420p(indices: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """ Converts palette indices to planar yuv420p, by converting the palette
+    (rather than each pixel) to YUV. See rgb_to_yuv420p(). """
+    height, width = indices.shape
+    if width % 2 or height % 2:
+        raise ValueError(f"yuv420p requires even dimensions, not {width}x{height}")
+
+    rgb = palette.T.astype(np.uint16)
+    y_pal = _weigh(rgb, Y_COEFS, Y_OFFSET).astype(np.uint8)
+    u_pal = _weigh(rgb, U_COEFS, UV_OFFSET)
+    v_pal = _weigh(rgb, V_COEFS, UV_OFFSET)
+
+    out = np.empty(yuv420p_nbytes(width, height), dtype=np.uint8)
+    nluma = width * height
+    nchroma = nluma // 4
+    y_pal.take(indices, out=out[:nluma].reshape(height, width))
+
+    def average(plane: np.ndarray) -> np.ndarray:
+        """ Average each 2x2 block (rounding to nearest). """
+        plane = plane[0::2] + plane[1::2]
+        plane = plane[:, 0::2] + plane[:, 1::2]
+        plane += 2
+        plane >>= 2
+        return plane.ravel()
+
+    out[nluma : nluma + nchroma] = average(u_pal.take(indices))
+    out[nluma + nchroma :] = average(v_pal.take(indices))
+    return out
+
+
+def pal8_palette(palette: np.ndarray) -> bytes:
+    """ Returns the palette FFmpeg's rawvideo pal8 format expects after each frame:
+    256 native-endian uint32 0xAARRGGBB entries. """
+    argb = np.zeros(PALETTE_SIZE, dtype=np.uint32)
+    rgb = palette.astype(np.uint32)
+    argb[: len(palette)] = 0xFF000000 | rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]
+    return argb.tobytes()
@@ -2,15 +2,30 @@ import copy
 import enum
 import warnings
 from enum import auto
-from typing import Union, List
+from typing import TYPE_CHECKING, Union, List, Optional, Callable
 
 import numpy as np
 
 import corrscope.utils.scipy.wavfile as wavfile
 from corrscope.config import CorrError, CorrWarning, TypedEnumDump
 
+if TYPE_CHECKING:
+    from corrscope.overview import Overview
+
 FLOAT = np.single
 
+# Wave.calc_envelope() stores the peak amplitude of every ENVELOPE_BLOCK samples.
+ENVELOPE_BLOCK = 256
+ENVELOPE_CHUNK = ENVELOPE_BLOCK * 4096
+
+# Peaks below 2 LSB of 16-bit audio (dither noise) are treated as silence.
+SILENCE_THRESHOLD = 2 ** -14
+
+
+def minmax_to_envelope(minmax: np.ndarray) -> np.ndarray:
+    """ Converts (min, max) pairs (from Wave.calc_minmax()) into peak amplitudes. """
+    return np.maximum(minmax[:, 1], -minmax[:, 0])
+
 
 @enum.unique
 class Flatten(TypedEnumDump):
@@ -43,6 +58,7 @@ class Wave:
     smp_s data return_channels _flatten is_mono
     nsamp dtype
     center max_val
+    envelope overview
     """.split()
 
     smp_s: int
@@ -51,6 +67,12 @@ class Wave:
 
     _flatten: Flatten
 
+    envelope: "Optional[np.ndarray]"
+    """Peak amplitude of each block of ENVELOPE_BLOCK samples, or None."""
+
+    overview: "Optional[Overview]"
+    """Min/max pyramid for drawing thumbnails, or None. Set by WaveCache."""
+
     @property
     def flatten(self) -> Flatten:
         """
@@ -131,6 +153,69 @@ class Wave:
         else:
             raise CorrError(f"unexpected wavfile dtype {dtype}")
 
+        self.envelope = None
+        self.overview = None
+
+    def calc_minmax(
+        self, is_aborted: Callable[[], bool] = lambda: False
+    ) -> "Optional[np.ndarray]":
+        """ Computes the minimum and maximum (ignoring amplification) of each block
+        of ENVELOPE_BLOCK samples, across all channels.
+
+        Returns an array of shape (nblock, 2),
+        or None if is_aborted() returns True between chunks. """
+        nblock = -(-self.nsamp // ENVELOPE_BLOCK)
+        minmax = np.empty((nblock, 2), dtype=FLOAT)
+
+        # Read the file in chunks, to bound memory usage of long files.
+        chunk_nblock = ENVELOPE_CHUNK // ENVELOPE_BLOCK
+        for block in range(0, nblock, chunk_nblock):
+            if is_aborted():
+                return None
+            begin = block * ENVELOPE_BLOCK
+            chunk = self.data[begin : begin + ENVELOPE_CHUNK].astype(FLOAT)
+            chunk -= self.center
+
+            # Pad the final partial block by repeating its last sample.
+            chunk_nblock_ = -(-len(chunk) // ENVELOPE_BLOCK)
+            pad = chunk_nblock_ * ENVELOPE_BLOCK - len(chunk)
+            if pad:
+                chunk = np.pad(chunk, ((0, pad), (0, 0)), mode="edge")
+
+            blocks = chunk.reshape(chunk_nblock_, -1)
+            out = minmax[block : block + chunk_nblock_]
+            blocks.min(axis=1, out=out[:, 0])
+            blocks.max(axis=1, out=out[:, 1])
+
+        minmax /= self.max_val
+        return minmax
+
+    def calc_envelope(self, is_aborted: Callable[[], bool] = lambda: False) -> None:
+        """ Computes the peak amplitude (ignoring amplification) of each block
+        of ENVELOPE_BLOCK samples, across all channels.
+
+        Call before with_flatten(), so all copies share the envelope.
+        If is_aborted() returns True between chunks, leaves envelope unset. """
+        minmax = self.calc_minmax(is_aborted)
+        if minmax is not None:
+            self.envelope = minmax_to_envelope(minmax)
+
+    def is_silent(
+        self, begin: int, end: int, threshold: float = SILENCE_THRESHOLD
+    ) -> bool:
+        """ Returns whether self.data[begin:end] never exceeds `threshold`
+        (ignoring amplification). Samples outside the file are silent.
+
+        Requires calc_envelope(). """
+        envelope = self.envelope
+        assert envelope is not None, "Wave.calc_envelope() not called"
+
+        # Round outwards to whole blocks.
+        begin = max(begin // ENVELOPE_BLOCK, 0)
+        end = -(-end // ENVELOPE_BLOCK)
+        region = envelope[begin:end]
+        return not len(region) or bool(region.max() <= threshold)
+
     def with_flatten(self, flatten: Flatten, return_channels: bool) -> "Wave":
         new = copy.copy(self)
         new.flatten = flatten
@@ -0,0 +1,225 @@
+"""
+LRU cache of opened Waves, shared between threads.
+
+The GUI preloads each channel's wav file as soon as it is added, on background
+threads. Each file is first opened and validated, then scanned to load or compute
+its overview and envelope (on a separate thread, so scanning large files doesn't
+delay opening others). When playback begins, CorrScope reuses the opened Waves
+instead of stalling on large files, and only waits for scans if it needs envelopes.
+"""
+import collections
+import copy
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
+from os.path import abspath
+from typing import Tuple, Collection, Optional, Callable, List
+
+import attr
+
+from corrscope.overview import load_overview
+from corrscope.wave import Wave
+
+# Identifies a version of a file. Modifying the file invalidates cached Waves.
+FileStat = Tuple[int, int]
+
+
+def _stat(path: str) -> FileStat:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@attr.dataclass
+class _Entry:
+    stat: FileStat
+
+    # Resolves once the file is opened and validated.
+    opened: "Future[Wave]"
+
+    # Resolves once the Wave's overview and envelope are loaded.
+    # None until preload() is called.
+    scanned: "Optional[Future[Wave]]" = None
+
+    # Set to stop computing the envelope.
+    cancelled: threading.Event = attr.Factory(threading.Event)
+
+    def futures(self) -> "List[Future[Wave]]":
+        return [f for f in [self.opened, self.scanned] if f is not None]
+
+
+class WaveCache:
+    """ Holds up to `maxsize` Waves, keyed by absolute path.
+    Waves hold memory-mapped files, so cached Waves cost address space
+    and file handles, but not memory. """
+
+    def __init__(self, maxsize: int = 32, overview_dir: Optional[str] = None):
+        """ overview_dir: where to cache overviews (default paths.cache_dir). """
+        self.maxsize = maxsize
+        self.overview_dir = overview_dir
+        self._entries: "collections.OrderedDict[str, _Entry]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        # Files are opened in order, one at a time, and scanned likewise.
+        self._open_pool = ThreadPoolExecutor(1, thread_name_prefix="wave_open")
+        self._scan_pool = ThreadPoolExecutor(1, thread_name_prefix="wave_scan")
+
+    def preload(self, path: str) -> "Future[Wave]":
+        """ Opens `path` and loads its overview and envelope on background threads,
+        unless it is already cached. The returned Future raises any error
+        from loading the file (like CorrError or FileNotFoundError)
+        as soon as the file is opened. """
+        path = abspath(path)
+        try:
+            stat = _stat(path)
+        except OSError as e:
+            future: "Future[Wave]" = Future()
+            future.set_exception(e)
+            return future
+
+        with self._lock:
+            entry = self._lookup(path, stat)
+            if entry is None:
+                entry = _Entry(stat, self._open_pool.submit(Wave, path))
+                self._insert(path, entry)
+            if entry.scanned is None:
+                entry.scanned = Future()
+                entry.opened.add_done_callback(functools.partial(self._scan, entry))
+            return entry.scanned
+
+    def peek(self, path: str) -> "Optional[Future[Wave]]":
+        """ Returns the pending or finished preload() of `path`, or None if `path`
+        was never preloaded, or has been evicted, cancelled, or modified.
+        Unlike preload(), never starts loading `path`. """
+        path = abspath(path)
+        try:
+            stat = _stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._lookup(path, stat)
+            if entry is None:
+                return None
+            return entry.scanned
+
+    def _scan(self, entry: _Entry, opened: "Future[Wave]") -> None:
+        """ Called once `entry.opened` is done. Fails `entry.scanned` if opening
+        failed, otherwise loads the overview on the scan thread. """
+        scanned = entry.scanned
+        assert scanned is not None
+
+        if opened.cancelled():
+            scanned.cancel()
+            return
+        error = opened.exception()
+        if error is not None:
+            if scanned.set_running_or_notify_cancel():
+                scanned.set_exception(error)
+            return
+
+        try:
+            self._scan_pool.submit(
+                self._load_overview, opened.result(), scanned, entry.cancelled.is_set
+            )
+        except RuntimeError:  # The pool was shut down by close().
+            scanned.cancel()
+
+    def _load_overview(
+        self, wave: Wave, scanned: "Future[Wave]", is_aborted: Callable[[], bool]
+    ) -> None:
+        if not scanned.set_running_or_notify_cancel():
+            return
+        try:
+            # The overview's finest level doubles as the envelope for skip_silence.
+            overview = load_overview(wave, self.overview_dir, is_aborted)
+            if overview is not None:
+                wave.overview = overview
+                wave.envelope = overview.envelope()
+        except BaseException as e:
+            scanned.set_exception(e)
+        else:
+            scanned.set_result(wave)
+
+    def get(self, path: str, amplification: float, calc_envelope: bool) -> Wave:
+        """ Returns a copy of the cached Wave at `path`, or loads it now.
+        Waits for a pending preload() to open the file (and scan it, if
+        `calc_envelope`) instead of reading the file twice. """
+        path = abspath(path)
+        stat = _stat(path)
+
+        with self._lock:
+            entry = self._lookup(path, stat)
+
+        wave: Optional[Wave] = None
+        if entry is not None:
+            try:
+                # Raises any error from opening the file.
+                wave = entry.opened.result()
+                if calc_envelope and entry.scanned is not None:
+                    entry.scanned.result()
+            except CancelledError:
+                pass
+
+        if wave is None:
+            wave = Wave(path)
+            opened: "Future[Wave]" = Future()
+            opened.set_result(wave)
+            with self._lock:
+                self._insert(path, _Entry(stat, opened))
+
+        if calc_envelope and wave.envelope is None:
+            # A cancelled preload may leave the envelope missing.
+            wave.calc_envelope()
+
+        wave = copy.copy(wave)
+        wave.amplification = amplification
+        return wave
+
+    def cancel(self, keep: Collection[str] = ()) -> None:
+        """ Stops loading every file not in `keep`, and forgets those files.
+        Loaded Waves remain cached. """
+        keep = {abspath(path) for path in keep}
+        with self._lock:
+            for path, entry in list(self._entries.items()):
+                done = all(future.done() for future in entry.futures())
+                if path not in keep and not done:
+                    self._cancel(path, entry)
+
+    def close(self) -> None:
+        self.cancel()
+        self._open_pool.shutdown(wait=False)
+        self._scan_pool.shutdown(wait=False)
+
+    # Must be called with self._lock held.
+    def _lookup(self, path: str, stat: FileStat) -> Optional[_Entry]:
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+
+        # Discard entries which failed, were cancelled, or have changed on disk.
+        failed = any(
+            future.done() and (future.cancelled() or future.exception())
+            for future in entry.futures()
+        )
+        if failed or entry.stat != stat:
+            self._cancel(path, entry)
+            return None
+
+        self._entries.move_to_end(path)
+        return entry
+
+    def _insert(self, path: str, entry: _Entry) -> None:
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.maxsize:
+            old_path, old_entry = next(iter(self._entries.items()))
+            self._cancel(old_path, old_entry)
+
+    def _cancel(self, path: str, entry: _Entry) -> None:
+        entry.cancelled.set()
+        for future in entry.futures():
+            future.cancel()
+        del self._entries[path]
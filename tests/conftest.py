@@ -33,6 +33,8 @@ def Popen(mocker: "pytest_mock.MockFixture"):
         assert popen.stdin != popen.stdout
 
         popen.wait.return_value = 0
+        # Mocked processes have no pid, so don't reap them using os.wait4().
+        popen.returncode = 0
         return popen
 
     Popen = mocker.patch.object(subprocess, "Popen", autospec=True)
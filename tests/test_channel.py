@@ -8,11 +8,17 @@ from pytest_mock import MockFixture
 
 import corrscope.channel
 import corrscope.corrscope
+import corrscope.triggers
+import corrscope.utils.scipy.wavfile as wavfile
 from corrscope.channel import ChannelConfig, Channel
 from corrscope.corrscope import default_config, CorrScope, BenchmarkMode, Arguments
-from corrscope.triggers import NullTriggerConfig
+from corrscope.trigger_history import load_trigger_history
+from corrscope.triggers import (
+    NullTriggerConfig,
+    ZeroCrossingTriggerConfig,
+)
 from corrscope.util import coalesce
-from corrscope.wave import Flatten
+from corrscope.wave import Wave, Flatten, ENVELOPE_BLOCK
 
 
 positive = hs.integers(min_value=1, max_value=100)
@@ -166,3 +172,178 @@ def test_per_channel_stereo(
     if "stereo" in filename:
         assert channel.render_wave._flatten == stereo
         assert data.shape[1] == (2 if stereo is Flatten.Stereo else 1)
+
+
+def test_skip_silence(tmp_path, mocker: MockFixture):
+    """Ensure Config.skip_silence skips triggering silent channels,
+    and renders flat lines."""
+    smp_s = 48000
+    data = np.zeros(smp_s, dtype=np.int16)
+    # Only the second half of the file is audible.
+    t = np.arange(smp_s // 2) / smp_s
+    data[smp_s // 2 :] = 10000 * np.sin(2 * np.pi * 440 * t)
+
+    path = str(tmp_path / "half silent.wav")
+    wavfile.write(path, smp_s, data)
+
+    cfg = default_config(
+        channels=[ChannelConfig(path)], end_time=0.9, skip_silence=True
+    )
+    corr = CorrScope(cfg, Arguments(cfg_dir=".", outputs=[]))
+    renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+
+    get_trigger = mocker.spy(corrscope.triggers.CorrelationTrigger, "get_trigger")
+    corr.play()
+
+    # Silent frames are neither triggered nor read from the file.
+    (channel,) = corr.channels
+    sampled = [call[0][1] for call in get_trigger.call_args_list]
+    assert sampled
+    assert not any(channel.is_silent(sample) for sample in sampled)
+    assert min(sampled) >= smp_s // 2 - channel._silence_radius - ENVELOPE_BLOCK
+
+    datas = [call[0][0][0] for call in renderer.render_frame.call_args_list]
+    assert len(datas) == cfg.fps * 0.9 + 1
+    flat = [data for data in datas if data is channel._flat_render_data]
+    assert len(flat) > len(datas) // 3
+
+    # The flat line is shaped like render data.
+    assert not flat[0].any()
+    assert flat[0].shape == datas[-1].shape
+
+
+def test_trigger_threads(mocker: MockFixture):
+    """Ensure triggering channels on a thread pool matches the main thread."""
+
+    def play(trigger_threads: int) -> list:
+        cfg = default_config(
+            channels=[
+                ChannelConfig("tests/sine440.wav"),
+                ChannelConfig("tests/stereo in-phase.wav"),
+                ChannelConfig("tests/impulse24000.wav"),
+            ],
+            end_time=0.5,
+            trigger_threads=trigger_threads,
+        )
+        corr = CorrScope(cfg, Arguments(cfg_dir=".", outputs=[]))
+        renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+        corr.play()
+        return [call[0][0] for call in renderer.render_frame.call_args_list]
+
+    expected = play(1)
+    for trigger_threads in [0, 2]:
+        frames = play(trigger_threads)
+        assert len(frames) == len(expected)
+        for datas, expected_datas in zip(frames, expected):
+            for data, expected_data in zip(datas, expected_datas):
+                np.testing.assert_array_equal(data, expected_data)
+
+
+def test_seek(mocker: MockFixture):
+    """Ensure seeking backwards replays the same frames as the first time,
+    by restoring and warming up trigger state."""
+    fps = 60
+
+    def play(seek_at: int, seek_frame: int) -> list:
+        """ Seek to `seek_frame` before playing frame `seek_at`. """
+        cfg = default_config(
+            channels=[ChannelConfig("tests/sine440.wav")], end_time=1, fps=fps
+        )
+        frames_played = 0
+
+        def get_seek():
+            nonlocal frames_played
+            frames_played += 1
+            if frames_played == seek_at + 1:
+                return seek_frame / fps
+            return None
+
+        arg = Arguments(cfg_dir=".", outputs=[], get_seek=get_seek)
+        corr = CorrScope(cfg, arg)
+        renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+        corr.play()
+        return [call[0][0][0] for call in renderer.render_frame.call_args_list]
+
+    expected = play(-1, 0)
+    assert len(expected) == 61
+
+    datas = play(50, 20)
+    assert len(datas) == 50 + (61 - 20)
+    for data, expected_data in zip(datas, expected[:50] + expected[20:]):
+        np.testing.assert_array_equal(data, expected_data)
+
+
+def test_trigger_smoothing(mocker: MockFixture):
+    """Ensure Config.trigger_smoothing renders the smoothed triggers,
+    which match the causal triggers when jumps are (almost) free."""
+
+    def play(trigger_smoothing: float) -> list:
+        cfg = default_config(
+            channels=[ChannelConfig("tests/sine440.wav")],
+            end_time=0.5,
+            trigger_smoothing=trigger_smoothing,
+        )
+        corr = CorrScope(cfg, Arguments(cfg_dir=".", outputs=[]))
+        renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+        corr.play()
+        return [call[0][0][0] for call in renderer.render_frame.call_args_list]
+
+    smooth = mocker.spy(corrscope.corrscope, "smooth_triggers")
+    expected = play(0)
+    assert not smooth.called
+
+    datas = play(1e-9)
+    assert smooth.called
+    assert len(datas) == len(expected)
+    for data, expected_data in zip(datas, expected):
+        np.testing.assert_array_equal(data, expected_data)
+
+    assert len(play(10)) == len(expected)
+
+
+@pytest.mark.parametrize("trigger_smoothing", [1, 1000])
+def test_trigger_smoothing_post(mocker: MockFixture, trigger_smoothing: float):
+    """Ensure smoothed triggers are post-triggered,
+    even when smoothing picks a candidate other than the best."""
+    cfg = default_config(
+        channels=[ChannelConfig("tests/sine440.wav")],
+        end_time=0.5,
+        trigger_smoothing=trigger_smoothing,
+    )
+    cfg.trigger.post = ZeroCrossingTriggerConfig()
+    corr = CorrScope(cfg, Arguments(cfg_dir=".", outputs=[]))
+    smooth_triggers = mocker.spy(corr, "_smooth_triggers")
+    mocker.patch.object(CorrScope, "_load_renderer")
+    corr.play()
+
+    wave = Wave("tests/sine440.wav")
+    (triggers,) = zip(*smooth_triggers.spy_return)
+    assert triggers
+    for trigger in triggers:
+        assert wave[trigger - 1] <= 0 <= wave[trigger]
+
+
+def test_record_internals(tmp_path, mocker: MockFixture):
+    """Ensure Config.record_internals writes each frame's trigger state."""
+    cfg = default_config(
+        channels=[
+            ChannelConfig("tests/sine440.wav"),
+            ChannelConfig("tests/sine440.wav", trigger=NullTriggerConfig()),
+        ],
+        end_time=0.25,
+        record_internals=str(tmp_path / "internals"),
+    )
+    corr = CorrScope(cfg, Arguments(cfg_dir=".", outputs=[]))
+    mocker.patch.object(CorrScope, "_load_renderer")
+    corr.play()
+
+    history = load_trigger_history(cfg.record_internals)
+    trigger = corr.triggers[0]
+    nframe = round(cfg.fps * 0.25) + 1
+    for name in ["window", "buffer"]:
+        assert history[name].shape == (nframe, 2, trigger._buffer_nsamp)
+        assert history[name][:, 0].any()
+        assert not history[name][:, 1].any()
+
+    np.testing.assert_array_equal(history["buffer"][-1, 0], trigger._buffer)
+    np.testing.assert_array_equal(history["window"][-1, 0], trigger._prev_window)
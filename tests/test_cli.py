@@ -17,7 +17,7 @@ from corrscope import cli
 from corrscope.cli import YAML_NAME
 from corrscope.config import yaml
 from corrscope.corrscope import Arguments, Config, CorrScope
-from corrscope.outputs import FFmpegOutputConfig
+from corrscope.outputs import FFmpegOutputConfig, RawVideoOutputConfig
 from corrscope.util import pushd
 
 if TYPE_CHECKING:
@@ -160,3 +160,44 @@ def test_load_yaml_another_dir(mocker, Popen):
     argv = args[0]
     assert argv[-1] == mp4_abs
     assert f"-i {wav_abs}" in " ".join(argv)
+
+
+def test_raw_output(mocker: "pytest_mock.MockFixture"):
+    """ Ensure --raw renders to a RawVideoOutputConfig with --pixel-format. """
+    CorrScope = mocker.patch.object(cli, "CorrScope")
+    call_main(shlex.split("tests -a tests/sine440.wav --raw --pixel-format yuv420p"))
+
+    CorrScope.assert_called_once()
+    (cfg, arg), kwargs = CorrScope.call_args
+    assert arg.outputs == [RawVideoOutputConfig("sine440.rawvideo", "yuv420p")]
+
+
+def test_encode_raw(mocker: "pytest_mock.MockFixture", tmp_path: Path):
+    """ Ensure --encode encodes a raw video file (relative to the current dir)
+    to a video file (relative to the config dir), using master audio from
+    the config. """
+    CorrScope = mocker.patch.object(cli, "CorrScope")
+    encode_raw_video = mocker.patch.object(cli, "encode_raw_video", return_value=0)
+
+    raw = tmp_path / "frames.rawvideo"
+    raw.write_bytes(b"")
+    yaml_path = tmp_path / "config.yaml"
+    yaml.dump(cli.default_config(master_audio="audio.wav"), yaml_path)
+
+    call_main([str(yaml_path), "--encode", str(raw)])
+    assert not CorrScope.called
+
+    encode_raw_video.assert_called_once()
+    (raw_path, output, cfg), kwargs = encode_raw_video.call_args
+    assert raw_path == abspath(raw)
+    assert output == FFmpegOutputConfig(Path("config.mp4"))
+    assert cfg.master_audio == "audio.wav"
+
+    # FFmpeg errors are reported.
+    encode_raw_video.return_value = 1
+    with pytest.raises(click.ClickException):
+        call_main([str(yaml_path), "--encode", str(raw)])
+
+    # --encode doesn't render.
+    with pytest.raises(click.UsageError):
+        call_main([str(yaml_path), "--encode", str(raw), "--render"])
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_equal
+
+from corrscope.utils.colorspace import (
+    PALETTE_SIZE,
+    rgb_to_yuv420p,
+    yuv420p_nbytes,
+    palette_ramps,
+    palette_lut,
+    rgba_to_indexed,
+    indexed_to_rgb,
+    indexed_to_yuv420p,
+    pal8_palette,
+)
+
+
+@pytest.mark.parametrize(
+    "rgb,yuv",
+    [
+        # BT.601 limited range, matching FFmpeg.
+        ((0, 0, 0), (16, 128, 128)),
+        ((255, 255, 255), (235, 128, 128)),
+        ((255, 0, 0), (82, 90, 240)),
+        ((0, 255, 0), (144, 54, 34)),
+        ((0, 0, 255), (41, 240, 110)),
+    ],
+)
+def test_rgb_to_yuv420p(rgb, yuv):
+    width = 4
+    height = 2
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = rgb
+
+    out = rgb_to_yuv420p(frame)
+    assert out.dtype == np.uint8
+    assert len(out) == yuv420p_nbytes(width, height) == 12
+
+    nluma = width * height
+    assert_equal(out[:nluma], yuv[0])
+    assert_equal(out[nluma : nluma + 2], yuv[1])
+    assert_equal(out[nluma + 2 :], yuv[2])
+
+
+def test_yuv420p_chroma_average():
+    """ Ensure chroma is computed from the average of each 2x2 block. """
+    frame = np.zeros((2, 2, 3), dtype=np.uint8)
+    frame[0, 0] = (255, 0, 0)
+    frame[1, 1] = (255, 0, 0)
+
+    avg = np.full((2, 2, 3), (128, 0, 0), dtype=np.uint8)
+    assert_equal(rgb_to_yuv420p(frame)[4:], rgb_to_yuv420p(avg)[4:])
+
+
+def test_yuv420p_odd_size():
+    with pytest.raises(ValueError):
+        rgb_to_yuv420p(np.zeros((2, 3, 3), dtype=np.uint8))
+
+
+# Palette-indexed frames
+BG = (0, 0, 0)
+GRID = (255, 0, 255)
+LINE = (255, 255, 255)
+
+
+def test_palette_ramps():
+    palette = palette_ramps([BG, GRID, LINE], [BG, GRID])
+    assert len(palette) <= PALETTE_SIZE
+
+    # Original colors come first.
+    assert_equal(palette[:3], [BG, GRID, LINE])
+
+    # Blends of the line over the grid are present.
+    pal_set = {tuple(c) for c in palette}
+    assert (255, 128, 255) in pal_set
+
+
+def test_palette_exact_colors():
+    """ Ensure the original palette colors are mapped to themselves. """
+    palette = palette_ramps([BG, GRID, LINE], [BG, GRID])
+    lut = palette_lut(palette)
+
+    rgba = np.full((1, 3, 4), 255, dtype=np.uint8)
+    rgba[0, :, :3] = palette[:3]
+    assert_equal(rgba_to_indexed(rgba, lut), [[0, 1, 2]])
+
+
+def test_indexed_nearest_color():
+    palette = palette_ramps([BG, LINE], [BG])
+    lut = palette_lut(palette)
+
+    rgba = np.zeros((2, 2, 4), dtype=np.uint8)
+    rgba[..., :3] = 100
+    indices = rgba_to_indexed(rgba, lut)
+    rgb = indexed_to_rgb(indices, palette)
+    assert rgb.shape == (2, 2, 3)
+    assert (np.abs(rgb.astype(int) - 100) <= 8).all()
+
+
+def test_indexed_to_yuv420p():
+    """ Ensure converting palette colors to YUV matches converting pixels. """
+    palette = palette_ramps([BG, GRID, LINE], [BG, GRID])
+    indices = np.array([[0, 1, 2, 2], [1, 0, 2, 2]], dtype=np.uint8)
+
+    expected = rgb_to_yuv420p(indexed_to_rgb(indices, palette))
+    assert_equal(indexed_to_yuv420p(indices, palette), expected)
+
+
+def test_pal8_palette():
+    palette = np.array([[1, 2, 3]], dtype=np.uint8)
+    pal8 = np.frombuffer(pal8_palette(palette), dtype=np.uint32)
+    assert len(pal8) == PALETTE_SIZE
+    assert pal8[0] == 0xFF010203
+    assert (pal8[1:] == 0).all()
@@ -0,0 +1,128 @@
+"""
+- Test CorrScope progress reporting and adaptive preview.
+"""
+from typing import TYPE_CHECKING, List
+
+import pytest
+
+from corrscope.corrscope import (
+    CorrScope,
+    Arguments,
+    ProgressEvent,
+    ProgressTracker,
+    PreviewController,
+    STAGES,
+)
+from tests.test_output import NULL_FFMPEG_OUTPUT, sine440_config
+
+if TYPE_CHECKING:
+    import pytest_mock
+
+
+# Calls CorrScope, mocks Popen.
+@pytest.mark.usefixtures("Popen")
+def test_progress_event(Popen, mocker: "pytest_mock.MockFixture"):
+    """ Ensure CorrScope sends ProgressEvent with frame counts, FPS, ETA,
+    and per-stage timings, ending at the last frame. """
+    cfg = sine440_config()
+    cfg.end_time = 0.1
+    on_progress = mocker.Mock()
+    arg = Arguments(
+        ".", [NULL_FFMPEG_OUTPUT], on_progress=on_progress, progress_interval=0
+    )
+    corr = CorrScope(cfg, arg)
+    corr.play()
+
+    events: List[ProgressEvent] = [
+        args[0] for args, kwargs in on_progress.call_args_list
+    ]
+    nframes = events[0].nframes
+    assert [event.frame for event in events] == list(range(1, nframes + 1))
+
+    last = events[-1]
+    assert last.eta_seconds == 0
+    assert last.fps > 0
+    assert list(last.stage_ms) == STAGES
+    assert last.outputs == [corr.outputs[0].stats]
+
+
+def test_progress_tracker_throttle(mocker: "pytest_mock.MockFixture"):
+    """ Ensure ProgressTracker only sends events after `interval` elapses,
+    or when forced. """
+    on_progress = mocker.Mock()
+    tracker = ProgressTracker(on_progress, interval=1000, nframes=10)
+
+    for frame in range(1, 10):
+        tracker.update(frame, 0, [])
+    on_progress.assert_not_called()
+
+    tracker.update(10, 0, [], force=True)
+    (event,), kwargs = on_progress.call_args
+    assert event.frame == 10
+    assert event.eta_seconds == 0
+
+
+def test_preview_controller():
+    """ Ensure PreviewController lowers detail and then skips frames when rendering
+    is slow, stops at a stable level (hysteresis), and recovers when rendering
+    is fast. """
+    controller = PreviewController(render_fps=100)
+    max_level = len(PreviewController.LEVELS) - 1
+
+    def run(trigger_seconds: float, render_seconds: float) -> List[bool]:
+        renders = []
+        for _ in range(500):
+            controller.add_time("trigger", trigger_seconds)
+            render = controller.next_frame()
+            if render:
+                controller.add_time("render", render_seconds)
+            renders.append(render)
+        return renders[-12:]
+
+    # Budget = 10ms. Lowering detail doesn't help (render time is fixed here),
+    # so skip frames too. Skipping 3 of 4 frames costs 1ms + 32ms/4 = 9ms.
+    renders = run(0.001, 0.032)
+    assert controller.level == max_level
+    assert (controller.detail, controller.skip) == (4, 4)
+    assert renders.count(True) == 3
+
+    # Skipping 2 of 3 costs 5ms, under 60% of the budget, so skip fewer frames.
+    # Skipping 1 of 2 costs 7ms, which is not, so don't switch back and forth.
+    renders = run(0.001, 0.012)
+    assert (controller.detail, controller.skip) == (4, 3)
+    assert renders.count(True) == 4
+
+    # Full detail is estimated to cost 1ms + 2ms * 2 = 5ms.
+    renders = run(0.001, 0.002)
+    assert controller.level == 0
+    assert (controller.detail, controller.skip) == (1, 1)
+    assert all(renders)
+
+
+def test_adaptive_preview(mocker: "pytest_mock.MockFixture"):
+    """ Ensure adaptive preview repeats the previous frame instead of rendering,
+    without reading render-data for repeated frames. """
+    from corrscope.wave import Wave
+
+    cfg = sine440_config()
+    cfg.adaptive_preview = True
+
+    output = mocker.MagicMock()
+    output.__enter__.return_value = output
+    output.write_frame.return_value = None
+    corr = CorrScope(cfg, Arguments(".", [lambda corr_cfg: output]))
+    renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+    get_around = mocker.spy(Wave, "get_around")
+
+    mocker.patch.object(PreviewController, "next_frame", side_effect=[True, False] * 100)
+    corr.play()
+
+    nframe = round(cfg.fps * 0.5) + 1
+    assert output.write_frame.call_count == nframe
+    assert renderer.render_frame.call_count == (nframe + 1) // 2
+
+    (render_wave,) = corr.render_waves
+    render_reads = [
+        call for call in get_around.call_args_list if call[0][0] is render_wave
+    ]
+    assert len(render_reads) == renderer.render_frame.call_count
@@ -6,21 +6,44 @@ import errno
 import os
 import shutil
 import subprocess
+import time
 from fractions import Fraction
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 import pytest
 
+import corrscope.outputs
 from corrscope.channel import ChannelConfig
-from corrscope.corrscope import default_config, Config, CorrScope, Arguments
+from corrscope.corrscope import (
+    default_config,
+    Config,
+    CorrScope,
+    Arguments,
+)
+from corrscope.config import CorrError, CorrWarning
 from corrscope.outputs import (
     RGB_DEPTH,
+    PIXEL_FORMAT,
+    YUV420P,
+    PAL8,
     FFmpegOutput,
     FFmpegOutputConfig,
     FFplayOutput,
     FFplayOutputConfig,
+    FFmpegTeeOutput,
+    FFmpegTeeOutputConfig,
+    ImageSequenceOutputConfig,
+    IOutputConfig,
+    PipeOutput,
+    RawVideoOutputConfig,
+    RealTimeOutput,
     Stop,
+    encode_frame,
+    encode_raw_video,
+    is_record_output,
+    read_raw_video,
+    register_output,
 )
 from corrscope.renderer import RendererConfig, MatplotlibRenderer
 from tests.test_renderer import RENDER_Y_ZEROS, WIDTH, HEIGHT
@@ -53,6 +76,8 @@ def exception_Popen(mocker: "pytest_mock.MockFixture", exc: Exception) -> "Magic
 
         popen.stdin.write.side_effect = exc
         popen.wait.return_value = 0
+        # Mocked processes have no pid, so don't reap them using os.wait4().
+        popen.returncode = 0
         return popen
 
     Popen = mocker.patch.object(subprocess, "Popen", autospec=True)
@@ -105,6 +130,439 @@ def test_output():
     assert not Path("-").exists()
 
 
+# Mocks Popen.
+@pytest.mark.usefixtures("Popen")
+def test_output_yuv420p(Popen):
+    """ Ensure FFmpegOutput converts frames to yuv420p when requested,
+    and tells FFmpeg the correct pixel format. """
+    cfg = FFmpegOutputConfig(None, "-f null", pixel_format=YUV420P)
+    out: FFmpegOutput = cfg(CFG)
+    assert out.pixel_format == YUV420P
+
+    (args,), kwargs = Popen.call_args
+    assert args[args.index("-pixel_format") + 1] == YUV420P
+
+    out.write_frame(bytes(WIDTH * HEIGHT * RGB_DEPTH))
+    (frame,), _ = out._stream.write.call_args
+    assert len(frame) == WIDTH * HEIGHT * 3 // 2
+
+    assert out.close() == 0
+
+
+@pytest.mark.usefixtures("Popen")
+def test_output_yuv420p_odd_size(Popen):
+    """ Ensure yuv420p falls back to rgb24 with odd resolutions. """
+    cfg = FFmpegOutputConfig(None, "-f null", pixel_format=YUV420P)
+    corr_cfg = default_config(render=RendererConfig(WIDTH + 1, HEIGHT))
+
+    with pytest.warns(CorrWarning):
+        out: FFmpegOutput = cfg(corr_cfg)
+    assert out.pixel_format == PIXEL_FORMAT
+
+    (args,), kwargs = Popen.call_args
+    assert args[args.index("-pixel_format") + 1] == PIXEL_FORMAT
+
+
+# Calls CorrScope, mocks Popen.
+@pytest.mark.usefixtures("Popen")
+def test_output_pal8(Popen, mocker: "pytest_mock.MockFixture"):
+    """ Ensure CorrScope renders indexed frames if an output requests pal8,
+    and other outputs receive lossless rgb24 frames. """
+    from corrscope.utils.colorspace import PALETTE_SIZE
+
+    get_frame = mocker.spy(MatplotlibRenderer, "get_frame")
+
+    cfg = sine440_config()
+    cfg.end_time = 0.05
+    pal8_cfg = FFmpegOutputConfig(None, "-f null", pixel_format=PAL8)
+    corr = CorrScope(cfg, Arguments(".", [pal8_cfg, FFplayOutputConfig()]))
+    corr.play()
+
+    pal8, ffplay = corr.outputs
+
+    (args,), kwargs = Popen.call_args_list[0]
+    assert args[args.index("-pixel_format") + 1] == PAL8
+
+    # pal8 writes indices, then a palette.
+    (indices,), _ = pal8._stream.write.call_args_list[0]
+    (palette,), _ = pal8._stream.write.call_args_list[1]
+    assert indices.nbytes == WIDTH * HEIGHT
+    assert len(palette) == PALETTE_SIZE * 4
+
+    # FFplay receives rgb24, rather than colors approximated by the palette.
+    (rgb,), _ = ffplay._stream.write.call_args
+    assert len(rgb) == WIDTH * HEIGHT * RGB_DEPTH
+    assert rgb == get_frame.spy_return
+
+
+@pytest.mark.usefixtures("Popen")
+def test_output_rgb_only(mocker: "pytest_mock.MockFixture"):
+    """ Ensure CorrScope doesn't render indexed frames unless requested. """
+    get_frame_indexed = mocker.spy(MatplotlibRenderer, "get_frame_indexed")
+
+    cfg = sine440_config()
+    cfg.end_time = 0.05
+    corr = CorrScope(cfg, Arguments(".", [FFplayOutputConfig()]))
+    corr.play()
+    get_frame_indexed.assert_not_called()
+
+
+def test_output_invalid_pixel_format():
+    with pytest.raises(CorrError):
+        FFmpegOutputConfig(None, pixel_format="rgb565")
+
+
+# Launches a frame_ring reader process, but not FFmpeg.
+def test_output_frame_ring(tmp_path: Path):
+    """ Ensure frames written to shared memory arrive in order,
+    even when there are more frames than ring slots. """
+    import numpy as np
+    from corrscope import frame_ring
+    from corrscope.frame_ring import FrameRing
+
+    frame_bytes = WIDTH * HEIGHT * RGB_DEPTH
+    frames = [np.full(frame_bytes, i, dtype=np.uint8) for i in range(10)]
+
+    ring = FrameRing.create(nslot=3, slot_nbytes=frame_bytes)
+    out_path = tmp_path / "frames.rgb"
+    with out_path.open("wb") as f:
+        reader = frame_ring.spawn_reader(ring, stdout=f)
+
+    output = PipeOutput(CFG, NULL_FFMPEG_OUTPUT)
+    output.open(reader, ring=ring)
+    for frame in frames:
+        assert output.write_frame(frame) is None
+    assert output.close() == 0
+
+    assert out_path.read_bytes() == b"".join(frame.tobytes() for frame in frames)
+    assert not os.path.exists(ring.path)
+
+
+@pytest.mark.usefixtures("Popen")
+def test_output_shared_memory(Popen, mocker: "pytest_mock.MockFixture"):
+    """ Ensure FFmpegOutput falls back to a pipe if the reader can't be started. """
+    from corrscope import frame_ring
+
+    cfg = FFmpegOutputConfig(None, "-f null", shared_memory=True)
+
+    mocker.patch.object(frame_ring, "can_spawn_reader", return_value=False)
+    output = cfg(CFG)
+    assert output._ring is None
+    assert len(output._pipeline) == 1
+    output.close()
+
+
+@pytest.mark.usefixtures("Popen")
+def test_output_tee(Popen):
+    """ Ensure FFmpegTeeOutput encodes every output using one FFmpeg process,
+    and writes each frame once. """
+    cfg = sine440_config()
+    tee_cfg = FFmpegTeeOutputConfig(
+        [FFmpegOutputConfig("master.mp4"), FFmpegOutputConfig("preview.mp4", "-crf 40")]
+    )
+    assert is_record_output(tee_cfg)
+
+    out: FFmpegTeeOutput = tee_cfg(cfg)
+    Popen.assert_called_once()
+    (args,), kwargs = Popen.call_args
+
+    # Both outputs are written, and trimmed to end_time.
+    assert args.count("-i") == 2
+    assert args.count("-to") == 2
+    assert args[-1] == os.path.abspath("preview.mp4")
+    assert os.path.abspath("master.mp4") in args
+
+    frame = bytes(WIDTH * HEIGHT * RGB_DEPTH)
+    out.write_frame(frame)
+    out._stream.write.assert_called_once_with(frame)
+    assert out.close() == 0
+
+
+@pytest.mark.usefixtures("Popen")
+def test_output_tee_ffplay(Popen):
+    """ Ensure FFmpegTeeOutput pipes FFmpeg's stdout to FFplay,
+    and sends FFplay rgb24 frames. """
+    tee_cfg = FFmpegTeeOutputConfig(
+        [FFmpegOutputConfig("master.mp4", pixel_format=YUV420P), FFplayOutputConfig()]
+    )
+    with pytest.warns(CorrWarning):
+        out: FFmpegTeeOutput = tee_cfg(CFG)
+    assert out.pixel_format == PIXEL_FORMAT
+
+    assert Popen.call_count == 2
+    (ffmpeg_args,), kwargs = Popen.call_args_list[0]
+    (ffplay_args,), _ = Popen.call_args_list[1]
+    assert kwargs["stdout"] == subprocess.PIPE
+    assert ffmpeg_args[-3:] == ["-f", "nut", "-"]
+    assert ffplay_args[0] == "ffplay"
+    assert len(out._pipeline) == 2
+    assert out.close() == 0
+
+
+def wrap_popen(popen_factory, write):
+    """ Replaces stdin.write() of each mocked Popen. """
+    def wrapped(*args, **kwargs):
+        popen = popen_factory(*args, **kwargs)
+        popen.stdin.write.side_effect = write
+        return popen
+
+    return wrapped
+
+
+# Calls CorrScope, mocks Popen.
+@pytest.mark.usefixtures("Popen")
+def test_output_stats(Popen, mocker: "pytest_mock.MockFixture"):
+    """ Ensure outputs measure bytes written and time blocked writing,
+    and CorrScope reports them in ProgressEvent. """
+    import time
+
+    cfg = sine440_config()
+    cfg.end_time = 0.05
+    on_progress = mocker.Mock()
+    corr = CorrScope(
+        cfg,
+        Arguments(
+            ".", [NULL_FFMPEG_OUTPUT], on_progress=on_progress, progress_interval=0
+        ),
+    )
+
+    # Simulate FFmpeg accepting frames slowly.
+    block_seconds = 0.01
+    write = lambda data: time.sleep(block_seconds)
+    Popen.side_effect = wrap_popen(Popen.side_effect, write)
+    corr.play()
+
+    (output,) = corr.outputs
+    stats = output.stats
+    nframes = stats.nframes
+    assert nframes > 1
+    assert stats.nbytes == nframes * WIDTH * HEIGHT * RGB_DEPTH
+    assert stats.write_seconds >= nframes * block_seconds
+    assert stats.end is not None
+
+    (event,), _ = on_progress.call_args
+    assert event.outputs == [stats]
+    assert str(stats) in str(event)
+
+
+class FakeTime:
+    """ Replaces the `time` module. Time only passes during sleep(). """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(seconds, 0)
+
+
+class SleepOutputConfig(IOutputConfig):
+    show_seconds: float = 0.0
+
+
+@register_output(SleepOutputConfig)
+class SleepOutput(RealTimeOutput):
+    def show_frame(self, frame):
+        corrscope.outputs.time.sleep(self.cfg.show_seconds)
+
+
+@pytest.mark.parametrize("show_frames", [0, 3])
+def test_real_time_output(mocker: "pytest_mock.MockFixture", show_frames: int):
+    """ Ensure RealTimeOutput shows frames in real time,
+    and skips rendering frames which are already late. """
+    cfg = sine440_config()
+    cfg.master_audio = ""  # Keep time without playing audio.
+    nframe = round(cfg.fps * cfg.end_time) + 1
+
+    fake_time = FakeTime()
+    mocker.patch("corrscope.outputs.time", fake_time)
+    begin = fake_time.now
+
+    output_cfg = SleepOutputConfig(show_seconds=show_frames / cfg.fps)
+    corr = CorrScope(cfg, Arguments(".", [output_cfg]))
+    renderer = mocker.patch.object(CorrScope, "_load_renderer").return_value
+    renderer.get_frame.return_value = bytes(RGB_DEPTH)
+    corr.play()
+
+    (output,) = corr.outputs
+    assert output.stats.nframes == renderer.render_frame.call_count
+    # Rendering takes no time, so each frame waits until its time.
+    assert fake_time.now - begin >= cfg.end_time
+
+    if show_frames:
+        # Each frame takes 3 frames to show, so the 2 after it are skipped.
+        assert output.stats.nframes == pytest.approx(nframe / 3, abs=1)
+    else:
+        assert output.stats.nframes == nframe
+
+
+def test_audio_clock(mocker: "pytest_mock.MockFixture"):
+    """ Ensure AudioClock follows FFplay's reported playback position,
+    holding still until playback starts. """
+    from corrscope.outputs import AudioClock, parse_ffplay_status
+
+    status = b"   5.20 M-A:  0.000 fd=   0 aq=   12KB vq=    0KB sq=    0B f=0/0   "
+    assert parse_ffplay_status(status) == 5.2
+    assert parse_ffplay_status(b"    nan M-A:    nan fd=   0 aq=    0KB") is None
+    assert parse_ffplay_status(b"Input #0, wav, from 'sine440.wav':") is None
+    assert parse_ffplay_status(b"") is None
+
+    Popen = mocker.patch.object(subprocess, "Popen")
+    Popen.return_value.stderr.read1.return_value = b""
+    time_ = mocker.patch("corrscope.outputs.time")
+
+    time_.monotonic.return_value = 100.0
+    clock = AudioClock("sine440.wav", begin_time=5.0)
+    assert "-stats" in Popen.call_args[0][0]
+
+    # FFplay is buffering audio.
+    time_.monotonic.return_value = 101.0
+    assert clock.now() == 5.0
+
+    clock.report(status)
+    time_.monotonic.return_value = 101.5
+    assert clock.now() == pytest.approx(5.7)
+
+    # If FFplay never reports, fall back to wall time.
+    time_.monotonic.return_value = 100.0
+    clock = AudioClock("sine440.wav", begin_time=5.0)
+    time_.monotonic.return_value = 100.0 + AudioClock.STATUS_TIMEOUT + 1
+    assert clock.now() == pytest.approx(5.0 + AudioClock.STATUS_TIMEOUT + 1)
+    clock.close()
+
+
+def test_real_time_output_indexed(mocker: "pytest_mock.MockFixture"):
+    """ Ensure RealTimeOutput shows IndexedFrame as rgb24. """
+    import numpy as np
+    from corrscope.utils.colorspace import IndexedFrame, indexed_to_rgb
+
+    cfg = sine440_config()
+    cfg.master_audio = ""
+    rcfg = cfg.render
+    height, width = rcfg.height, rcfg.width
+
+    rng = np.random.RandomState(0)
+    palette = rng.randint(0, 256, (4, 3), dtype=np.uint8)
+    frame = IndexedFrame(
+        rng.randint(0, len(palette), (height, width), dtype=np.uint8), palette
+    )
+
+    output = SleepOutputConfig()(cfg)
+    show_frame = mocker.spy(output, "show_frame")
+    with output:
+        output.write_frame(frame)
+
+    (rgb,) = show_frame.call_args[0]
+    assert bytes(rgb) == bytes(indexed_to_rgb(frame.indices, palette))
+    assert output.stats.nbytes == width * height * RGB_DEPTH
+
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="requires os.wait4()")
+def test_wait_cpu_seconds():
+    """ Ensure Outputs measure the CPU time of their own processes,
+    excluding other child processes. """
+    import sys
+    from corrscope.outputs import _wait_cpu_seconds
+
+    busy = "import time\nend = time.process_time() + 0.5\n"
+    busy += "while time.process_time() < end: pass"
+    other = subprocess.Popen([sys.executable, "-c", busy])
+    assert other.wait() == 0
+
+    popen = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+    exit_code, cpu_seconds = _wait_cpu_seconds(popen)
+    assert exit_code == popen.returncode == 3
+    assert cpu_seconds is not None
+    assert 0 <= cpu_seconds < 0.5
+
+    # Processes which were already reaped have unknown CPU time.
+    assert _wait_cpu_seconds(popen) == (3, None)
+
+
+def test_output_tee_invalid():
+    with pytest.raises(CorrError):
+        FFmpegTeeOutputConfig([FFplayOutputConfig(), FFplayOutputConfig()])
+
+
+@pytest.mark.parametrize("ext", [".png", ".rgb"])
+def test_output_image_sequence(tmp_path: Path, ext: str):
+    """ Ensure ImageSequenceOutput writes each frame to a numbered file,
+    in order, and PNG files decode to the original pixels. """
+    import numpy as np
+    import matplotlib.image
+
+    nframe = 10
+    rng = np.random.RandomState(0)
+    frames = [
+        rng.randint(0, 256, size=(HEIGHT, WIDTH, RGB_DEPTH), dtype=np.uint8)
+        for _ in range(nframe)
+    ]
+
+    cfg = ImageSequenceOutputConfig(str(tmp_path / "out" / f"%03d{ext}"), nthreads=2)
+    with cfg(CFG) as output:
+        for frame in frames:
+            output.write_frame(frame.tobytes())
+
+    for i, frame in enumerate(frames):
+        path = tmp_path / "out" / f"{i:03d}{ext}"
+        if ext == ".png":
+            image = matplotlib.image.imread(str(path))
+            np.testing.assert_array_equal(np.around(image * 255), frame)
+        else:
+            assert path.read_bytes() == frame.tobytes()
+    assert len(list((tmp_path / "out").iterdir())) == nframe
+
+
+@pytest.mark.parametrize("path", ["frames.png", "%d-%d.png", "%d.jpg"])
+def test_output_image_sequence_invalid(path: str):
+    with pytest.raises(CorrError):
+        ImageSequenceOutputConfig(path)
+
+
+@pytest.mark.parametrize("pixel_format", [PIXEL_FORMAT, YUV420P])
+def test_output_raw_video(tmp_path: Path, pixel_format: str):
+    """ Ensure RawVideoOutput records its format and frames,
+    and read_raw_video() memory-maps them back. """
+    import numpy as np
+
+    frame_bytes = WIDTH * HEIGHT * RGB_DEPTH
+    frames = [np.full(frame_bytes, i, dtype=np.uint8) for i in range(5)]
+
+    path = str(tmp_path / "out.raw")
+    with RawVideoOutputConfig(path, pixel_format)(CFG) as output:
+        for frame in frames:
+            output.write_frame(frame)
+
+    header, data = read_raw_video(path)
+    assert (header.width, header.height) == (WIDTH, HEIGHT)
+    assert header.fps == CFG.render_fps
+    assert header.pixel_format == pixel_format
+    assert header.nframes == len(frames)
+
+    for frame, written in zip(frames, data):
+        (expected,) = encode_frame(frame, pixel_format, CFG)
+        np.testing.assert_array_equal(written, np.frombuffer(expected, np.uint8))
+
+
+@pytest.mark.usefixtures("Popen")
+def test_encode_raw_video(Popen, tmp_path: Path):
+    """ Ensure encode_raw_video() makes FFmpeg read the raw file directly,
+    with the recorded format. """
+    path = str(tmp_path / "out.raw")
+    with RawVideoOutputConfig(path, YUV420P)(CFG) as output:
+        output.write_frame(bytes(WIDTH * HEIGHT * RGB_DEPTH))
+
+    assert encode_raw_video(path, NULL_FFMPEG_OUTPUT, CFG) == 0
+    (args,), kwargs = Popen.call_args
+    assert args[args.index("-pixel_format") + 1] == YUV420P
+    assert args[args.index("-video_size") + 1] == f"{WIDTH}x{HEIGHT}"
+    assert args[args.index("-i") + 1] == path
+
+
 ## Ensure CorrScope closes pipe to output upon completion.
 # Calls FFplayOutput, mocks Popen.
 @pytest.mark.usefixtures("Popen")
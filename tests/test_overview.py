@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+from pytest_mock import MockFixture
+
+from corrscope.overview import Overview, load_overview, FACTOR, MIN_BLOCKS
+from corrscope.wave import Wave, ENVELOPE_BLOCK
+
+
+def test_overview_pyramid():
+    """ Ensure each level holds the min and max of FACTOR blocks of the last. """
+    minmax = np.random.RandomState(0).uniform(-1, 1, (MIN_BLOCKS * 20 + 3, 2))
+    minmax.sort(axis=1)
+    overview = Overview.from_minmax(minmax)
+
+    assert len(overview.levels[-1]) <= MIN_BLOCKS
+    assert len(overview.levels[-2]) > MIN_BLOCKS
+    for fine, coarse in zip(overview.levels, overview.levels[1:]):
+        assert len(coarse) == -(-len(fine) // FACTOR)
+        for i in [0, len(coarse) - 1]:
+            blocks = fine[i * FACTOR : (i + 1) * FACTOR]
+            assert coarse[i, 0] == blocks[:, 0].min()
+            assert coarse[i, 1] == blocks[:, 1].max()
+
+    # get() covers the entire file.
+    whole = overview.get(1)
+    assert whole.tolist() == [[minmax[:, 0].min(), minmax[:, 1].max()]]
+    assert overview.get(7).shape == (7, 2)
+
+
+def test_overview_impulse():
+    """ Ensure overviews locate features, and match Wave.calc_envelope(). """
+    wave = Wave("tests/impulse24000.wav")
+    overview = Overview.from_minmax(wave.calc_minmax())
+
+    wave.calc_envelope()
+    np.testing.assert_array_equal(overview.envelope(), wave.envelope)
+    assert len(overview.levels[0]) == -(-wave.nsamp // ENVELOPE_BLOCK)
+
+    # At full resolution, only blocks containing impulses are loud.
+    nblock = len(overview.levels[0])
+    loud = np.abs(overview.get(nblock)).max(axis=1) > 0.5
+    impulses = np.flatnonzero(np.abs(wave[:]) > 0.5)
+    assert len(impulses)
+    assert np.flatnonzero(loud).tolist() == sorted(set(impulses // ENVELOPE_BLOCK))
+
+    # At lower resolution, loud regions remain loud.
+    assert np.abs(overview.get(10)).max() > 0.5
+
+
+def test_load_overview_cache(tmp_path: Path, mocker: MockFixture):
+    """ Ensure overviews are cached on disk, and reloaded without reading the file. """
+    calc_minmax = mocker.spy(Wave, "calc_minmax")
+
+    wave = Wave("tests/sine440.wav")
+    first = load_overview(wave, str(tmp_path))
+    assert first is not None
+    assert calc_minmax.call_count == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    second = load_overview(Wave("tests/sine440.wav"), str(tmp_path))
+    assert second is not None
+    assert calc_minmax.call_count == 1
+    assert len(second.levels) == len(first.levels)
+    for a, b in zip(first.levels, second.levels):
+        np.testing.assert_array_equal(a, b)
+
+    # Aborted overviews are not cached.
+    assert load_overview(wave, str(tmp_path / "abort"), lambda: True) is None
+    assert not (tmp_path / "abort").exists()
+
+
+def test_load_overview_unwritable(tmp_path: Path):
+    """ Ensure overviews are computed even if they can't be cached. """
+    not_dir = tmp_path / "file"
+    not_dir.write_bytes(b"")
+    assert load_overview(Wave("tests/sine440.wav"), str(not_dir)) is not None
@@ -1,8 +1,9 @@
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING, List
 
 import matplotlib.colors
 import numpy as np
 import pytest
+from matplotlib.lines import Line2D
 
 from corrscope.channel import ChannelConfig
 from corrscope.corrscope import CorrScope, default_config, Arguments
@@ -161,3 +162,303 @@ def test_stereo_render_integration(mocker: "pytest_mock.MockFixture"):
     # Make sure it doesn't crash.
     corr = CorrScope(cfg, Arguments(".", [FFplayOutputConfig()]))
     corr.play()
+
+
+def test_reconfigure_integration(mocker: "pytest_mock.MockFixture"):
+    """ Ensure editing the config while previewing restyles the renderer,
+    without changing the preview resolution. """
+    cfg = default_config(
+        channels=[ChannelConfig("tests/sine440.wav")],
+        end_time=0.5,
+        render=RendererConfig(WIDTH, HEIGHT, res_divisor=2),
+    )
+
+    edited = default_config(
+        channels=[ChannelConfig("tests/sine440.wav", line_color="#ff0000")],
+        render=RendererConfig(
+            WIDTH * 2, HEIGHT * 2, bg_color="#0000aa", line_width=4, res_divisor=2
+        ),
+    )
+    new_cfgs = [None, edited]
+    get_config = lambda: new_cfgs.pop() if new_cfgs else None
+
+    reconfigure = mocker.spy(MatplotlibRenderer, "reconfigure")
+    corr = CorrScope(cfg, Arguments(".", [], get_config=get_config))
+    corr.play()
+
+    reconfigure.assert_called_once()
+    render_cfg, channel_cfgs = reconfigure.call_args[0][1:]
+    assert (render_cfg.width, render_cfg.height) == (WIDTH / 2, HEIGHT / 2)
+    assert render_cfg.bg_color == "#0000aa"
+    assert render_cfg.line_width == 2
+    assert corr.renderer._line_params[0].color == "#ff0000"
+
+
+# Render-side decimation
+def test_minmax_decimate():
+    """ Ensure min/max decimation preserves peaks within each pixel column. """
+    from corrscope.renderer import minmax_bounds, minmax_decimate, minmax_xdata
+
+    # Short data is not decimated.
+    assert minmax_bounds(100, 50) is None
+    assert minmax_bounds(100, 0) is None
+
+    nsamp = 1000
+    ncol = 10
+    data = np.zeros((nsamp, 1), dtype=np.float32)
+    data[555] = 1
+    data[556] = -1
+
+    bounds = minmax_bounds(nsamp, ncol)
+    assert len(bounds) == ncol
+
+    decimated = minmax_decimate(data, bounds)
+    assert decimated.shape == (2 * ncol, 1)
+    assert decimated.dtype == data.dtype
+
+    # Only the 6th column contains a nonzero peak.
+    assert decimated[10, 0] == -1
+    assert decimated[11, 0] == 1
+    assert np.count_nonzero(decimated) == 2
+
+    xdata = minmax_xdata(nsamp, bounds)
+    assert len(xdata) == len(decimated)
+    assert xdata[0] == xdata[1] == 49.5
+    assert xdata[-1] == nsamp - 50.5
+
+
+def test_render_decimated():
+    """ Ensure waves with more samples than pixels are drawn as envelopes. """
+    cfg = RendererConfig(WIDTH, HEIGHT, antialiasing=False)
+    r = MatplotlibRenderer(cfg, LayoutConfig(), 1, None)
+
+    nsamp = WIDTH * 8
+    data = np.zeros((nsamp, 1))
+    data[::2] = 0.5
+    data[1::2] = -0.5
+
+    r.render_frame([data])
+    (line,) = r._lines_flat
+    ydata = line.get_ydata(orig=False)
+    assert len(ydata) < nsamp
+    assert np.amax(ydata) == 0.5
+    assert np.amin(ydata) == -0.5
+
+    # Ensure subsequent frames are decimated too.
+    r.render_frame([-data * 2])
+    ydata = line.get_ydata(orig=False)
+    assert len(ydata) < nsamp
+    assert np.amax(ydata) == 1
+
+
+def test_render_set_detail():
+    """ Ensure lowering detail draws fewer points, and restoring detail
+    draws the same image as before. """
+    width = 256
+    cfg = RendererConfig(width, HEIGHT, antialiasing=False)
+    r = MatplotlibRenderer(cfg, LayoutConfig(), 1, None)
+
+    nsamp = width * 8
+    data = np.sin(np.linspace(0, 20 * np.pi, nsamp)).reshape(-1, 1)
+
+    r.render_frame([data])
+    (line,) = r._lines_flat
+    npoint = len(line.get_ydata(orig=False))
+    full = r.get_frame()
+
+    r.set_detail(4)
+    r.render_frame([data])
+    assert len(line.get_ydata(orig=False)) < npoint
+    ydata = line.get_ydata(orig=False)
+    assert np.amax(ydata) == np.amax(data)
+    assert r.get_frame() != full
+
+    r.set_detail(1)
+    r.render_frame([data])
+    assert len(line.get_ydata(orig=False)) == npoint
+    assert r.get_frame() == full
+
+
+@pytest.mark.parametrize("nsamp,width", [(2, WIDTH), (2000, 1024)])
+def test_render_reuses_vertices(nsamp: int, width: int):
+    """ Ensure lines drawn after the first frame reflect new data,
+    even though vertices are written in-place instead of via set_ydata().
+    (nsamp=2000 is long enough for Line2D to draw subsliced data.) """
+    cfg = RendererConfig(width, HEIGHT, antialiasing=False)
+    r = MatplotlibRenderer(cfg, LayoutConfig(), 1, None)
+
+    def render(value: float) -> np.ndarray:
+        r.render_frame([np.full((nsamp, 1), value)])
+        return np.frombuffer(r.get_frame(), dtype=np.uint8).reshape(
+            (HEIGHT, width, RGB_DEPTH)
+        )
+
+    def line_row(frame: np.ndarray) -> int:
+        # The default foreground is white, and background is black.
+        return int(np.argmax(frame[:, width // 2, 0]))
+
+    top = line_row(render(0.5))
+    vertices = r._ydata2d[0][0]
+
+    bottom = line_row(render(-0.5))
+    assert bottom > top
+
+    # Ensure the vertex array is reused.
+    assert r._ydata2d[0][0] is vertices
+    assert (vertices == -0.5).all()
+
+    # line_vertices() relies on private matplotlib attributes. If they change,
+    # this fails, instead of silently falling back to set_ydata().
+    assert r._in_place
+
+
+@pytest.mark.parametrize("width", [WIDTH, 100])
+def test_render_without_line_vertices(mocker: "pytest_mock.MockFixture", width: int):
+    """ Ensure that if matplotlib's internals don't support in-place vertices,
+    lines are drawn identically using set_ydata(). """
+    cfg = RendererConfig(width, HEIGHT)
+    x = np.linspace(-1, 1, 500).reshape(-1, 1)
+    frames = [[x, -x], [np.sin(5 * x), -x], [x ** 2, np.cos(3 * x)]]
+
+    def render_all() -> List[bytes]:
+        r = MatplotlibRenderer(cfg, LayoutConfig(), 2, None)
+        out = []
+        for datas in frames:
+            r.render_frame(datas)
+            out.append(r.get_frame())
+        r.set_detail(2)
+        r.render_frame(frames[0])
+        out.append(r.get_frame())
+        return out
+
+    expected = render_all()
+
+    mocker.patch("corrscope.renderer.line_vertices", return_value=None)
+    set_ydata = mocker.spy(Line2D, "set_ydata")
+    assert render_all() == expected
+    assert set_ydata.call_count > 0
+
+
+@pytest.mark.parametrize("width", [WIDTH, 100])
+def test_render_dirty_axes(mocker: "pytest_mock.MockFixture", width: int):
+    """ Ensure that redrawing only changed Axes produces the same image
+    as redrawing the entire figure. """
+    cfg = RendererConfig(width, HEIGHT, grid_color="#ff00ff")
+    lcfg = LayoutConfig(nrows=1)
+    nplots = 3
+
+    x = np.linspace(-1, 1, 50).reshape(-1, 1)
+    prev_datas = [x, x ** 2, -x]
+    datas = [x, np.sin(5 * x), -x]
+
+    def get_frame(r: MatplotlibRenderer) -> np.ndarray:
+        return np.frombuffer(r.get_frame(), dtype=np.uint8)
+
+    r = MatplotlibRenderer(cfg, lcfg, nplots, None)
+    r.render_frame(prev_datas)
+
+    draw_artist = mocker.spy(r._axes2d[1][0], "draw_artist")
+    r.render_frame(datas)
+    dirty_frame = get_frame(r)
+
+    # Ensure only the changed Axes was redrawn.
+    assert draw_artist.call_count == 1
+
+    # Ensure the output matches a freshly drawn renderer.
+    fresh = MatplotlibRenderer(cfg, lcfg, nplots, None)
+    fresh.render_frame(datas)
+    assert (dirty_frame == get_frame(fresh)).all()
+
+
+def test_render_dirty_threshold():
+    """ Ensure lines which move by no more than RendererConfig.dirty_threshold
+    are not redrawn, until they drift further from the drawn line. """
+    cfg = RendererConfig(WIDTH, HEIGHT, dirty_threshold=0.1)
+    r = MatplotlibRenderer(cfg, LayoutConfig(), 1, None)
+
+    def render(value: float) -> bytes:
+        r.render_frame([np.full((50, 1), value)])
+        return r.get_frame()
+
+    drawn = render(0.0)
+    assert render(0.05) == drawn
+    assert render(0.1) == drawn
+    assert render(0.15) != drawn
+
+
+@pytest.mark.parametrize(
+    "old,new",
+    [
+        (dict(), dict(bg_color="#0000aa", line_width=3, init_line_color="#aaaa00")),
+        (dict(), dict(grid_color="#ff00ff", v_midline=True, midline_color="#404040")),
+        (dict(grid_color="#ff00ff", h_midline=True, midline_color="#404040"), dict()),
+        (dict(grid_color="#ff00ff"), dict(stereo_grid_opacity=0)),
+    ],
+)
+def test_render_reconfigure(old: dict, new: dict):
+    """ Ensure reconfiguring a renderer produces the same image
+    as a renderer created with the new config. """
+    lcfg = LayoutConfig(nrows=1)
+    x = np.linspace(0, 10, 100)
+    datas = [np.stack([np.sin(x), np.cos(x)], axis=1), np.sin(x).reshape(-1, 1)]
+    channels = [ChannelConfig("", line_color="#ff0000"), ChannelConfig("")]
+
+    def get_frame(r: MatplotlibRenderer) -> np.ndarray:
+        return np.frombuffer(r.get_frame(), dtype=np.uint8)
+
+    r = MatplotlibRenderer(RendererConfig(WIDTH, HEIGHT, **old), lcfg, 2, None)
+    r.render_frame(datas)
+
+    new_cfg = RendererConfig(WIDTH, HEIGHT, **new)
+    r.reconfigure(new_cfg, channels)
+    reconfigured = get_frame(r)
+
+    fresh = MatplotlibRenderer(new_cfg, lcfg, 2, channels)
+    fresh.render_frame(datas)
+    assert (reconfigured == get_frame(fresh)).all()
+
+    # Partial redraws use the new background.
+    datas[1] = -datas[1]
+    r.render_frame(datas)
+    fresh.render_frame(datas)
+    assert (get_frame(r) == get_frame(fresh)).all()
+
+    # Resolution cannot be changed.
+    with pytest.raises(ValueError):
+        r.reconfigure(RendererConfig(WIDTH * 2, HEIGHT), None)
+
+
+def test_render_indexed():
+    """ Ensure palette-indexed frames approximate RGB frames,
+    including antialiased lines and dimmed stereo gridlines. """
+    from corrscope.utils.colorspace import indexed_to_rgb
+
+    cfg = RendererConfig(
+        WIDTH,
+        HEIGHT,
+        grid_color="#ff00ff",
+        midline_color="#404040",
+        v_midline=True,
+        h_midline=True,
+    )
+    r = MatplotlibRenderer(cfg, LayoutConfig(), NPLOTS, None)
+
+    x = np.linspace(0, 10, 100)
+    r.render_frame([np.stack([np.sin(x), np.cos(x)], axis=1)] * NPLOTS)
+
+    rgb = np.frombuffer(r.get_frame(), dtype=np.uint8).reshape((HEIGHT, WIDTH, -1))
+    frame = r.get_frame_indexed()
+    assert frame.indices.shape == (HEIGHT, WIDTH)
+    assert frame.indices.dtype == np.uint8
+
+    expanded = indexed_to_rgb(frame.indices, frame.palette)
+    error = np.amax(np.abs(expanded.astype(int) - rgb), axis=-1)
+
+    # Pixels blending 3 colors (like lines over gridline intersections)
+    # are not in the palette, and may be inexact.
+    assert np.mean(error <= 8) > 0.99
+
+    # Ensure background pixels are exact.
+    bg = (rgb == 0).all(axis=-1)
+    assert bg.any()
+    assert (frame.indices[bg] == 0).all()
@@ -1,8 +1,10 @@
 import attr
+import numpy as np
 import matplotlib.pyplot as plt
 import pytest
 from matplotlib.axes import Axes
 from matplotlib.figure import Figure
+from pytest_mock import MockFixture
 
 from corrscope import triggers
 from corrscope.triggers import (
@@ -196,3 +198,278 @@ def test_load_trigger_config():
 
 
 # TODO test_period get_period()
+
+
+# ZeroCrossingTrigger
+
+
+def zero_crossing_reference(wave: Wave, tsamp: int, index: int) -> int:
+    """ The original ZeroCrossingTrigger, using util.find(). """
+    from corrscope.util import find
+
+    if not 0 <= index < wave.nsamp:
+        return index
+
+    if wave[index] < 0:
+        direction = 1
+        test = lambda a: a >= 0
+    elif wave[index] > 0:
+        direction = -1
+        test = lambda a: a <= 0
+    else:
+        return index + 1
+
+    data = wave[index : index + (direction * tsamp) : direction]
+    try:
+        (delta,), value = next(find(data, test))
+        return index + (delta * direction) + int(value <= 0)
+    except StopIteration:
+        return index
+
+
+@pytest.mark.parametrize("filename", ["tests/sine440.wav", "tests/impulse24000.wav"])
+def test_zero_crossing_trigger(filename: str):
+    """ Ensure the vectorized ZeroCrossingTrigger matches the original,
+    and get_triggers() matches get_trigger(). """
+    wave = Wave(filename)
+    tsamp = 256
+    trigger = ZeroCrossingTriggerConfig()(wave, tsamp, stride=1, fps=FPS)
+
+    # The original misbehaves when scanning left past sample 0.
+    indices = list(range(tsamp, wave.nsamp, 97)) + [23999, 24000, 24001]
+    for index in indices:
+        expected = zero_crossing_reference(wave, tsamp, index)
+        assert trigger.get_trigger(index, PerFrameCache()) == expected, index
+
+    edges = [-1000, -1, 0, 1, tsamp - 1, wave.nsamp - 1, wave.nsamp, wave.nsamp + 5]
+    indices = np.array(indices + edges)
+    batch = trigger.get_triggers(indices)
+    single = [trigger.get_trigger(index, PerFrameCache()) for index in indices]
+    assert batch.tolist() == single
+
+
+# Pitch estimation
+
+
+def test_track_period():
+    """ Ensure track_period() agrees with get_period() near the previous period,
+    and gives up when the pitch jumps. """
+    from corrscope.triggers import get_period, track_period
+
+    wave = Wave("tests/sine440.wav")
+    data = wave.get_around(20000, 2048, 1)
+    data -= np.mean(data)
+
+    period = get_period(data)
+    assert track_period(data, period) == pytest.approx(period, abs=1)
+    assert track_period(data, period + 5) == pytest.approx(period, abs=1)
+
+    # Octave jumps in either direction.
+    assert track_period(data, period * 2) is None
+    assert track_period(data, period // 2) is None
+
+
+def test_trigger_pitch_estimator(cfg: CorrelationTriggerConfig):
+    """ Ensure PitchEstimator.yin triggers like PitchEstimator.autocorrelation. """
+    from corrscope.triggers import PitchEstimator
+
+    wave = Wave("tests/sine440.wav")
+    yin_cfg = attr.evolve(cfg, pitch_estimator="yin")
+    assert yin_cfg.pitch_estimator == PitchEstimator.yin
+
+    full = cfg(wave, tsamp=1000, stride=1, fps=FPS)
+    yin = yin_cfg(wave, tsamp=1000, stride=1, fps=FPS)
+
+    for x in range(1000, 40000, 800):
+        full_cache = PerFrameCache()
+        yin_cache = PerFrameCache()
+        assert yin.get_trigger(x, yin_cache) == full.get_trigger(x, full_cache)
+        assert yin_cache.period == pytest.approx(full_cache.period, abs=1)
+
+
+# Correlation search
+
+
+def test_correlate_lags():
+    """ Ensure correlate_lags() matches the FFT correlation at each lag. """
+    from corrscope.triggers import correlate_lags
+    from corrscope.utils.scipy.signal import correlate
+
+    rng = np.random.RandomState(0)
+    N = 1000
+    data = rng.randn(N)
+    buffer = rng.randn(N)
+    corr = correlate(data, buffer)
+    mid = N - 1
+
+    for begin, end in [(-8, 8), (0, 5), (-5, 0), (3, 9)]:
+        np.testing.assert_allclose(
+            correlate_lags(data, buffer, begin, end),
+            corr[mid + begin : mid + end + 1],
+            atol=1e-9,
+        )
+
+
+@pytest.mark.parametrize("coarse_decimation", [4, 8])
+def test_trigger_coarse_decimation(cfg: CorrelationTriggerConfig, coarse_decimation):
+    """ Ensure coarse-to-fine search triggers like the full search. """
+    wave = Wave("tests/sine440.wav")
+    coarse_cfg = attr.evolve(cfg, coarse_decimation=coarse_decimation)
+
+    full = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+    coarse = coarse_cfg(wave, tsamp=4000, stride=1, fps=FPS)
+
+    for x in range(2000, 40000, 1600):
+        assert coarse.get_trigger(x, PerFrameCache()) == full.get_trigger(
+            x, PerFrameCache()
+        )
+
+
+def test_trigger_state(post_cfg: CorrelationTriggerConfig):
+    """ Ensure restoring a trigger's state replays the same triggers. """
+    wave = Wave("tests/sine440.wav")
+    trigger = post_cfg(wave, tsamp=4000, stride=1, fps=FPS)
+    positions = range(2000, 40000, 1600)
+
+    trigger.get_trigger(1000, PerFrameCache())
+    state = trigger.get_state()
+    expected = [trigger.get_trigger(x, PerFrameCache()) for x in positions]
+
+    # States can be restored more than once.
+    for i in range(2):
+        trigger.set_state(state)
+        assert [trigger.get_trigger(x, PerFrameCache()) for x in positions] == expected
+
+
+def test_trigger_record_candidates():
+    """ Ensure CorrelationTrigger records its best correlation peaks,
+    without changing its trigger. """
+    wave = Wave("tests/sine440.wav")
+    cfg = cfg_template()
+    plain = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+    recording = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+
+    for x in range(2000, 40000, 1600):
+        cache = PerFrameCache(record_candidates=True)
+        trigger = recording.get_trigger(x, cache)
+        assert trigger == plain.get_trigger(x, PerFrameCache())
+
+        assert cache.candidates is not None and cache.candidate_scores is not None
+        assert len(cache.candidates) == triggers.SMOOTH_CANDIDATES
+        assert cache.candidates[0] == trigger
+        assert (np.diff(cache.candidate_scores) <= 0).all()
+
+
+@pytest.mark.parametrize("coarse_decimation", [4, 8])
+def test_trigger_record_candidates_coarse(coarse_decimation):
+    """ Ensure coarse-to-fine search records its refined peaks as candidates,
+    without changing its trigger. """
+    wave = Wave("tests/sine440.wav")
+    cfg = cfg_template(coarse_decimation=coarse_decimation)
+    plain = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+    recording = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+
+    for x in range(2000, 40000, 1600):
+        cache = PerFrameCache(record_candidates=True)
+        trigger = recording.get_trigger(x, cache)
+        assert trigger == plain.get_trigger(x, PerFrameCache())
+
+        assert cache.candidates is not None and cache.candidate_scores is not None
+        assert cache.candidates[0] == trigger
+        assert 1 < len(cache.candidates) <= triggers.SMOOTH_CANDIDATES
+        assert len(set(cache.candidates)) == len(cache.candidates)
+        assert (np.diff(cache.candidate_scores[1:]) <= 0).all()
+
+
+@pytest.mark.parametrize("coarse_decimation", [2, 4, 8])
+def test_trigger_record_candidates_coarse_causal(coarse_decimation):
+    """ Ensure recording candidates for smoothing doesn't let extra coarse peaks
+    change the causal trigger. """
+    wave = Wave("tests/impulse24000.wav")
+    cfg = cfg_template(coarse_decimation=coarse_decimation)
+    plain = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+    recording = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+
+    for x in range(0, wave.nsamp, 300):
+        cache = PerFrameCache(record_candidates=True)
+        assert recording.get_trigger(x, cache) == plain.get_trigger(
+            x, PerFrameCache()
+        ), x
+
+
+def test_rank_candidates():
+    """ Ensure rank_candidates() keeps the causal peak first,
+    even if a later coarse peak refines to a better correlation. """
+    from corrscope.triggers import rank_candidates
+
+    offsets = np.array([10, 20, 10, 0, 30])
+    scores = np.array([5.0, 4.0, 5.0, -np.inf, 9.0])
+    ranked, ranked_scores = rank_candidates(offsets, scores, best=0, n=4)
+    assert ranked.tolist() == [10, 30, 20]
+    assert ranked_scores.tolist() == [5.0, 9.0, 4.0]
+
+    ranked, _ = rank_candidates(offsets, scores, best=0, n=2)
+    assert ranked.tolist() == [10, 30]
+
+
+def test_trigger_record_candidates_post(mocker: MockFixture):
+    """ Ensure every recorded candidate is post-triggered. """
+    wave = Wave("tests/sine440.wav")
+    cfg = cfg_template(post=ZeroCrossingTriggerConfig())
+    trigger = cfg(wave, tsamp=4000, stride=1, fps=FPS)
+
+    get_triggers = mocker.spy(trigger.post, "get_triggers")
+
+    for x in range(2000, 40000, 1600):
+        cache = PerFrameCache(record_candidates=True)
+        trigger.get_trigger(x, cache)
+        for candidate in cache.candidates:
+            assert wave[candidate - 1] <= 0 <= wave[candidate]
+
+    # Candidates are post-triggered in one batch per frame.
+    assert get_triggers.call_count == len(range(2000, 40000, 1600))
+
+
+def test_smooth_triggers():
+    """ Ensure smooth_triggers() follows the best candidates when penalty=0,
+    and ignores a one-frame jump when penalized. """
+    # Frame 1's best candidate jumps by one period, then returns.
+    offsets = np.array([[0.0, 2.0], [1.0, 0.0], [0.0, 2.0]])
+    scores = np.array([[1.0, 0.5], [1.0, 0.9], [1.0, 0.5]])
+
+    assert triggers.smooth_triggers(offsets, scores, 0).tolist() == [0, 0, 0]
+    assert triggers.smooth_triggers(offsets, scores, 1).tolist() == [0, 1, 0]
+
+    # Missing candidates are never chosen.
+    scores[1, 1] = -np.inf
+    assert triggers.smooth_triggers(offsets, scores, 1).tolist() == [0, 0, 0]
+
+    assert triggers.smooth_triggers(offsets[:0], scores[:0], 1).tolist() == []
+
+
+def test_trigger_update_buffer_allocations():
+    """ Ensure CorrelationTrigger updates its per-frame state (_update_buffer(),
+    called by get_trigger()) in-place, without allocating arrays each frame. """
+    import tracemalloc
+
+    wave = Wave("tests/sine440.wav")
+    trigger = cfg_template(responsiveness=0.5)(wave, tsamp=4000, stride=1, fps=FPS)
+
+    # Warm up, and prepare input data (without tracing).
+    for x in range(2000, 8000, 800):
+        trigger.get_trigger(x, PerFrameCache())
+    datas = [wave.get_around(x, 4000, 1) for x in range(8000, 16000, 800)]
+    caches = [PerFrameCache(period=100 + i, mean=0.0) for i in range(len(datas))]
+
+    tracemalloc.start()
+    try:
+        begin, _ = tracemalloc.get_traced_memory()
+        for data, cache in zip(datas, caches):
+            trigger._update_buffer(data, cache)
+        end, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # A 4000-sample buffer is 16000 bytes. Allow a few scalars, across all frames.
+    assert end - begin < 1000
+    assert peak - begin < 4000
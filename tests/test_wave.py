@@ -1,4 +1,5 @@
 import warnings
+from pathlib import Path
 from typing import Sequence
 
 import numpy as np
@@ -7,8 +8,9 @@ import pytest
 from delayed_assert import expect, assert_expectations
 
 from corrscope.config import CorrError
+import corrscope.utils.scipy.wavfile as wavfile
 from corrscope.utils.scipy.wavfile import WavFileWarning
-from corrscope.wave import Wave, Flatten
+from corrscope.wave import Wave, Flatten, ENVELOPE_BLOCK, SILENCE_THRESHOLD
 
 prefix = "tests/wav-formats/"
 wave_paths = [
@@ -198,3 +200,42 @@ def test_header_larger_than_filesize():
     with pytest.warns(WavFileWarning):
         wave = Wave("tests/header larger than filesize.wav")
         assert wave
+
+
+def test_wave_envelope():
+    """Ensure Wave.is_silent() finds the impulse, and treats padding as silent."""
+    wave = Wave(prefix + "s32-impulse1000.wav")
+    wave.calc_envelope()
+    assert wave.envelope is not None
+    assert len(wave.envelope) == 2000 // ENVELOPE_BLOCK + 1
+
+    # Copies share the envelope.
+    wave = wave.with_flatten(Flatten.Stereo, return_channels=True)
+
+    assert wave.is_silent(0, 700)
+    assert not wave.is_silent(900, 1100)
+    assert not wave.is_silent(-5000, 5000)
+    assert wave.is_silent(-500, 0)
+    assert wave.is_silent(2000, 3000)
+
+
+def test_wave_envelope_dither(tmp_path: Path):
+    """Ensure 16-bit dither noise is silent at the default SILENCE_THRESHOLD,
+    but quiet audio slightly louder than the threshold is not."""
+    rng = np.random.RandomState(0)
+    half = 8 * ENVELOPE_BLOCK
+    data = np.zeros(2 * half, dtype=np.int16)
+    # Dither is ±1 LSB (2**-15), below SILENCE_THRESHOLD (2**-14).
+    data[:half] = rng.randint(-1, 2, half)
+    # 4 LSB (2**-13) is above SILENCE_THRESHOLD.
+    data[half:] = 4 * rng.randint(-1, 2, half)
+    assert 2 ** -15 < SILENCE_THRESHOLD < 2 ** -13
+
+    path = str(tmp_path / "dither.wav")
+    wavfile.write(path, 48000, data)
+    wave = Wave(path)
+    wave.calc_envelope()
+
+    assert wave.is_silent(0, half)
+    assert not wave.is_silent(0, half, threshold=2 ** -16)
+    assert not wave.is_silent(half, 2 * half)
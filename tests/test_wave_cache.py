@@ -0,0 +1,145 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockFixture
+
+import corrscope.wave_cache
+
+from corrscope.channel import ChannelConfig, Channel
+from corrscope.corrscope import default_config
+from corrscope.wave_cache import WaveCache
+
+SINE = "tests/sine440.wav"
+
+
+def test_wave_cache_preload(tmp_path: Path):
+    """ Ensure get() reuses preloaded Waves and envelopes,
+    returning copies with their own amplification. """
+    cache = WaveCache(overview_dir=str(tmp_path))
+    try:
+        preloaded = cache.preload(SINE).result()
+        assert preloaded.envelope is not None
+        assert cache.preload(SINE).result() is preloaded
+
+        wave = cache.get(SINE, amplification=2, calc_envelope=True)
+        assert wave is not preloaded
+        assert wave.data is preloaded.data
+        assert wave.envelope is preloaded.envelope
+        assert wave.amplification == 2
+        assert preloaded.amplification == 1
+    finally:
+        cache.close()
+
+
+def test_wave_cache_errors(tmp_path: Path):
+    """ Ensure preload() reports invalid files through its Future. """
+    cache = WaveCache(overview_dir=str(tmp_path))
+    try:
+        with pytest.raises(FileNotFoundError):
+            cache.preload("tests/missing.wav").result()
+
+        invalid = tmp_path / "invalid.wav"
+        invalid.write_bytes(b"not a wav file")
+        with pytest.raises(ValueError):
+            cache.preload(str(invalid)).result()
+    finally:
+        cache.close()
+
+
+def test_wave_cache_open_before_scan(tmp_path: Path, mocker: MockFixture):
+    """ Ensure get() and preload errors don't wait for other files' scans,
+    and get() waits for the scan only when it needs the envelope. """
+    scanning = threading.Event()
+    release = threading.Event()
+    load_overview = corrscope.wave_cache.load_overview
+
+    def slow_load_overview(*args, **kwargs):
+        scanning.set()
+        assert release.wait(10)
+        return load_overview(*args, **kwargs)
+
+    mocker.patch.object(corrscope.wave_cache, "load_overview", slow_load_overview)
+    cache = WaveCache(overview_dir=str(tmp_path))
+    try:
+        scanned = cache.preload(SINE)
+        assert scanning.wait(10)
+
+        wave = cache.get(SINE, amplification=1, calc_envelope=False)
+        assert wave.envelope is None
+        assert not scanned.done()
+
+        with pytest.raises(FileNotFoundError):
+            cache.preload("tests/missing.wav").result(timeout=10)
+        invalid = tmp_path / "invalid.wav"
+        invalid.write_bytes(b"not a wav file")
+        with pytest.raises(ValueError):
+            cache.preload(str(invalid)).result(timeout=10)
+
+        release.set()
+        wave = cache.get(SINE, amplification=1, calc_envelope=True)
+        assert scanned.done()
+        assert wave.envelope is scanned.result().envelope is not None
+    finally:
+        release.set()
+        cache.close()
+
+
+def test_wave_cache_invalidate(tmp_path: Path):
+    """ Ensure modifying a file reloads it, and the LRU evicts old files. """
+    cache = WaveCache(maxsize=2, overview_dir=str(tmp_path / "overview"))
+    try:
+        path = str(tmp_path / "sine.wav")
+        shutil.copy(SINE, path)
+        first = cache.preload(path).result()
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert cache.preload(path).result() is not first
+
+        wave = cache.preload(path).result()
+        cache.preload(SINE).result()
+        cache.preload("tests/impulse24000.wav").result()
+        assert cache.preload(path).result() is not wave
+    finally:
+        cache.close()
+
+
+def test_wave_cache_peek(tmp_path: Path, mocker: MockFixture):
+    """ Ensure peek() returns preloads which are pending or cached,
+    without loading files itself. """
+    cache = WaveCache(maxsize=1, overview_dir=str(tmp_path))
+    try:
+        Wave = mocker.spy(corrscope.wave_cache, "Wave")
+        assert cache.peek(SINE) is None
+        assert cache.peek("tests/missing.wav") is None
+        assert Wave.call_count == 0
+
+        future = cache.preload(SINE)
+        assert cache.peek(SINE) is future
+        future.result()
+        assert cache.peek(SINE) is future
+
+        # Evicted files are not reloaded.
+        cache.preload("tests/impulse24000.wav").result()
+        assert cache.peek(SINE) is None
+        assert Wave.call_count == 2
+    finally:
+        cache.close()
+
+
+def test_channel_wave_cache(tmp_path: Path):
+    """ Ensure Channel loads its Wave from the cache. """
+    cache = WaveCache(overview_dir=str(tmp_path))
+    try:
+        preloaded = cache.preload(SINE).result()
+        cfg = default_config(skip_silence=True)
+        channel = Channel(ChannelConfig(SINE, amplification=3), cfg, cache)
+
+        assert channel.render_wave.data is preloaded.data
+        assert channel.render_wave.envelope is preloaded.envelope
+        assert channel.render_wave.amplification == 3
+    finally:
+        cache.close()